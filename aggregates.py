@@ -0,0 +1,237 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Aggregate tables of the shows, for the reports which would otherwise scan all of them.
+
+daily_stats has a row for each location and day with shows, or with titles departed:
+    titles: the titles shown
+    new_titles: the titles shown which were not shown the day before
+    departed_titles: the titles shown the day before which are not shown anymore
+period_stats rolls them up by week (starting on Monday) and by month:
+    titles: the distinct titles shown in the period
+    title_days: the sum of the daily titles
+    new_titles, departed_titles: the sums of the daily ones
+and titles_in_locations has, for each title in each location:
+    first_show, last_show: the first and the last day shown (NULL if never shown)
+    show_count: the days shown
+
+Sources refreshes the days touched by the shows it writes, in the same transaction.
+The daily shows written by other means are aggregated by catchUp(), from the last
+shows_daily.id already aggregated (the watermark), and rebuild() recomputes everything.
+
+All the functions take a cursor on the db, and run in its current transaction.
+"""
+import datetime
+
+import bitmaps
+import sketches
+
+# name of the watermark of the daily shows aggregated
+SHOWS_WATERMARK = 'shows'
+
+# the rollups: name, start and end of the period of a date (expressions on %s)
+PERIODS = [('week', "date(%s, 'weekday 0', '-6 days')", "date(%s, 'weekday 0')"),
+           ('month', "date(%s, 'start of month')", "date(%s, 'start of month', '+1 month', '-1 day')")]
+
+# most variables bound in a single statement (the sqlite default limit is 999)
+_MAX_VARIABLES = 900
+
+# whether a titles_in_locations was shown on a day (the parameter), in its runs or in the daily shows
+_SHOWN = "(EXISTS (SELECT 1 FROM show_runs r WHERE r.titles_in_locations_ref = cand.til " + \
+         "AND r.first_date <= {0} AND r.last_date >= {0}) " + \
+         "OR EXISTS (SELECT 1 FROM shows_daily s WHERE s.titles_in_locations_ref = cand.til AND s.date = {0}))"
+
+def _dayAfter(date = None):
+    """
+    Returns the '%Y-%m-%d' day after the given one.
+    """
+    return (datetime.datetime.strptime(date, '%Y-%m-%d').date() + datetime.timedelta(days = 1)).strftime('%Y-%m-%d')
+
+def refreshDays(cur = None, days = None):
+    """
+    Recomputes the daily stats of the given (locations_ref, date), and of the days after them
+    (whose new and departed titles depend on them), then the rollups of their periods.
+    """
+    touched = set()
+    for locationsRef, date in days:
+        touched.add((locationsRef, date))
+        touched.add((locationsRef, _dayAfter(date)))
+
+    for locationsRef, date in sorted(touched):
+        # the titles of the location shown on the day or on the day before
+        cur.execute("WITH cand AS (" +
+                    " SELECT r.titles_in_locations_ref AS til FROM show_runs r " +
+                    " JOIN titles_in_locations til ON til.id = r.titles_in_locations_ref " +
+                    " WHERE til.locations_ref = :location AND r.last_date >= date(:date, '-1 day') AND r.first_date <= :date " +
+                    " UNION " +
+                    " SELECT s.titles_in_locations_ref FROM shows_daily s " +
+                    " JOIN titles_in_locations til ON til.id = s.titles_in_locations_ref " +
+                    " WHERE til.locations_ref = :location AND s.date IN (date(:date, '-1 day'), :date)), " +
+                    "flags AS (" +
+                    " SELECT " + _SHOWN.format(":date") + " AS today, " +
+                    _SHOWN.format("date(:date, '-1 day')") + " AS yesterday FROM cand) " +
+                    "SELECT COALESCE(SUM(today), 0), COALESCE(SUM(today AND NOT yesterday), 0), " +
+                    " COALESCE(SUM(yesterday AND NOT today), 0) FROM flags",
+                    {'location': locationsRef, 'date': date})
+        titles, newTitles, departedTitles = cur.fetchone()
+
+        if titles == 0 and departedTitles == 0:
+            cur.execute("DELETE FROM daily_stats WHERE locations_ref = ? AND date = ?", (locationsRef, date))
+        else:
+            cur.execute("INSERT INTO daily_stats (locations_ref, date, titles, new_titles, departed_titles) " +
+                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT (locations_ref, date) DO UPDATE SET " +
+                        "titles = excluded.titles, new_titles = excluded.new_titles, departed_titles = excluded.departed_titles",
+                        (locationsRef, date, titles, newTitles, departedTitles))
+
+    refreshPeriods(cur, touched)
+
+def refreshPeriods(cur = None, days = None):
+    """
+    Recomputes the rollups of the periods of the given (locations_ref, date), from the daily stats.
+    """
+    periods = set()
+    for locationsRef, date in days:
+        for period, start, end in PERIODS:
+            cur.execute("SELECT %s, %s" % (start % "?", end % "?"), (date, date))
+            periods.add((locationsRef, period) + tuple(cur.fetchone()))
+
+    for locationsRef, period, start, end in sorted(periods):
+        params = {'location': locationsRef, 'period': period, 'start': start, 'end': end}
+        cur.execute("SELECT COUNT(DISTINCT til) FROM (" +
+                    " SELECT r.titles_in_locations_ref AS til FROM show_runs r " +
+                    " JOIN titles_in_locations til ON til.id = r.titles_in_locations_ref " +
+                    " WHERE til.locations_ref = :location AND r.last_date >= :start AND r.first_date <= :end " +
+                    " UNION ALL " +
+                    " SELECT s.titles_in_locations_ref FROM shows_daily s " +
+                    " JOIN titles_in_locations til ON til.id = s.titles_in_locations_ref " +
+                    " WHERE til.locations_ref = :location AND s.date BETWEEN :start AND :end)",
+                    params)
+        titles = cur.fetchone()[0]
+
+        if titles == 0:
+            cur.execute("DELETE FROM period_stats WHERE locations_ref = :location AND period = :period AND start_date = :start",
+                        params)
+        else:
+            params['titles'] = titles
+            cur.execute("INSERT INTO period_stats (locations_ref, period, start_date, titles, title_days, new_titles, departed_titles) " +
+                        "SELECT :location, :period, :start, :titles, " +
+                        " COALESCE(SUM(titles), 0), COALESCE(SUM(new_titles), 0), COALESCE(SUM(departed_titles), 0) " +
+                        "FROM daily_stats WHERE locations_ref = :location AND date BETWEEN :start AND :end " +
+                        "ON CONFLICT (locations_ref, period, start_date) DO UPDATE SET " +
+                        "titles = excluded.titles, title_days = excluded.title_days, " +
+                        "new_titles = excluded.new_titles, departed_titles = excluded.departed_titles",
+                        params)
+
+def refreshTitlesInLocations(cur = None, titlesInLocationsRefs = None):
+    """
+    Recomputes the first and last show and the days shown of the given titles_in_locations (ids,
+    all of them if None), from their runs of shows and their daily shows not covered by the runs.
+    """
+    update = "UPDATE titles_in_locations SET (first_show, last_show, show_count) = (" + \
+             " SELECT MIN(first_date), MAX(last_date), COALESCE(SUM(days), 0) FROM (" + \
+             "  SELECT MIN(first_date) AS first_date, MAX(last_date) AS last_date, " + \
+             "   SUM(CAST(julianday(last_date) - julianday(first_date) AS integer) + 1) AS days " + \
+             "  FROM show_runs WHERE titles_in_locations_ref = titles_in_locations.id " + \
+             "  UNION ALL " + \
+             "  SELECT MIN(date), MAX(date), COUNT(*) FROM shows_daily s " + \
+             "  WHERE s.titles_in_locations_ref = titles_in_locations.id AND NOT EXISTS (SELECT 1 FROM show_runs r " + \
+             "   WHERE r.titles_in_locations_ref = s.titles_in_locations_ref AND r.first_date <= s.date AND r.last_date >= s.date)))"
+
+    if titlesInLocationsRefs is None:
+        cur.execute(update)
+        return
+
+    distinctTils = list(dict.fromkeys(titlesInLocationsRefs))
+    for start in range(0, len(distinctTils), _MAX_VARIABLES):
+        chunk = distinctTils[start:start + _MAX_VARIABLES]
+        cur.execute(update + " WHERE id IN (" + ", ".join("?" * len(chunk)) + ")", chunk)
+
+def getWatermark(cur = None, name = SHOWS_WATERMARK):
+    """
+    Returns the last id aggregated of the given watermark (0 if none).
+    """
+    cur.execute("SELECT last_id FROM aggregate_watermarks WHERE name = ?", (name,))
+    rec = cur.fetchone()
+    return 0 if rec is None else rec[0]
+
+def _setWatermark(cur = None, name = SHOWS_WATERMARK, lastId = 0):
+    cur.execute("INSERT INTO aggregate_watermarks (name, last_id) VALUES (?, ?) " +
+                "ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id", (name, lastId))
+
+def resetWatermark(cur = None, name = SHOWS_WATERMARK):
+    """
+    Sets the given watermark back to 0, once all the shows below it are deleted:
+    sqlite gives their ids to the next ones.
+    """
+    _setWatermark(cur, name, 0)
+
+def catchUp(cur = None):
+    """
+    Aggregates the days (and the titles_in_locations, bitmaps and sketches) of the daily shows added
+    after the watermark, then moves it past them. Returns the number of (location, day) refreshed.
+    """
+    watermark = getWatermark(cur)
+    cur.execute("SELECT DISTINCT til.locations_ref, s.date, MAX(s.id) OVER () FROM shows_daily s " +
+                "JOIN titles_in_locations til ON til.id = s.titles_in_locations_ref WHERE s.id > ?", (watermark,))
+    recs = cur.fetchall()
+    if len(recs) == 0:
+        return 0
+
+    refreshDays(cur, [(x[0], x[1]) for x in recs])
+    bitmaps.refreshDays(cur, [(x[0], x[1]) for x in recs])
+    sketches.refreshDays(cur, [(x[0], x[1]) for x in recs])
+    cur.execute("SELECT DISTINCT titles_in_locations_ref FROM shows_daily WHERE id > ?", (watermark,))
+    refreshTitlesInLocations(cur, [x[0] for x in cur.fetchall()])
+    _setWatermark(cur, SHOWS_WATERMARK, recs[0][2])
+
+    return len(recs)
+
+def rebuild(cur = None):
+    """
+    Recomputes all the daily and period stats from the runs of shows and the daily shows, and sets
+    the watermark (the titles_in_locations are recomputed by refreshTitlesInLocations()). Returns the number of (location, day) aggregated.
+    """
+    cur.execute("DELETE FROM daily_stats")
+    cur.execute("DELETE FROM period_stats")
+
+    # the days of the shows, once per titles_in_locations
+    cur.execute("DROP TABLE IF EXISTS temp.rebuild_days")
+    cur.execute("CREATE TEMP TABLE rebuild_days AS " +
+                "SELECT til.locations_ref AS locations_ref, d.titles_in_locations_ref AS til, d.date AS date " +
+                "FROM daily_shows d JOIN titles_in_locations til ON til.id = d.titles_in_locations_ref")
+    cur.execute("CREATE INDEX temp.rebuild_days_til ON rebuild_days (til, date)")
+    cur.execute("CREATE INDEX temp.rebuild_days_location ON rebuild_days (locations_ref, date)")
+
+    cur.execute("INSERT INTO daily_stats (locations_ref, date, titles, new_titles, departed_titles) " +
+                "SELECT locations_ref, date, COUNT(*), " +
+                " SUM(NOT EXISTS (SELECT 1 FROM rebuild_days p WHERE p.til = d.til AND p.date = date(d.date, '-1 day'))), 0 " +
+                "FROM rebuild_days d GROUP BY locations_ref, date")
+    # the days after the last shows of a location, for their departed titles
+    cur.execute("INSERT INTO daily_stats (locations_ref, date, titles, new_titles, departed_titles) " +
+                "SELECT DISTINCT locations_ref, date(date, '+1 day'), 0, 0, 0 FROM rebuild_days d " +
+                "WHERE NOT EXISTS (SELECT 1 FROM rebuild_days n WHERE n.locations_ref = d.locations_ref " +
+                " AND n.date = date(d.date, '+1 day'))")
+    cur.execute("UPDATE daily_stats SET departed_titles = (SELECT COUNT(*) FROM rebuild_days p " +
+                " WHERE p.locations_ref = daily_stats.locations_ref AND p.date = date(daily_stats.date, '-1 day') " +
+                " AND NOT EXISTS (SELECT 1 FROM rebuild_days n WHERE n.til = p.til AND n.date = daily_stats.date))")
+
+    for period, start, end in PERIODS:
+        cur.execute(("INSERT INTO period_stats (locations_ref, period, start_date, titles, title_days, new_titles, departed_titles) " +
+                     "SELECT locations_ref, ?, %s AS start_date, COUNT(DISTINCT til), COUNT(*), 0, 0 " +
+                     "FROM rebuild_days GROUP BY locations_ref, start_date") % (start % "date"),
+                    (period,))
+        cur.execute(("UPDATE period_stats SET (new_titles, departed_titles) = " +
+                     "(SELECT SUM(new_titles), SUM(departed_titles) FROM daily_stats d " +
+                     " WHERE d.locations_ref = period_stats.locations_ref AND d.date BETWEEN period_stats.start_date AND %s) " +
+                     "WHERE period = ?") % (end % "period_stats.start_date"),
+                    (period,))
+
+    cur.execute("DROP TABLE temp.rebuild_days")
+
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM shows_daily")
+    _setWatermark(cur, SHOWS_WATERMARK, cur.fetchone()[0])
+
+    cur.execute("SELECT count(*) FROM daily_stats")
+    return cur.fetchone()[0]
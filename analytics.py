@@ -2,17 +2,250 @@
 Created on Jun 5, 2017
 
 @author: Guido
+
+Reports on the diversity of the titles shown in the locations.
+
+The shows are loaded in bulk into numpy arrays of (location, day, title), one element per
+title shown in a location on a day, and the reports are computed on the whole arrays at once:
+    - dailyTitles: the number of distinct titles shown in each location, each day;
+    - diversity: the Shannon and Simpson indices of the days of shows of the titles,
+      in each location, over windows of days;
+    - turnover: the titles entering and leaving the shows of each location, each day.
+
+The stats report reads instead the aggregates kept up to date in the db (see aggregates.py):
+the titles, new titles and departed titles of each location by day, week or month.
+The overlap report compares the titles shown in the locations, two by two, with the bitmaps
+of the titles shown each day (see bitmaps.py): their intersection, union and Jaccard index.
+The distinct report estimates the distinct titles shown in some locations over some days
+by merging the sketches of the titles shown each day (see sketches.py), or counts them exactly.
+
+It can be run from the command line:
+
+    python3 analytics.py --dbfile movieDiversity.db --report diversity [--location Milano] [--window 7]
+
+    python3 analytics.py --dbfile movieDiversity.db --report stats [--location Milano] [--period week]
+    python3 analytics.py --dbfile movieDiversity.db --report overlap [--location Milano] [--period week]
+    python3 analytics.py --dbfile movieDiversity.db --report distinct [--location Milano --location München] [--exact]
+
+Needs numpy, but for the allTitlesInLoc, stats and overlap reports and for the exact distinct report.
 '''
+import sys
+import logging
 import argparse
-from sqlalchemy import create_engine
+from contextlib import closing
 
-import sources
 import movieLogger
-from movieDbClasses import Base, Titles, Locations, TitlesInLocations
+from utils import dbUtils as db
+
+# julian day of 1970-01-01, the day 0 of the day numbers
+_EPOCH_JULIAN_DAY = 2440587.5
+
+def dayToDate(day = 0):
+    """
+    Returns the '%Y-%m-%d' string of the given day number (days since 1970-01-01).
+    """
+    import numpy
+    return str(numpy.datetime64(int(day), 'D'))
+
+def formatReport(columns = None, rows = None, output = sys.stdout):
+    """
+    Outputs the requested report: the rows (sequences of values, as many as the columns),
+    tab separated, after a header line with the names of the columns.
+    """
+    output.write("\t".join(columns) + "\n")
+    for row in rows:
+        output.write("\t".join(["%.4f" % x if isinstance(x, float) else str(x) for x in row]) + "\n")
 
-def formatReport():
-    """Outputs the requested report.
+class DiversityAnalytics(object):
     """
+    Computes the diversity reports on the shows of a MovieDiversity db.
+
+    load() reads the shows (the runs of shows, expanded into days, and the daily shows not yet
+    compacted) of the given locations and dates into three parallel numpy arrays, sorted by
+    location, day and title, with one element per title shown in a location on a day:
+        location: the locations ids
+        day: the day numbers (days since 1970-01-01, see dayToDate())
+        title: the titles ids
+    The reports are computed from these arrays, with no further reads from the db.
+    """
+    logger = None
+
+    location = None
+    day = None
+    title = None
+
+    # names of the locations, by id
+    locationNames = None
+
+    _dbfile = None
+
+    def __init__(self, dbfile = None):
+        """
+        Gets a local copy of the logger, and the db to be read.
+        """
+        self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+        self._dbfile = dbfile
+
+    def load(self, locationIds = None, dateFrom = None, dateTo = None):
+        """
+        Loads the shows in the given locations (a list of ids, all of them if None) between dateFrom
+        and dateTo included ('%Y-%m-%d', either can be None for no limit).
+        Returns the number of (location, day, title) loaded.
+        """
+        import numpy
+
+        conditions = []
+        params = [dateFrom, dateTo]
+        if locationIds is not None:
+            conditions.append("til.locations_ref IN (%s)" % ", ".join(["?"] * len(locationIds)))
+            params.extend(locationIds)
+        if dateFrom is not None:
+            conditions.append("last_date >= ?")
+            params.append(dateFrom)
+        if dateTo is not None:
+            conditions.append("first_date <= ?")
+            params.append(dateTo)
+
+        # the runs clipped to the dates, and the daily shows as runs of one day
+        query = "SELECT til.locations_ref, " + \
+                " CAST(julianday(MAX(first_date, COALESCE(?, first_date))) - %f AS INTEGER), " % _EPOCH_JULIAN_DAY + \
+                " CAST(julianday(MIN(last_date, COALESCE(?, last_date))) - %f AS INTEGER), " % _EPOCH_JULIAN_DAY + \
+                " til.titles_ref " + \
+                "FROM (SELECT titles_in_locations_ref, first_date, last_date FROM show_runs " + \
+                "      UNION ALL " + \
+                "      SELECT titles_in_locations_ref, date AS first_date, date AS last_date FROM shows_daily) " + \
+                "JOIN titles_in_locations til ON til.id = titles_in_locations_ref" + \
+                (" WHERE " + " AND ".join(conditions) if len(conditions) > 0 else "")
+
+        with closing(db.connect(dbfile = self._dbfile)) as conn:
+            with closing(conn.cursor()) as cur:
+                cur.row_factory = None
+                cur.execute(query, params)
+                runs = numpy.fromiter(cur, dtype = [('location', numpy.int64), ('first', numpy.int64),
+                                                    ('last', numpy.int64), ('title', numpy.int64)])
+
+            self.locationNames = {x['id']: x['name'] for x in conn.execute("SELECT id, name FROM locations;").fetchall()}
+
+        # each run expanded into its days
+        lengths = runs['last'] - runs['first'] + 1
+        offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        location = numpy.repeat(runs['location'], lengths)
+        day = numpy.repeat(runs['first'], lengths) + offsets
+        title = numpy.repeat(runs['title'], lengths)
+
+        # sorted, and once per location, day and title (daily shows may overlap the runs)
+        order = numpy.lexsort((title, day, location))
+        location, day, title = location[order], day[order], title[order]
+        unique = numpy.ones(len(order), dtype = bool)
+        unique[1:] = (location[1:] != location[:-1]) | (day[1:] != day[:-1]) | (title[1:] != title[:-1])
+        self.location, self.day, self.title = location[unique], day[unique], title[unique]
+
+        self.logger.info("Loaded %d runs of shows, %d titles shown per day.", len(runs), len(self.location))
+
+        return len(self.location)
+
+    def _groups(self, *keys):
+        """
+        Given arrays sorted by their values together, returns the positions where each group
+        of equal values starts, and the group of each position.
+        """
+        import numpy
+
+        starts = numpy.zeros(len(keys[0]), dtype = bool)
+        starts[:1] = True
+        for key in keys:
+            starts[1:] |= key[1:] != key[:-1]
+
+        return numpy.flatnonzero(starts), numpy.cumsum(starts) - 1
+
+    def dailyTitles(self):
+        """
+        Returns the number of distinct titles shown in each location, each day,
+        as arrays (location, day, titles).
+        """
+        import numpy
+
+        starts, _ = self._groups(self.location, self.day)
+        titles = numpy.diff(numpy.append(starts, len(self.location)))
+
+        return self.location[starts], self.day[starts], titles
+
+    def diversity(self, windowDays = 7):
+        """
+        Returns the diversity of the titles shown in each location, over windows of windowDays days
+        (counted from the first day loaded), as arrays (location, first day, titles, shannon, simpson).
+
+        The share of each title is the number of its days of shows over the days of shows
+        of all the titles in the window: shannon is the Shannon index, -sum(share * ln(share)),
+        and simpson the Gini-Simpson index, 1 - sum(share^2).
+        """
+        import numpy
+        assert windowDays > 0, "Windows should be at least one day long, got %s" % windowDays
+
+        if len(self.day) == 0:
+            empty = numpy.zeros(0, dtype = numpy.int64)
+            return empty, empty, empty, numpy.zeros(0), numpy.zeros(0)
+
+        window = (self.day - self.day.min()) // windowDays
+        order = numpy.lexsort((self.title, window, self.location))
+        location, window, title = self.location[order], window[order], self.title[order]
+
+        # days of shows of each title, in each location and window
+        titleStarts, _ = self._groups(location, window, title)
+        titleDays = numpy.diff(numpy.append(titleStarts, len(location))).astype(numpy.float64)
+        location, window = location[titleStarts], window[titleStarts]
+
+        starts, group = self._groups(location, window)
+        share = titleDays / numpy.add.reduceat(titleDays, starts)[group]
+        shannon = -numpy.add.reduceat(share * numpy.log(share), starts)
+        simpson = 1.0 - numpy.add.reduceat(share * share, starts)
+        titles = numpy.diff(numpy.append(starts, len(location)))
+
+        return location[starts], self.day.min() + window[starts] * windowDays, titles, shannon, simpson
+
+    def turnover(self):
+        """
+        Returns the turnover of the titles shown in each location, each day but the first one,
+        against the previous day with shows in the same location (the scraper may have skipped some),
+        as arrays (location, day, previous day, entering, leaving, turnover).
+
+        entering are the titles not shown the previous day, leaving the ones of the previous day
+        not shown anymore, and turnover is (entering + leaving) / (titles of the day + titles of the previous day).
+        """
+        import numpy
+
+        if len(self.day) == 0:
+            empty = numpy.zeros(0, dtype = numpy.int64)
+            return empty, empty, empty, empty, empty, numpy.zeros(0)
+
+        starts, group = self._groups(self.location, self.day)
+        titles = numpy.diff(numpy.append(starts, len(self.location)))
+        groupLocation = self.location[starts]
+        # the groups having a previous day in the same location
+        hasPrevious = numpy.zeros(len(starts), dtype = bool)
+        hasPrevious[1:] = groupLocation[1:] == groupLocation[:-1]
+
+        # (group, title) keys, sorted as the arrays are
+        width = int(self.title.max()) + 1
+        keys = group * width + self.title
+
+        def isIn(candidates):
+            positions = numpy.minimum(numpy.searchsorted(keys, candidates), len(keys) - 1)
+            return keys[positions] == candidates
+
+        entering = hasPrevious[group] & ~isIn(keys - width)
+        hasNext = numpy.append(hasPrevious[1:], False)
+        leaving = hasNext[group] & ~isIn(keys + width)
+
+        enteringCount = numpy.bincount(group[entering], minlength = len(starts))
+        leavingCount = numpy.bincount(group[leaving] + 1, minlength = len(starts) + 1)[:len(starts)]
+
+        selected = numpy.flatnonzero(hasPrevious)
+        total = titles[selected] + titles[selected - 1]
+        turnover = (enteringCount[selected] + leavingCount[selected]) / total
+
+        return groupLocation[selected], self.day[starts[selected]], self.day[starts[selected - 1]], \
+               enteringCount[selected], leavingCount[selected], turnover
 
 ###
 #
@@ -30,43 +263,126 @@ if __name__ == "__main__":
                         choices = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                         help = 'The level of output for logging. Defaults to INFO.')
     parser.add_argument('--location', '-loc',
-                        required = True,
-                        help = 'The location for which to collect data.')
+                        required = False,
+                        action = 'append',
+                        help = 'The location for which to collect data. Defaults to all of them, but for allTitlesInLoc. ' +
+                               'Can be given more than once, but for allTitlesInLoc, stats and overlap.')
     parser.add_argument('--report', '-r',
                         required = True,
-                        choices = ['allTitlesInLoc'],
+                        choices = ['allTitlesInLoc', 'dailyTitles', 'diversity', 'turnover', 'stats', 'overlap', 'distinct'],
                         help = 'The report that needs to be created in output.')
+    parser.add_argument('--dateFrom', '-df',
+                        required = False,
+                        help = 'The first day of shows to be reported (%%Y-%%m-%%d). Defaults to the first one.')
+    parser.add_argument('--dateTo', '-dt',
+                        required = False,
+                        help = 'The last day of shows to be reported (%%Y-%%m-%%d). Defaults to the last one.')
+    parser.add_argument('--window', '-w',
+                        required = False,
+                        type = int,
+                        default = 7,
+                        help = 'The days over which the diversity is computed. Defaults to 7.')
+    parser.add_argument('--period', '-p',
+                        required = False,
+                        choices = ['day', 'week', 'month'],
+                        help = 'The period of the stats (defaults to day) and overlap (defaults to all the dates) reports.')
+    parser.add_argument('--exact', '-e',
+                        action = 'store_true',
+                        help = 'Count the distinct titles exactly from the shows, instead of estimating them from the sketches.')
 
     args = parser.parse_args()
 
     # Init the logging system
     movieLogger.MovieLoggger().initLogger(level = args.logLevel)
 
-    engine = create_engine("sqlite:///" + args.dbfile)
-    Base.metadata.bind = engine
-    from sqlalchemy.orm import sessionmaker
-    DBSession = sessionmaker()
-    DBSession.bind = engine
-    session = DBSession()
-
-    # Make a query to find all Locations in the database
-    session.query(Locations).all()
+    # the ORM is imported only once the arguments are known to be valid
+    import sources
+    import bitmaps
+    import sketches
 
-    # Return the first Person from all Persons in the database
-    person = session.query(Locations).first()
-    
-
-###
+    # reports only read: they can run while a scrape writes
+    db.setStorageProfile('read-mostly')
     S = sources.Sources(dbfile = args.dbfile)
 
     S.logger.info("Analytics module")
 
     allLocations = S.getAllLocations()
-    S.logger.info("Locations definitions found for: %s", [x['name'] for x in allLocations])
+    S.logger.info("Locations definitions found for: %s", [x.name for x in allLocations])
+
+    locations = []
+    for locationName in args.location or []:
+        S.logger.info("Looking for: %s...", locationName)
+        locations.append(S.getLocationByName(locationName))
+        if locations[-1] is None:
+            S.logger.error("Unknown location: %s", locationName)
+            sys.exit(1)
+    location = locations[0] if len(locations) == 1 else None
+
+    if len(locations) > 1 and args.report in ['allTitlesInLoc', 'stats', 'overlap']:
+        S.logger.error("The report %s takes a single --location.", args.report)
+        sys.exit(1)
+
+    if args.report == 'allTitlesInLoc':
+        if location is None:
+            S.logger.error("The report %s needs a --location.", args.report)
+            sys.exit(1)
+
+        formatReport(['title', 'first_show', 'last_show', 'show_count'],
+                     [(x['title'], x['first_show'], x['last_show'], x['show_count']) for x in S.getAllTitlesInLocation(location.id)])
+
+    elif args.report == 'stats':
+        names = {x.id: x.name for x in allLocations}
+        locationId = None if location is None else location.id
+
+        if args.period in [None, 'day']:
+            formatReport(['location', 'date', 'titles', 'new_titles', 'departed_titles'],
+                         ((names[x.locations_ref], x.date, x.titles, x.new_titles, x.departed_titles)
+                          for x in S.iterDailyStats(locationId, args.dateFrom, args.dateTo)))
+        else:
+            formatReport(['location', 'from', 'titles', 'title_days', 'new_titles', 'departed_titles'],
+                         ((names[x.locations_ref], x.start_date, x.titles, x.title_days, x.new_titles, x.departed_titles)
+                          for x in S.iterPeriodStats(args.period, locationId, args.dateFrom, args.dateTo)))
+
+    elif args.report == 'overlap':
+        # the pairs of the location with each one of the others, if given
+        names = {x.id: x.name for x in allLocations}
+        formatReport(['from', 'location', 'other_location', 'titles', 'other_titles', 'intersection', 'union', 'jaccard'],
+                     [(x[0], names[x[1]], names[x[2]]) + x[3:]
+                      for x in bitmaps.overlap(S.iterTitleBitmaps(dateFrom = args.dateFrom, dateTo = args.dateTo),
+                                               args.period, None if location is None else location.id)])
+
+    elif args.report == 'distinct':
+        locationIds = None if len(locations) == 0 else [x.id for x in locations]
+        if args.exact:
+            titles = S.countDistinctTitles(locationIds, args.dateFrom, args.dateTo)
+        else:
+            titles = sketches.estimate(sketches.merge(x.sketch for x in S.iterTitleSketches(locationIds, args.dateFrom, args.dateTo)))
+
+        formatReport(['locations', 'from', 'to', 'titles', 'exact'],
+                     [(", ".join([x.name for x in locations]) or "all", args.dateFrom or "", args.dateTo or "", titles, args.exact)])
+
+    else:
+        analytics = DiversityAnalytics(dbfile = args.dbfile)
+        analytics.load(locationIds = None if len(locations) == 0 else [x.id for x in locations],
+                       dateFrom = args.dateFrom,
+                       dateTo = args.dateTo)
+        names = analytics.locationNames
+
+        if args.report == 'dailyTitles':
+            locations, days, titles = analytics.dailyTitles()
+            formatReport(['location', 'date', 'titles'],
+                         zip([names[x] for x in locations], map(dayToDate, days), titles.tolist()))
 
-    S.logger.info("Looking for: %s...", args.location)
+        elif args.report == 'diversity':
+            locations, days, titles, shannon, simpson = analytics.diversity(windowDays = args.window)
+            formatReport(['location', 'from', 'titles', 'shannon', 'simpson'],
+                         zip([names[x] for x in locations], map(dayToDate, days), titles.tolist(),
+                             shannon.tolist(), simpson.tolist()))
 
-    S.logger.fatal("Analytics not yet implemented!")
+        elif args.report == 'turnover':
+            locations, days, previousDays, entering, leaving, turnover = analytics.turnover()
+            formatReport(['location', 'date', 'previous_date', 'entering', 'leaving', 'turnover'],
+                         zip([names[x] for x in locations], map(dayToDate, days), map(dayToDate, previousDays),
+                             entering.tolist(), leaving.tolist(), turnover.tolist()))
 
-    allData = S.getAllTitlesInLocation()
     S.logger.info("End run.")
@@ -0,0 +1,83 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Benchmark of the diversity reports of analytics.py.
+
+It generates a db with the shows of all the locations over some years, as runs of shows
+of random lengths, then times the load of the shows and each report.
+Run from the root of the repository:
+
+    python3 benchmarks/benchAnalytics.py [--titles N] [--years N]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, _ROOT)
+
+def generateDb(dbfile = None, titles = 300, years = 3):
+    """
+    Creates the db from movieDiversity.sql and fills each location with about titles
+    shown each day, in runs of one to eight weeks.
+    """
+    with open(os.path.join(_ROOT, "movieDiversity.sql"), encoding = "utf-8") as fp:
+        conn = sqlite3.connect(dbfile)
+        conn.executescript(fp.read())
+
+    rnd = random.Random(0)
+    locations = [x[0] for x in conn.execute("SELECT id FROM locations").fetchall()]
+    days = 365 * years
+    # titles running a month on average: enough of them for titles shown each day
+    allTitles = titles * days // 30
+
+    conn.executemany("INSERT INTO titles (id, title) VALUES (?, ?)",
+                     [(i, "Movie number %d" % i) for i in range(1, allTitles + 1)])
+    runs = []
+    til = 0
+    for location in locations:
+        for titleId in range(1, allTitles + 1):
+            til += 1
+            conn.execute("INSERT INTO titles_in_locations (id, titles_ref, locations_ref) VALUES (?, ?, ?)",
+                         (til, titleId, location))
+            first = rnd.randrange(days)
+            runs.append((til, first, min(days - 1, first + rnd.randint(7, 56))))
+
+    conn.executemany("INSERT INTO show_runs (titles_in_locations_ref, first_date, last_date) " +
+                     "VALUES (?, date('2017-01-01', '+' || ? || ' days'), date('2017-01-01', '+' || ? || ' days'))",
+                     runs)
+    conn.commit()
+    conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark of the diversity reports.')
+    parser.add_argument('--titles', '-t', type = int, default = 300, help = 'Titles shown per day in each location. Defaults to 300.')
+    parser.add_argument('--years', '-y', type = int, default = 3, help = 'Years of shows. Defaults to 3.')
+    args = parser.parse_args()
+
+    import movieLogger
+    import analytics
+    movieLogger.MovieLoggger().initLogger('WARNING')
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbfile = os.path.join(tmpDir, "movies.db")
+        generateDb(dbfile, args.titles, args.years)
+
+        engine = analytics.DiversityAnalytics(dbfile = dbfile)
+        start = time.perf_counter()
+        shown = engine.load()
+        print("load        : %8.3fs, %d titles shown per day, in %d locations" % \
+              (time.perf_counter() - start, shown, len(engine.locationNames)))
+
+        for report, method in [("dailyTitles", engine.dailyTitles),
+                               ("diversity", engine.diversity),
+                               ("turnover", engine.turnover)]:
+            start = time.perf_counter()
+            rows = len(method()[0])
+            print("%-12s: %8.3fs, %d rows" % (report, time.perf_counter() - start, rows))
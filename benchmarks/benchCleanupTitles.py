@@ -0,0 +1,99 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Benchmark of Scraper.cleanupTitles: the blocked comparison against the original
+comparison of all the pairs of titles, which is only run up to --maxPairwise titles.
+Run from the root of the repository:
+
+    python3 benchmarks/benchCleanupTitles.py [--sizes 1000 10000 100000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import stringUtils
+
+_COMMON = ["the", "of", "a", "il", "la", "di", "and", "in", "le", "der"]
+_SYLLABLES = ["ka", "ro", "ma", "ni", "te", "lo", "vi", "sa", "mo", "re", "da", "ti", "no", "ve", "pa",
+              "ri", "su", "ge", "bo", "li", "ar", "en", "os", "ul", "ch", "st", "tr", "qu", "an", "el"]
+
+def generateTitles(count = 0, seed = 0):
+    """
+    Returns a set of count titles, made of random words and some common ones,
+    some of which are variants of the others:
+    different punctuation or case, typos, sequel numbers, "(OV)" suffixes.
+    """
+    rnd = random.Random(seed)
+    titles = set()
+    generated = []
+    while len(titles) < count:
+        if len(generated) > 0 and rnd.random() < 0.3:
+            title = rnd.choice(generated)
+            variant = rnd.randint(0, 3)
+            if variant == 0:
+                title = title.upper().replace(" ", " - ", 1)
+            elif variant == 1:
+                pos = rnd.randrange(len(title))
+                title = title[:pos] + rnd.choice("aeiou") + title[pos + 1:]
+            elif variant == 2:
+                title = title + " " + str(rnd.randint(2, 5))
+            else:
+                title = title + " (OV)"
+        else:
+            words = ["".join([rnd.choice(_SYLLABLES) for _ in range(rnd.randint(1, 4))]) if rnd.random() < 0.7
+                     else rnd.choice(_COMMON) for _ in range(rnd.randint(1, 5))]
+            title = " ".join(words).capitalize()
+        if title not in titles:
+            titles.add(title)
+            generated.append(title)
+
+    return titles
+
+def pairwiseCleanup(titles = None):
+    """
+    The original cleanupTitles: compares all the pairs of titles.
+    """
+    titlesList = [x.replace("\n", " ") for x in titles]
+    similar = set()
+    for first in range(0, len(titlesList)):
+        for second in range(first + 1, len(titlesList)):
+            if stringUtils.isSimilar(titlesList[first], titlesList[second]):
+                similar.add(titlesList[first])
+                break
+
+    return titles.difference(similar)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark of Scraper.cleanupTitles.')
+    parser.add_argument('--sizes', '-s', type = int, nargs = '+', default = [1000, 10000, 100000],
+                        help = 'Numbers of titles to clean up. Defaults to 1000 10000 100000.')
+    parser.add_argument('--maxPairwise', '-mp', type = int, default = 10000,
+                        help = 'Largest number of titles the pairwise comparison is run on. Defaults to 10000.')
+    args = parser.parse_args()
+
+    import scraper
+    # no db needed to clean up the titles
+    S = scraper.Scraper.__new__(scraper.Scraper)
+    S.logger = scraper.logging.getLogger("benchmark")
+
+    for size in args.sizes:
+        titles = generateTitles(size)
+
+        start = time.monotonic()
+        cleaned = S.cleanupTitles(set(titles))
+        blocked = time.monotonic() - start
+        print("%7d titles: blocked   %8.3fs, %d left" % (size, blocked, len(cleaned)))
+
+        if size <= args.maxPairwise:
+            start = time.monotonic()
+            expected = pairwiseCleanup(set(titles))
+            pairwise = time.monotonic() - start
+            print("%7d titles: pairwise  %8.3fs, %d left (%s, %.1fx)" % \
+                  (size, pairwise, len(expected), "same output" if expected == cleaned else "DIFFERENT OUTPUT",
+                   pairwise / blocked))
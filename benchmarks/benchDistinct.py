@@ -0,0 +1,57 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Benchmark of the distinct report of analytics.py: the estimates from the sketches of the titles
+shown against the exact counts from the shows.
+
+It generates the db of benchAnalytics.py, builds its sketches, then counts the distinct titles
+of one location and of all of them, over a year and over all the days, both ways.
+Run from the root of the repository:
+
+    python3 benchmarks/benchDistinct.py [--titles N] [--years N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, _ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark of the counts of the distinct titles shown.')
+    parser.add_argument('--titles', '-t', type = int, default = 300, help = 'Titles shown per day in each location. Defaults to 300.')
+    parser.add_argument('--years', '-y', type = int, default = 2, help = 'Years of shows. Defaults to 2.')
+    args = parser.parse_args()
+
+    import movieLogger
+    import sources
+    import sketches
+    import benchAnalytics
+    movieLogger.MovieLoggger().initLogger('WARNING')
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbfile = os.path.join(tmpDir, "movies.db")
+        benchAnalytics.generateDb(dbfile, args.titles, args.years)
+
+        src = sources.Sources(dbfile = dbfile)
+        src.rebuildAggregates()
+
+        for label, queryArgs in [("one location, one year", ([1], '2017-01-01', '2017-12-31')),
+                                 ("one location", ([1],)),
+                                 ("all locations, one year", (None, '2017-01-01', '2017-12-31')),
+                                 ("all locations", ())]:
+            start = time.perf_counter()
+            estimate = sketches.estimate(sketches.merge(x.sketch for x in src.iterTitleSketches(*queryArgs)))
+            estimateTime = time.perf_counter() - start
+
+            start = time.perf_counter()
+            exact = src.countDistinctTitles(*queryArgs)
+            exactTime = time.perf_counter() - start
+
+            print("%-24s: sketches %7d titles in %.3fs, exact %7d titles in %.3fs (error %+.2f%%)" % \
+                  (label, estimate, estimateTime, exact, exactTime, 100.0 * (estimate - exact) / exact))
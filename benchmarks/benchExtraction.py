@@ -0,0 +1,112 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Benchmark of the title extraction: the whole page parsed by lxml.html (the original path)
+against the streaming TitleExtractor.
+
+Each measure runs in its own process, so that the peak memory (maxrss) of one
+does not hide the other. Run from the root of the repository:
+
+    python3 benchmarks/benchExtraction.py [--xpath XPATH] [page.html ...]
+
+Without pages, it generates a listing page similar to the IMDb showtimes grid.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+_DEFAULT_XPATH = '//div[@class="title"]/a/text()'
+
+def generatePage(fileName = None, titles = 20000):
+    """
+    Writes a listing page with the given number of titles, each with its block of showtimes.
+    """
+    with open(fileName, "wb") as fp:
+        fp.write(b"<html><head><meta charset='utf-8'><title>Showtimes</title></head><body><div id='grid'>")
+        for i in range(titles):
+            fp.write(("<div class='list_item'><div class='image'><img src='/img/%d.jpg' alt='poster'></div>" % i +
+                      "<div class='info'><div class='title'><a href='/title/tt%07d'>Movie number %d</a></div>" % (i, i) +
+                      "<div class='showtimes'>" +
+                      "".join(["<a class='time' href='/t/%d/%d'>%d:%02d</a> | " % (i, h, h, (i * 7) % 60) for h in range(12, 24)]) +
+                      "</div><p class='plot'>" + ("Lorem ipsum dolor sit amet. " * 10) + "</p></div></div>").encode("utf-8"))
+        fp.write(b"</div></body></html>")
+
+def runOne(mode = None, fileName = None, xpath = None):
+    """
+    Extracts the titles from the page with the given mode, printing: titles, cpu seconds, maxrss in KB.
+    """
+    from lxml import html
+    import titleExtractor
+
+    start = resource.getrusage(resource.RUSAGE_SELF)
+    titles = set()
+
+    if mode == "whole":
+        with open(fileName, "rb") as fp:
+            content = fp.read()
+        titles = set(html.fromstring(content).xpath(xpath))
+
+    elif mode == "stream":
+        def chunks():
+            with open(fileName, "rb") as fp:
+                chunk = fp.read(64 * 1024)
+                while chunk:
+                    yield chunk
+                    chunk = fp.read(64 * 1024)
+
+        titles = titleExtractor.TitleExtractor().extract(chunks = chunks(), xpath = xpath)
+
+    end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (end.ru_utime + end.ru_stime) - (start.ru_utime + start.ru_stime)
+    print("%d %.3f %d" % (len(titles), cpu, end.ru_maxrss))
+
+def measure(mode = None, fileName = None, xpath = None):
+    """
+    Runs one extraction in a new process, returning (titles, cpu seconds, maxrss in KB, wall seconds).
+    """
+    start = time.monotonic()
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                   "--run", mode, "--xpath", xpath, fileName])
+    wall = time.monotonic() - start
+    titles, cpu, rss = out.decode().split()
+
+    return int(titles), float(cpu), int(rss), wall
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark of the title extraction.')
+    parser.add_argument('pages', nargs = '*', help = 'Saved listing pages to use.')
+    parser.add_argument('--xpath', '-x', default = _DEFAULT_XPATH, help = 'The titles xpath.')
+    parser.add_argument('--titles', '-t', type = int, default = 20000,
+                        help = 'Number of titles in the generated page. Defaults to 20000.')
+    parser.add_argument('--run', choices = ['none', 'whole', 'stream'], help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        runOne(args.run, args.pages[0], args.xpath)
+        sys.exit(0)
+
+    pages = args.pages
+    tmpDir = None
+    if len(pages) == 0:
+        tmpDir = tempfile.TemporaryDirectory()
+        pages = [os.path.join(tmpDir.name, "grid.html")]
+        generatePage(pages[0], args.titles)
+
+    for page in pages:
+        print("%s (%.1f MB), xpath %s" % (page, os.path.getsize(page) / 1024 / 1024, args.xpath))
+        _, _, baseRss, _ = measure("none", page, args.xpath)
+        for mode in ["whole", "stream"]:
+            titles, cpu, rss, wall = measure(mode, page, args.xpath)
+            print("\t%-6s: %6d titles, %6.3fs cpu, %6.3fs wall, %8d KB peak memory over the interpreter" % \
+                  (mode, titles, cpu, wall, rss - baseRss))
+
+    if tmpDir is not None:
+        tmpDir.cleanup()
@@ -0,0 +1,69 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Benchmark of the overlap report of analytics.py: the bitmaps of the titles shown against
+a join of the shows in SQL.
+
+It generates the db of benchAnalytics.py, builds its bitmaps, then computes the titles
+in common between each pair of locations, each week, both ways.
+Run from the root of the repository:
+
+    python3 benchmarks/benchOverlap.py [--titles N] [--years N]
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, _ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# the titles in common between each pair of locations, each week, from the shows
+_OVERLAP_SQL = "WITH weekly AS (" + \
+               " SELECT DISTINCT til.locations_ref AS location, date(d.date, 'weekday 0', '-6 days') AS week, " + \
+               "  til.titles_ref AS title " + \
+               " FROM daily_shows d JOIN titles_in_locations til ON til.id = d.titles_in_locations_ref) " + \
+               "SELECT a.week, a.location, b.location, COUNT(*) FROM weekly a " + \
+               "JOIN weekly b ON b.week = a.week AND b.title = a.title AND b.location > a.location " + \
+               "GROUP BY a.week, a.location, b.location"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark of the overlap of the titles between the locations.')
+    parser.add_argument('--titles', '-t', type = int, default = 300, help = 'Titles shown per day in each location. Defaults to 300.')
+    parser.add_argument('--years', '-y', type = int, default = 1, help = 'Years of shows. Defaults to 1.')
+    args = parser.parse_args()
+
+    import movieLogger
+    import sources
+    import bitmaps
+    import benchAnalytics
+    movieLogger.MovieLoggger().initLogger('WARNING')
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbfile = os.path.join(tmpDir, "movies.db")
+        benchAnalytics.generateDb(dbfile, args.titles, args.years)
+
+        src = sources.Sources(dbfile = dbfile)
+        start = time.perf_counter()
+        days = src.rebuildAggregates()
+        print("rebuild : %8.3fs, %d days of the locations, %d KB of bitmaps" % \
+              (time.perf_counter() - start, days,
+               sum(len(x[0]) for x in sqlite3.connect(dbfile).execute("SELECT bitmap FROM title_bitmaps")) // 1024))
+
+        start = time.perf_counter()
+        rows = bitmaps.overlap(src.iterTitleBitmaps(), 'week')
+        print("bitmaps : %8.3fs, %d rows" % (time.perf_counter() - start, len(rows)))
+
+        conn = sqlite3.connect(dbfile)
+        start = time.perf_counter()
+        sqlRows = conn.execute(_OVERLAP_SQL).fetchall()
+        print("sql     : %8.3fs, %d rows" % (time.perf_counter() - start, len(sqlRows)))
+        conn.close()
+
+        # the same titles in common (the sql has no rows for the pairs with none)
+        assert sorted(sqlRows) == sorted([x[:3] + (x[5],) for x in rows if x[5] > 0])
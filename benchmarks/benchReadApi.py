@@ -0,0 +1,103 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Benchmark of the read API of Sources: the ORM methods, building all the
+objects in memory, against the iter methods streaming namedtuples.
+
+Each measure runs in its own process, so that the peak memory (maxrss) of one
+does not hide the other. Run from the root of the repository:
+
+    python3 benchmarks/benchReadApi.py [--titles N] [--days N]
+
+It generates a db with the given number of titles in one location, each shown every day.
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+_MODES = ["ormTitlesInLocation", "iterTitlesInLocation", "ormShows", "iterShows"]
+
+def generateDb(dbfile = None, titles = 1000, days = 365):
+    """
+    Creates the db from movieDiversity.sql and fills location 1 with titles shown every day.
+    """
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "movieDiversity.sql"), encoding = "utf-8") as fp:
+        conn = sqlite3.connect(dbfile)
+        conn.executescript(fp.read())
+
+    conn.executemany("INSERT INTO titles (id, title) VALUES (?, ?)",
+                     [(i, "Movie number %d" % i) for i in range(1, titles + 1)])
+    conn.executemany("INSERT INTO titles_in_locations (id, titles_ref, locations_ref) VALUES (?, ?, 1)",
+                     [(i, i) for i in range(1, titles + 1)])
+    conn.executemany("INSERT INTO shows_daily (date, titles_in_locations_ref) VALUES (date('2017-01-01', '+' || ? || ' days'), ?)",
+                     ((d, i) for d in range(days) for i in range(1, titles + 1)))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+def runOne(mode = None, dbfile = None):
+    """
+    Reads the data with the given mode, printing: rows, cpu seconds, maxrss in KB.
+    """
+    import sources
+    src = sources.Sources(dbfile = dbfile)
+
+    start = resource.getrusage(resource.RUSAGE_SELF)
+    rows = 0
+
+    if mode == "ormTitlesInLocation":
+        rows = len(src.getAllTitlesInLocation(1))
+    elif mode == "iterTitlesInLocation":
+        rows = sum(1 for _ in src.iterTitlesInLocation(1))
+    elif mode == "ormShows":
+        rows = len(src.session.query(src.showsClass).all())
+    elif mode == "iterShows":
+        rows = sum(1 for _ in src.iterShows())
+
+    end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (end.ru_utime + end.ru_stime) - (start.ru_utime + start.ru_stime)
+    print("%d %.3f %d" % (rows, cpu, end.ru_maxrss))
+
+def measure(mode = None, dbfile = None):
+    """
+    Runs one read in a new process, returning (rows, cpu seconds, maxrss in KB, wall seconds).
+    """
+    start = time.monotonic()
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--run", mode, "--dbfile", dbfile],
+                                  stderr = subprocess.DEVNULL)
+    wall = time.monotonic() - start
+    rows, cpu, rss = out.decode().split()[-3:]
+
+    return int(rows), float(cpu), int(rss), wall
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark of the read API of Sources.')
+    parser.add_argument('--titles', '-t', type = int, default = 1000, help = 'Titles in the db. Defaults to 1000.')
+    parser.add_argument('--days', '-d', type = int, default = 365, help = 'Days of shows of each title. Defaults to 365.')
+    parser.add_argument('--run', choices = _MODES + ['none'], help = argparse.SUPPRESS)
+    parser.add_argument('--dbfile', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        runOne(args.run, args.dbfile)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbfile = os.path.join(tmpDir, "movies.db")
+        generateDb(dbfile, args.titles, args.days)
+        print("%d titles, %d shows" % (args.titles, args.titles * args.days))
+
+        _, _, baseRss, _ = measure("none", dbfile)
+        for mode in _MODES:
+            rows, cpu, rss, wall = measure(mode, dbfile)
+            print("\t%-22s: %8d rows, %6.3fs cpu, %8d KB peak memory over the interpreter" % \
+                  (mode, rows, cpu, rss - baseRss))
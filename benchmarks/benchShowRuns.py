@@ -0,0 +1,110 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Benchmark of the storage of the shows: daily shows against runs of shows.
+
+It generates a db of daily shows, measures its size and the reads of the first and
+last shows and of a range of shows, then compacts the shows into runs (maintenance.py
+--compactShows --vacuum) and measures again. Each read runs in its own process.
+Run from the root of the repository:
+
+    python3 benchmarks/benchShowRuns.py [--titles N] [--days N] [--runDays N]
+
+Each title is shown in runs of runDays days, with a day off between them.
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, _ROOT)
+
+_MODES = ["firstLastShow", "showsInRange"]
+
+def generateDb(dbfile = None, titles = 1000, days = 365, runDays = 56):
+    """
+    Creates the db from movieDiversity.sql and fills location 1 with the daily shows of the titles.
+    """
+    with open(os.path.join(_ROOT, "movieDiversity.sql"), encoding = "utf-8") as fp:
+        conn = sqlite3.connect(dbfile)
+        conn.executescript(fp.read())
+
+    conn.executemany("INSERT INTO titles (id, title) VALUES (?, ?)",
+                     [(i, "Movie number %d" % i) for i in range(1, titles + 1)])
+    conn.executemany("INSERT INTO titles_in_locations (id, titles_ref, locations_ref) VALUES (?, ?, 1)",
+                     [(i, i) for i in range(1, titles + 1)])
+    conn.executemany("INSERT INTO shows_daily (date, titles_in_locations_ref) VALUES (date('2017-01-01', '+' || ? || ' days'), ?)",
+                     ((d, i) for d in range(days) for i in range(1, titles + 1) if (d + i) % (runDays + 1) != 0))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+def runOne(mode = None, dbfile = None):
+    """
+    Reads the shows with the given mode, printing: rows, seconds.
+    """
+    import sources
+    src = sources.Sources(dbfile = dbfile)
+
+    start = time.perf_counter()
+    rows = 0
+
+    if mode == "firstLastShow":
+        rows = len(src.getAllTitlesInLocation(1))
+    elif mode == "showsInRange":
+        rows = sum(1 for _ in src.iterShows(locationId = 1, dateFrom = '2017-06-01', dateTo = '2017-06-07'))
+
+    print("%d %.4f" % (rows, time.perf_counter() - start))
+
+def measure(mode = None, dbfile = None):
+    """
+    Runs one read in a new process, returning (rows, seconds).
+    """
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--run", mode, "--dbfile", dbfile],
+                                  stderr = subprocess.DEVNULL)
+    rows, seconds = out.decode().split()[-2:]
+
+    return int(rows), float(seconds)
+
+def report(label = "", dbfile = None):
+    """
+    Prints the size of the db and the times of the reads.
+    """
+    conn = sqlite3.connect(dbfile)
+    counts = [conn.execute("SELECT count(*) FROM %s" % x).fetchone()[0] for x in ["shows_daily", "show_runs"]]
+    conn.close()
+
+    print("%s: %d daily shows, %d runs, %d KB" % (label, counts[0], counts[1], os.path.getsize(dbfile) // 1024))
+    for mode in _MODES:
+        rows, seconds = measure(mode, dbfile)
+        print("\t%-14s: %6d rows, %8.4fs" % (mode, rows, seconds))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark of daily shows against runs of shows.')
+    parser.add_argument('--titles', '-t', type = int, default = 1000, help = 'Titles in the db. Defaults to 1000.')
+    parser.add_argument('--days', '-d', type = int, default = 365, help = 'Days of shows. Defaults to 365.')
+    parser.add_argument('--runDays', '-r', type = int, default = 56, help = 'Days of each run of shows. Defaults to 56.')
+    parser.add_argument('--run', choices = _MODES, help = argparse.SUPPRESS)
+    parser.add_argument('--dbfile', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        runOne(args.run, args.dbfile)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dbfile = os.path.join(tmpDir, "movies.db")
+        generateDb(dbfile, args.titles, args.days, args.runDays)
+        report("daily shows", dbfile)
+
+        start = time.monotonic()
+        subprocess.run([sys.executable, os.path.join(_ROOT, "maintenance.py"), "--dbfile", dbfile, "--compactShows", "--vacuum"],
+                       cwd = _ROOT, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, check = True)
+        print("compaction: %.3fs" % (time.monotonic() - start))
+        report("runs of shows", dbfile)
@@ -0,0 +1,76 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Benchmark of the cold start of the entry points of the app.
+
+For each entry point it measures, in new processes, the time to import the module
+and the time to answer --help; then the time to open a db with Sources, with and
+without the scan for test records. Run from the root of the repository:
+
+    python3 benchmarks/benchStartup.py [--runs N] [--dbfile DB]
+
+Without a db, it creates one from movieDiversity.sql.
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+_ENTRY_POINTS = ["scraper", "translationMatcher", "analytics", "migrations", "maintenance"]
+
+def timeProcess(args = None, runs = 5):
+    """
+    Runs the python interpreter with args the given number of times, returning the median wall seconds.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = _ROOT
+
+    times = []
+    for _ in range(runs):
+        start = time.monotonic()
+        subprocess.run([sys.executable] + args, cwd = _ROOT, env = env,
+                       stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, check = True)
+        times.append(time.monotonic() - start)
+
+    return statistics.median(times)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark of the cold start of the entry points.')
+    parser.add_argument('--runs', '-r', type = int, default = 5, help = 'Runs per measure. Defaults to 5.')
+    parser.add_argument('--dbfile', '-db', help = 'The db to open with Sources.')
+    args = parser.parse_args()
+
+    baseline = timeProcess(["-c", "pass"], args.runs)
+    print("interpreter alone: %.3fs" % baseline)
+
+    for entryPoint in _ENTRY_POINTS:
+        importTime = timeProcess(["-c", "import %s" % entryPoint], args.runs)
+        helpTime = timeProcess([entryPoint + ".py", "--help"], args.runs)
+        print("%-20s: import %.3fs, --help %.3fs (over the interpreter)" % \
+              (entryPoint, importTime - baseline, helpTime - baseline))
+
+    tmpDir = None
+    dbfile = args.dbfile
+    if dbfile is None:
+        tmpDir = tempfile.TemporaryDirectory()
+        dbfile = os.path.join(tmpDir.name, "movies.db")
+        with open(os.path.join(_ROOT, "movieDiversity.sql"), encoding = "utf-8") as fp:
+            conn = sqlite3.connect(dbfile)
+            conn.executescript(fp.read())
+            conn.close()
+
+    for checkTestData in [False, True]:
+        openTime = timeProcess(["-c", "import sources; sources.Sources(dbfile = %r, checkTestData = %s)" % \
+                                (os.path.abspath(dbfile), checkTestData)], args.runs)
+        print("Sources(checkTestData = %-5s): %.3fs (over the interpreter)" % (checkTestData, openTime - baseline))
+
+    if tmpDir is not None:
+        tmpDir.cleanup()
@@ -15,3 +15,13 @@ echo "Running ${ME} Using: ${CURRENT_WORKSPACE}"
 PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testSources.py $@
 PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testMovieDbClasses.py $@
 PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testImdbRestClient.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testHttpTransport.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testPageCache.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testTitleExtractor.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testPageArchive.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testStringUtils.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testMigrations.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testAnalytics.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testAggregates.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testBitmaps.py $@
+PYTHONPATH="$CURRENT_PYTHONPATH" python3 tests/testSketches.py $@
@@ -0,0 +1,118 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Bitmaps of the titles shown in each location on each day, for the comparisons between locations.
+
+title_bitmaps has a row for each location and day with shows, whose bitmap has the bit
+of the id of each title shown set (bit i of byte k for the title 8 * k + i), compressed with zlib.
+The bitmaps are read back as python ints, so the titles shown in a location over some days
+are the OR of its bitmaps, and the titles shown in two locations the AND of theirs.
+
+Sources refreshes the days of the shows it writes, in the same transaction, like the other
+aggregates (see aggregates.py). All the functions take a cursor on the db, and run in its
+current transaction.
+"""
+import zlib
+import datetime
+import itertools
+
+import titlesShown
+
+def encode(titleIds = None):
+    """
+    Returns the compressed bitmap of the given titles (ids).
+    """
+    titleIds = list(titleIds)
+    bits = bytearray((max(titleIds) >> 3) + 1 if len(titleIds) > 0 else 0)
+    for titleId in titleIds:
+        bits[titleId >> 3] |= 1 << (titleId & 7)
+
+    return zlib.compress(bytes(bits))
+
+def decode(blob = None):
+    """
+    Returns the bitmap, as an int, of a compressed one.
+    """
+    return int.from_bytes(zlib.decompress(blob), 'little')
+
+def titleIds(bitmap = 0):
+    """
+    Returns the sorted list of the titles (ids) in the bitmap.
+    """
+    return [i for i, bit in enumerate(reversed(bin(bitmap)[2:])) if bit == '1']
+
+def refreshDays(cur = None, days = None):
+    """
+    Recomputes the bitmaps of the given (locations_ref, date) from their runs of shows and daily shows.
+    """
+    for locationsRef, date in sorted(set(days)):
+        titles = titlesShown.titlesOfDay(cur, locationsRef, date)
+
+        if len(titles) == 0:
+            cur.execute("DELETE FROM title_bitmaps WHERE locations_ref = ? AND date = ?", (locationsRef, date))
+        else:
+            cur.execute("INSERT INTO title_bitmaps (locations_ref, date, bitmap) VALUES (?, ?, ?) " +
+                        "ON CONFLICT (locations_ref, date) DO UPDATE SET bitmap = excluded.bitmap",
+                        (locationsRef, date, encode(titles)))
+
+def rebuild(cur = None):
+    """
+    Recomputes all the bitmaps from the runs of shows and the daily shows, one (location, day) at a time.
+    Returns the number of (location, day) with shows.
+    """
+    cur.execute("DELETE FROM title_bitmaps")
+
+    return titlesShown.insertDays(cur, "INSERT INTO title_bitmaps (locations_ref, date, bitmap) VALUES (?, ?, ?)",
+                                  ((x[0], x[1], encode(x[2])) for x in titlesShown.iterDays(cur)))
+
+def periodStart(date = None, period = None):
+    """
+    Returns the first day of the period ('day', 'week' starting on Monday, 'month') of the date,
+    or None for no period.
+    """
+    if period is None:
+        return None
+    if period == 'day':
+        return date
+
+    day = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    if period == 'week':
+        day = day - datetime.timedelta(days = day.weekday())
+    elif period == 'month':
+        day = day.replace(day = 1)
+    else:
+        raise ValueError("Unknown period %s" % period)
+
+    return day.strftime('%Y-%m-%d')
+
+def overlap(rows = None, period = None, locationId = None):
+    """
+    Compares the titles shown in the locations, two by two, in each period ('day', 'week' or 'month';
+    all the days of the rows at once if None), given the rows (locations_ref, date, bitmap).
+    If locationId is given, only the pairs including it are compared.
+
+    Returns the list of (from, location, other location, titles, other titles, intersection, union, jaccard),
+    ordered by period and locations, where from is the first day of the period (the first day of the rows if None).
+    """
+    unions = {}
+    firstDay = None
+    for locationsRef, date, bitmap in rows:
+        key = (periodStart(date, period), locationsRef)
+        unions[key] = unions.get(key, 0) | bitmap
+        firstDay = date if firstDay is None else min(firstDay, date)
+
+    output = []
+    for start, group in itertools.groupby(sorted(unions.items(), key = lambda x: (x[0][0] or "", x[0][1])),
+                                          lambda x: x[0][0]):
+        locations = [(x[0][1], x[1]) for x in group]
+        for (location, titles), (other, otherTitles) in itertools.combinations(locations, 2):
+            if locationId is not None and locationId not in (location, other):
+                continue
+            intersection = (titles & otherTitles).bit_count()
+            union = (titles | otherTitles).bit_count()
+            output.append((firstDay if start is None else start, location, other,
+                           titles.bit_count(), otherTitles.bit_count(), intersection, union, intersection / union))
+
+    return output
@@ -0,0 +1,257 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Pooled HTTP transport used by the MovieDiversity scraper.
+It keeps one keep-alive connection pool per host, negotiates compression,
+enforces timeouts and a maximum body size, and counts what goes over the wire.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import movieLogger
+
+class TransportError(Exception):
+    """
+    Error class for the http transport.
+    """
+
+    def __init__(self, message):
+        super(TransportError, self).__init__(message)
+        self.message = message
+
+class TransportResponse(object):
+    """
+    A response being read from the transport.
+
+    The body is read in chunks through iterContent(), or all at once
+    through the content property.
+    """
+    url = None
+    status_code = None
+    headers = None
+    start = None
+    bytesRead = 0
+
+    _response = None
+    _transport = None
+    _content = None
+
+    def __init__(self, response = None, transport = None, start = None):
+        self._response = response
+        self._transport = transport
+        self.url = response.url
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.start = start
+
+    def iterContent(self):
+        """
+        Yields the (decompressed) body in chunks, raising a TransportError
+        if it grows beyond the maximum size allowed or takes too long to arrive.
+        """
+        for chunk in self._response.iter_content(chunk_size = self._transport._chunkSize):
+            self.bytesRead += len(chunk)
+            self._transport._checkLimits(self)
+            yield chunk
+
+    @property
+    def content(self):
+        """
+        The whole body, as bytes.
+        """
+        if self._content is None:
+            self._content = b"".join(self.iterContent())
+
+        return self._content
+
+class HttpTransport(object):
+    """
+    Reusable HTTP transport, meant to be owned by a Scraper and shared by all its fetches.
+
+    Requests to the same host go through the same pool of keep-alive connections,
+    gzip/deflate (and brotli, when available) are accepted, and every request is bound
+    by a connect timeout, a read timeout, a total time and a maximum body size.
+    """
+    logger = None
+
+    _connectTimeout = 5.0
+    _readTimeout = 30.0
+    _totalTimeout = 120.0
+    _maxBodySize = 16 * 1024 * 1024
+    _chunkSize = 64 * 1024
+    _maxHosts = 32
+
+    _session = None
+    _adapter = None
+
+    # per site counters: {site: {'requests', 'bytes', 'wireBytes', 'latency', 'maxLatency'}}
+    _siteStats = None
+    _statsLock = None
+
+    def __init__(self,
+                 connectTimeout = None,
+                 readTimeout = None,
+                 totalTimeout = None,
+                 maxBodySize = None,
+                 maxPerHost = 2):
+        """
+        Builds the session and its connection pools.
+        Each host gets a pool of up to maxPerHost connections kept alive between requests.
+        """
+        self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+
+        # requests is imported only when a transport is actually needed
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.request import ACCEPT_ENCODING
+
+        if connectTimeout is not None:
+            self._connectTimeout = connectTimeout
+        if readTimeout is not None:
+            self._readTimeout = readTimeout
+        if totalTimeout is not None:
+            self._totalTimeout = totalTimeout
+        if maxBodySize is not None:
+            self._maxBodySize = maxBodySize
+
+        self._adapter = HTTPAdapter(pool_connections = self._maxHosts,
+                                    pool_maxsize = maxPerHost,
+                                    pool_block = True)
+        self._session = requests.Session()
+        self._session.mount('http://', self._adapter)
+        self._session.mount('https://', self._adapter)
+        self._session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+        self._siteStats = {}
+        self._statsLock = threading.Lock()
+
+        self.logger.debug("Transport inited, accepting encodings: %s.", ACCEPT_ENCODING)
+
+    @contextmanager
+    def stream(self, url = "", headers = None, site = None):
+        """
+        Context manager issuing a GET for url and yielding a TransportResponse
+        whose body has not been read yet. The connection goes back to its pool
+        when the context is left.
+
+        Site is the name the counters are kept under, it defaults to the host of the url.
+        """
+        import requests
+
+        if site is None:
+            site = urlparse(url).netloc.lower()
+
+        start = time.monotonic()
+        try:
+            response = self._session.get(url,
+                                         headers = headers,
+                                         stream = True,
+                                         timeout = (self._connectTimeout, self._readTimeout))
+        except requests.exceptions.RequestException as err:
+            raise TransportError("Could not get %s: %s" % (url, err))
+
+        transportResponse = TransportResponse(response = response, transport = self, start = start)
+        try:
+            yield transportResponse
+
+        except requests.exceptions.RequestException as err:
+            raise TransportError("Could not read %s: %s" % (url, err))
+
+        finally:
+            wireBytes = response.raw.tell()
+            response.close()
+            self._record(site, transportResponse.bytesRead, wireBytes, time.monotonic() - start)
+
+    def fetch(self, url = "", headers = None, site = None):
+        """
+        Issues a GET for url and returns a TransportResponse whose content has been read in full.
+        """
+        with self.stream(url = url, headers = headers, site = site) as response:
+            response.content
+
+        return response
+
+    def _checkLimits(self, response = None):
+        """
+        Raises a TransportError if the response is over the size or time limits.
+        """
+        if response.bytesRead > self._maxBodySize:
+            raise TransportError("Response from %s is larger than %d bytes, giving up." % \
+                                 (response.url, self._maxBodySize))
+
+        if time.monotonic() - response.start > self._totalTimeout:
+            raise TransportError("Response from %s took more than %.1f seconds, giving up." % \
+                                 (response.url, self._totalTimeout))
+
+    def _record(self, site = None, bytesRead = 0, wireBytes = 0, latency = 0.0):
+        """
+        Updates the counters for the site.
+        """
+        with self._statsLock:
+            stats = self._siteStats.setdefault(site, {'requests': 0,
+                                                      'bytes': 0,
+                                                      'wireBytes': 0,
+                                                      'latency': 0.0,
+                                                      'maxLatency': 0.0})
+            stats['requests'] += 1
+            stats['bytes'] += bytesRead
+            stats['wireBytes'] += wireBytes
+            stats['latency'] += latency
+            stats['maxLatency'] = max(stats['maxLatency'], latency)
+
+    def getStats(self):
+        """
+        Returns the counters collected so far:
+            {'bytes': decompressed bytes read,
+             'wireBytes': bytes actually received,
+             'connectionsOpened': number of connections opened,
+             'connectionsReused': number of requests served on an already open connection,
+             'sites': {site name: {'requests', 'bytes', 'wireBytes', 'latency', 'maxLatency'}}}
+        """
+        opened = 0
+        served = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                served += pool.num_requests
+
+        with self._statsLock:
+            sites = {k: dict(v) for k, v in self._siteStats.items()}
+
+        return {'bytes': sum([x['bytes'] for x in sites.values()]),
+                'wireBytes': sum([x['wireBytes'] for x in sites.values()]),
+                'connectionsOpened': opened,
+                'connectionsReused': max(served - opened, 0),
+                'sites': sites}
+
+    def logStats(self):
+        """
+        Logs the counters collected so far.
+        """
+        stats = self.getStats()
+
+        self.logger.info("Transport: read %d bytes (%d on the wire), %d connections opened, %d reused.",
+                         stats['bytes'],
+                         stats['wireBytes'],
+                         stats['connectionsOpened'],
+                         stats['connectionsReused'])
+        for site, siteStats in sorted(stats['sites'].items()):
+            self.logger.info("\t%s: %d request(s), %d bytes, %.2fs average latency, %.2fs max.",
+                             site,
+                             siteStats['requests'],
+                             siteStats['bytes'],
+                             siteStats['latency'] / siteStats['requests'],
+                             siteStats['maxLatency'])
+
+    def close(self):
+        """
+        Closes all the pooled connections.
+        """
+        self._session.close()
@@ -0,0 +1,77 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Maintenance of a MovieDiversity db, not to be run while the scraper is writing.
+
+It can be run from the command line:
+
+    python3 maintenance.py --dbfile movieDiversity.db [--catchUpStats | --rebuildStats] [--compactShows] [--vacuum]
+"""
+import sys
+import logging
+import argparse
+from contextlib import closing
+
+import movieLogger
+from utils import dbUtils as db
+
+def vacuum(dbfile = None):
+    """
+    Rebuilds the db file, giving back to the file system the pages left free by the deletes.
+    """
+    logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+
+    with closing(db.connect(dbfile = dbfile)) as conn:
+        pages = conn.execute("PRAGMA page_count;").fetchone()[0]
+        conn.execute("VACUUM;")
+        logger.info("Db %s vacuumed: %d pages, from %d.", dbfile, conn.execute("PRAGMA page_count;").fetchone()[0], pages)
+
+if __name__ == "__main__":
+    # Parse arguments from command line
+    parser = argparse.ArgumentParser(description = 'Maintenance of a MovieDiversity db.')
+    parser.add_argument('--dbfile', '-db',
+                        required = True,
+                        help = 'The sqlite db file.')
+    parser.add_argument('--catchUpStats', '-cus',
+                        action = 'store_true',
+                        help = 'Aggregate the daily shows written by other means than the scraper.')
+    parser.add_argument('--rebuildStats', '-rs',
+                        action = 'store_true',
+                        help = 'Recompute all the aggregates of the shows from scratch.')
+    parser.add_argument('--compactShows', '-cs',
+                        action = 'store_true',
+                        help = 'Convert the daily shows into runs of shows.')
+    parser.add_argument('--vacuum', '-v',
+                        action = 'store_true',
+                        help = 'Give the free space back to the file system (after the other operations).')
+    parser.add_argument('--logLevel', '-log',
+                        required = False,
+                        choices = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                        help = 'The level of output for logging. Defaults to INFO.')
+
+    args = parser.parse_args()
+
+    movieLogger.MovieLoggger().initLogger(level = args.logLevel)
+    logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+
+    if not (args.catchUpStats or args.rebuildStats or args.compactShows or args.vacuum):
+        parser.error("Nothing to do: give at least one of --catchUpStats, --rebuildStats, --compactShows and --vacuum.")
+
+    try:
+        if args.catchUpStats or args.rebuildStats or args.compactShows:
+            import sources
+            src = sources.Sources(dbfile = args.dbfile)
+            if args.rebuildStats:
+                src.rebuildAggregates()
+            elif args.catchUpStats:
+                src.catchUpAggregates()
+            if args.compactShows:
+                src.compactShows()
+        if args.vacuum:
+            vacuum(args.dbfile)
+
+    except Exception as e:
+        logger.error("Maintenance of %s failed: %s", args.dbfile, e)
+        sys.exit(1)
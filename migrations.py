@@ -0,0 +1,470 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Versioned migrations of the MovieDiversity db schema.
+
+The version of a db is kept in its PRAGMA user_version: a db created by movieDiversity.sql
+is stamped with the latest version, an older one is brought up to date by applying,
+in order, the migrations it misses. Each migration runs in its own transaction,
+together with the update of the version, so a db is never left half migrated.
+
+It can be run from the command line:
+
+    python3 migrations.py --dbfile movieDiversity.db [--status] [--analyze]
+"""
+import sys
+import logging
+import argparse
+from contextlib import closing
+
+import movieLogger
+import aggregates
+import bitmaps
+import sketches
+from utils import dbUtils as db
+
+class MigrationError(Exception):
+    """
+    Error class for the migrations.
+    """
+
+    def __init__(self, message):
+        super(MigrationError, self).__init__(message)
+        self.message = message
+
+def getVersion(conn = None):
+    """
+    Returns the schema version of the db behind the given sqlite3 connection.
+    """
+    with closing(conn.cursor()) as cur:
+        cur.execute("PRAGMA user_version;")
+        return cur.fetchone()[0]
+
+def _addSitesPagination(cur):
+    """
+    Columns describing the paginated listings of the sites.
+    """
+    cur.execute("PRAGMA table_info(sites);")
+    siteColumns = [x['name'] for x in cur.fetchall()]
+    for column, columnType in [('page_param', 'text'), ('next_page_xpath', 'text'), ('max_pages', 'integer')]:
+        if column not in siteColumns:
+            cur.execute("ALTER TABLE sites ADD COLUMN %s %s;" % (column, columnType))
+
+def _addTitleAliases(cur):
+    """
+    The raw scraped titles already resolved in each location.
+    """
+    # same text as in movieDiversity.sql: the schema tests look for it
+    cur.execute("""CREATE TABLE IF NOT EXISTS title_aliases (id integer PRIMARY KEY,
+                            raw_title text NOT NULL,
+                            locations_ref integer NOT NULL,
+                            titles_ref integer NOT NULL,
+                            titles_in_locations_ref integer NOT NULL,
+                            FOREIGN KEY (locations_ref) references locations(id),
+                            FOREIGN KEY (titles_ref) references titles(id),
+                            FOREIGN KEY (titles_in_locations_ref) references titles_in_locations(id));""")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS title_aliases_raw_title ON title_aliases (raw_title, locations_ref);")
+
+def _addUniqueShows(cur):
+    """
+    One titles_in_locations per title and location, and one show per day:
+    the duplicates are merged into the first one.
+    """
+    for table in ['shows', 'title_aliases']:
+        cur.execute("UPDATE %s SET titles_in_locations_ref = " % table +
+                    "(SELECT MIN(t2.id) FROM titles_in_locations t1, titles_in_locations t2 " +
+                    " WHERE t1.id = %s.titles_in_locations_ref " % table +
+                    " AND t2.titles_ref = t1.titles_ref AND t2.locations_ref = t1.locations_ref);")
+    cur.execute("DELETE FROM titles_in_locations WHERE id NOT IN " +
+                "(SELECT MIN(id) FROM titles_in_locations GROUP BY titles_ref, locations_ref);")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS titles_in_locations_unique ON titles_in_locations (titles_ref, locations_ref);")
+
+    cur.execute("DELETE FROM shows WHERE id NOT IN " +
+                "(SELECT MIN(id) FROM shows GROUP BY titles_in_locations_ref, date);")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS shows_unique ON shows (titles_in_locations_ref, date);")
+
+def _addQueryIndexes(cur):
+    """
+    Indexes for the joins and filters of Sources not already covered by the unique ones.
+    """
+    cur.execute("CREATE INDEX IF NOT EXISTS titles_in_locations_locations ON titles_in_locations (locations_ref);")
+    cur.execute("CREATE INDEX IF NOT EXISTS shows_date ON shows (date);")
+    cur.execute("CREATE INDEX IF NOT EXISTS translations_title_from ON translations (title_from_ref, lang_from);")
+
+def _analyze(cur):
+    """
+    Statistics for the query planner, so that it can choose among the new indexes.
+    """
+    cur.execute("ANALYZE;")
+
+def _addShowRuns(cur):
+    """
+    The shows as runs of consecutive days, with views over them and the daily shows.
+    """
+    # same text as in movieDiversity.sql
+    cur.execute("""CREATE TABLE IF NOT EXISTS show_runs (id integer PRIMARY KEY,
+                        titles_in_locations_ref integer NOT NULL,
+                        first_date text NOT NULL,
+                        last_date text NOT NULL,
+                        FOREIGN KEY (titles_in_locations_ref) references titles_in_locations(id),
+                        CHECK (first_date <= last_date));""")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS show_runs_unique ON show_runs (titles_in_locations_ref, first_date);")
+    cur.execute("CREATE INDEX IF NOT EXISTS show_runs_last_date ON show_runs (titles_in_locations_ref, last_date);")
+    cur.execute("CREATE INDEX IF NOT EXISTS show_runs_dates ON show_runs (last_date, first_date);")
+    cur.execute("""CREATE VIEW IF NOT EXISTS daily_shows AS
+    WITH RECURSIVE days (titles_in_locations_ref, date, last_date) AS (
+        SELECT titles_in_locations_ref, first_date, last_date FROM show_runs
+        UNION ALL
+        SELECT titles_in_locations_ref, date(date, '+1 day'), last_date FROM days WHERE date < last_date)
+    SELECT date, titles_in_locations_ref FROM days
+    UNION
+    SELECT date, titles_in_locations_ref FROM shows;""")
+
+def _requestRebuild(cur):
+    """
+    Asks for the data derived from the shows to be rebuilt once the migrations are over (see SchemaMigrator.rebuild()).
+    """
+    cur.execute("INSERT INTO aggregate_watermarks (name, last_id) VALUES ('rebuild', 0) ON CONFLICT (name) DO NOTHING;")
+
+def _addAggregates(cur):
+    """
+    The aggregate tables of the shows, built from the shows already there after the migrations.
+    """
+    # same text as in movieDiversity.sql
+    cur.execute("""CREATE TABLE IF NOT EXISTS daily_stats (id integer PRIMARY KEY,
+                          locations_ref integer NOT NULL,
+                          date text NOT NULL,
+                          titles integer NOT NULL,
+                          new_titles integer NOT NULL,
+                          departed_titles integer NOT NULL,
+                          FOREIGN KEY (locations_ref) references locations(id));""")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS daily_stats_unique ON daily_stats (locations_ref, date);")
+    cur.execute("""CREATE TABLE IF NOT EXISTS period_stats (id integer PRIMARY KEY,
+                           locations_ref integer NOT NULL,
+                           period text NOT NULL,
+                           start_date text NOT NULL,
+                           titles integer NOT NULL,
+                           title_days integer NOT NULL,
+                           new_titles integer NOT NULL,
+                           departed_titles integer NOT NULL,
+                           FOREIGN KEY (locations_ref) references locations(id),
+                           CHECK (period in ('week', 'month')));""")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS period_stats_unique ON period_stats (locations_ref, period, start_date);")
+    cur.execute("""CREATE TABLE IF NOT EXISTS aggregate_watermarks (id integer PRIMARY KEY,
+                                   name text NOT NULL,
+                                   last_id integer NOT NULL);""")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS aggregate_watermarks_name ON aggregate_watermarks (name);")
+    _requestRebuild(cur)
+
+def _addShowBounds(cur):
+    """
+    The first and last day shown and the days shown of each title in each location,
+    computed from the shows already there after the migrations.
+    """
+    cur.execute("PRAGMA table_info(titles_in_locations);")
+    tilColumns = [x['name'] for x in cur.fetchall()]
+    for column, columnType in [('first_show', 'text'), ('last_show', 'text'), ('show_count', 'integer NOT NULL DEFAULT 0')]:
+        if column not in tilColumns:
+            cur.execute("ALTER TABLE titles_in_locations ADD COLUMN %s %s;" % (column, columnType))
+    cur.execute("CREATE INDEX IF NOT EXISTS titles_in_locations_first_show ON titles_in_locations (locations_ref, first_show);")
+    cur.execute("CREATE INDEX IF NOT EXISTS titles_in_locations_last_show ON titles_in_locations (locations_ref, last_show);")
+    _requestRebuild(cur)
+
+def _addTitleBitmaps(cur):
+    """
+    The bitmaps of the titles shown in each location on each day, built from the shows already there after the migrations.
+    """
+    # same text as in movieDiversity.sql
+    cur.execute("""CREATE TABLE IF NOT EXISTS title_bitmaps (id integer PRIMARY KEY,
+                            locations_ref integer NOT NULL,
+                            date text NOT NULL,
+                            bitmap blob NOT NULL,
+                            FOREIGN KEY (locations_ref) references locations(id));""")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS title_bitmaps_unique ON title_bitmaps (locations_ref, date);")
+    _requestRebuild(cur)
+
+def _addTitleSketches(cur):
+    """
+    The sketches of the titles shown in each location on each day, built from the shows already there after the migrations.
+    """
+    # same text as in movieDiversity.sql
+    cur.execute("""CREATE TABLE IF NOT EXISTS title_sketches (id integer PRIMARY KEY,
+                             locations_ref integer NOT NULL,
+                             date text NOT NULL,
+                             sketch blob NOT NULL,
+                             FOREIGN KEY (locations_ref) references locations(id));""")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS title_sketches_unique ON title_sketches (locations_ref, date);")
+    _requestRebuild(cur)
+
+def _addShowsView(cur):
+    """
+    The daily shows renamed shows_daily, and shows a view of all the shows, one per day, in their place:
+    the queries written against the daily shows see the runs of shows too, and their inserts go
+    to shows_daily.
+    """
+    # copied rather than renamed, to keep the text of movieDiversity.sql (a renamed table gets its name quoted)
+    cur.execute("DROP VIEW IF EXISTS daily_shows;")
+    cur.execute("""CREATE TABLE IF NOT EXISTS shows_daily (id integer PRIMARY KEY,
+                          date text,
+                          titles_in_locations_ref integer NOT NULL,
+                          FOREIGN KEY(titles_in_locations_ref) references titles_in_locations(id));""")
+    cur.execute("INSERT INTO shows_daily (id, date, titles_in_locations_ref) SELECT id, date, titles_in_locations_ref FROM shows;")
+    cur.execute("DROP TABLE shows;")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS shows_daily_unique ON shows_daily (titles_in_locations_ref, date);")
+    cur.execute("CREATE INDEX IF NOT EXISTS shows_daily_date ON shows_daily (date);")
+    # same text as in movieDiversity.sql
+    cur.execute("""CREATE VIEW IF NOT EXISTS daily_shows AS
+    WITH RECURSIVE days (titles_in_locations_ref, date, last_date) AS (
+        SELECT titles_in_locations_ref, first_date, last_date FROM show_runs
+        UNION ALL
+        SELECT titles_in_locations_ref, date(date, '+1 day'), last_date FROM days WHERE date < last_date)
+    SELECT date, titles_in_locations_ref FROM days
+    UNION
+    SELECT date, titles_in_locations_ref FROM shows_daily;""")
+    cur.execute("""CREATE VIEW IF NOT EXISTS shows AS
+    WITH RECURSIVE days (titles_in_locations_ref, date, last_date) AS (
+        SELECT titles_in_locations_ref, first_date, last_date FROM show_runs
+        UNION ALL
+        SELECT titles_in_locations_ref, date(date, '+1 day'), last_date FROM days WHERE date < last_date)
+    SELECT NULL AS id, date, titles_in_locations_ref FROM days d
+    WHERE NOT EXISTS (SELECT 1 FROM shows_daily s
+                      WHERE s.titles_in_locations_ref = d.titles_in_locations_ref AND s.date = d.date)
+    UNION ALL
+    SELECT id, date, titles_in_locations_ref FROM shows_daily;""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS shows_insert INSTEAD OF INSERT ON shows
+    BEGIN
+        INSERT INTO shows_daily (id, date, titles_in_locations_ref) VALUES (NEW.id, NEW.date, NEW.titles_in_locations_ref);
+    END;""")
+
+# version of the db in which the aliases of the titles were introduced
+TITLE_ALIASES_VERSION = 2
+# version of the db in which the runs of shows were introduced
+SHOW_RUNS_VERSION = 6
+# version of the db in which the aggregates were introduced
+AGGREGATES_VERSION = 7
+# version of the db in which the first and last shows of the titles in the locations were introduced
+SHOW_BOUNDS_VERSION = 8
+# version of the db in which the bitmaps of the titles shown were introduced
+TITLE_BITMAPS_VERSION = 9
+# version of the db in which the sketches of the titles shown were introduced
+TITLE_SKETCHES_VERSION = 10
+# version of the db in which the daily shows were renamed shows_daily, behind the shows view
+SHOWS_DAILY_VERSION = 11
+
+# the watermark (see aggregates.py) telling that the data derived from the shows is to be rebuilt
+REBUILD_MARKER = 'rebuild'
+
+class SchemaMigrator(object):
+    """
+    Brings a MovieDiversity db up to the latest version of the schema.
+
+    Migrations are listed in _migrations as (version, description, function):
+    the function gets a cursor and changes the schema (and the data) from the
+    previous version to its own. Migrations are never edited once released,
+    a change to the schema is always a new migration appended to the list
+    (and to movieDiversity.sql, together with its version stamp).
+
+    For this reason the migrations do not compute the data derived from the shows
+    (aggregates, bitmaps, ...) with the code of the other modules, which does change:
+    they only ask for it to be rebuilt, which migrate() does once the migrations are over,
+    with the code of the time and as far as the version of the db goes. The code of the time
+    reads the daily shows from shows_daily: the rebuild waits for the db to have it.
+    """
+    logger = None
+
+    _migrations = [(1, "pagination of the sites' listings", _addSitesPagination),
+                   (2, "aliases of the titles", _addTitleAliases),
+                   (3, "unique titles in locations and shows", _addUniqueShows),
+                   (4, "indexes for the queries", _addQueryIndexes),
+                   (5, "statistics for the query planner", _analyze),
+                   (6, "runs of shows", _addShowRuns),
+                   (7, "aggregates of the shows", _addAggregates),
+                   (8, "first and last shows of the titles in the locations", _addShowBounds),
+                   (9, "bitmaps of the titles shown", _addTitleBitmaps),
+                   (10, "sketches of the titles shown", _addTitleSketches),
+                   (11, "daily shows behind a view of all the shows", _addShowsView)]
+
+    _dbfile = None
+    _conn = None
+
+    def __init__(self, dbfile = None, storageProfile = None):
+        """
+        Connects to the sqlite db in dbfile, with the given storage profile.
+        """
+        self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+
+        self._dbfile = dbfile
+        self._conn = db.connect(dbfile = dbfile, profile = storageProfile)
+
+    def getLatestVersion(self):
+        """
+        Returns the version of the schema the migrations lead to.
+        """
+        return self._migrations[-1][0]
+
+    def getVersion(self):
+        """
+        Returns the current version of the schema of the db.
+        """
+        return getVersion(self._conn)
+
+    def getPendingMigrations(self):
+        """
+        Returns the list of (version, description) of the migrations still to be applied.
+        """
+        version = self.getVersion()
+        return [(x[0], x[1]) for x in self._migrations if x[0] > version]
+
+    def migrate(self, targetVersion = None):
+        """
+        Applies the pending migrations up to targetVersion (the latest one, if None),
+        then rebuilds the data derived from the shows if they asked for it (see rebuild()).
+        Returns the version of the db afterwards.
+
+        A db with no tables is left alone: it is still to be created by movieDiversity.sql.
+        Raises a MigrationError if a migration fails (the db is left at the previous
+        version) or if the db comes from a newer version of the schema.
+        """
+        version = self._applyMigrations(targetVersion)
+        self.rebuild()
+
+        return version
+
+    def _applyMigrations(self, targetVersion = None):
+        """
+        Implementation of migrate(), without the rebuild.
+        """
+        if targetVersion is None:
+            targetVersion = self.getLatestVersion()
+
+        version = self.getVersion()
+        if version > self.getLatestVersion():
+            raise MigrationError("Db %s is at version %d, newer than the latest known (%d)." % \
+                                 (self._dbfile, version, self.getLatestVersion()))
+        if version >= targetVersion:
+            return version
+
+        with closing(db.cursor(self._conn)) as cur:
+            cur.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table';")
+            if cur.fetchone()[0] == 0:
+                self.logger.debug("Db %s is empty, nothing to migrate.", self._dbfile)
+                return version
+
+            for migrationVersion, description, migration in self._migrations:
+                if migrationVersion <= version or migrationVersion > targetVersion:
+                    continue
+
+                cur.execute("BEGIN IMMEDIATE;")
+                try:
+                    # somebody else may have migrated the db while we waited for the lock
+                    cur.execute("PRAGMA user_version;")
+                    if cur.fetchone()[0] < migrationVersion:
+                        migration(cur)
+                        cur.execute("PRAGMA user_version = %d;" % migrationVersion)
+                    cur.execute("COMMIT;")
+
+                except Exception as e:
+                    cur.execute("ROLLBACK;")
+                    raise MigrationError("Migration to version %d (%s) of %s failed: %s" % \
+                                         (migrationVersion, description, self._dbfile, e))
+
+                self.logger.info("Db %s migrated to version %d: %s.", self._dbfile, migrationVersion, description)
+                version = migrationVersion
+
+        return self.getVersion()
+
+    def rebuild(self):
+        """
+        Rebuilds the data derived from the shows, if a migration asked for it, in a transaction of its own:
+        the aggregates, and the first and last shows of the titles in the locations, the bitmaps and
+        the sketches of the titles shown. Returns True if it did.
+        A db before SHOWS_DAILY_VERSION is left to be rebuilt once migrated there.
+
+        Raises a MigrationError if the rebuild fails (it is tried again the next time).
+        """
+        if self.getVersion() < SHOWS_DAILY_VERSION:
+            return False
+
+        with closing(db.cursor(self._conn)) as cur:
+            cur.execute("SELECT count(*) FROM aggregate_watermarks WHERE name = ?;", (REBUILD_MARKER,))
+            if cur.fetchone()[0] == 0:
+                return False
+
+            cur.execute("BEGIN IMMEDIATE;")
+            try:
+                # somebody else may have rebuilt it while we waited for the lock
+                cur.execute("DELETE FROM aggregate_watermarks WHERE name = ?;", (REBUILD_MARKER,))
+                if cur.rowcount > 0:
+                    aggregates.rebuild(cur)
+                    aggregates.refreshTitlesInLocations(cur)
+                    bitmaps.rebuild(cur)
+                    sketches.rebuild(cur)
+                cur.execute("COMMIT;")
+
+            except Exception as e:
+                cur.execute("ROLLBACK;")
+                raise MigrationError("Rebuild of the data derived from the shows of %s failed: %s" % (self._dbfile, e))
+
+        self.logger.info("Rebuilt the data derived from the shows of %s.", self._dbfile)
+        return True
+
+    def analyze(self):
+        """
+        Refreshes the statistics of the query planner, to be run now and then as the data grows.
+        """
+        with closing(self._conn.cursor()) as cur:
+            cur.execute("ANALYZE;")
+
+        self.logger.info("Statistics of %s refreshed.", self._dbfile)
+
+    def close(self):
+        """
+        Closes the connection to the db.
+        """
+        self._conn.close()
+
+if __name__ == "__main__":
+    # Parse arguments from command line
+    parser = argparse.ArgumentParser(description = 'Migrates a MovieDiversity db to the latest version of the schema.')
+    parser.add_argument('--dbfile', '-db',
+                        required = True,
+                        help = 'The sqlite db file to be migrated.')
+    parser.add_argument('--status', '-s',
+                        action = 'store_true',
+                        help = 'Only show the version of the db and the migrations still to be applied.')
+    parser.add_argument('--targetVersion', '-tv',
+                        required = False,
+                        type = int,
+                        help = 'Migrate only up to this version. Defaults to the latest one.')
+    parser.add_argument('--analyze', '-an',
+                        action = 'store_true',
+                        help = 'Refresh the statistics of the query planner after migrating.')
+    parser.add_argument('--logLevel', '-log',
+                        required = False,
+                        choices = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                        help = 'The level of output for logging. Defaults to INFO.')
+
+    args = parser.parse_args()
+
+    movieLogger.MovieLoggger().initLogger(level = args.logLevel)
+    logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+
+    migrator = SchemaMigrator(dbfile = args.dbfile)
+    try:
+        if args.status:
+            logger.info("Db %s is at version %d (latest: %d).", args.dbfile, migrator.getVersion(), migrator.getLatestVersion())
+            for version, description in migrator.getPendingMigrations():
+                logger.info("\tpending: %d - %s", version, description)
+        else:
+            migrator.migrate(targetVersion = args.targetVersion)
+            if args.analyze:
+                migrator.analyze()
+
+    except MigrationError as e:
+        logger.error(e.message)
+        sys.exit(1)
+
+    finally:
+        migrator.close()
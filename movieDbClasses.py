@@ -5,7 +5,7 @@ SQLAlchemy classes for the MovieDiversity db.
 
 @author: Guido
 '''
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Integer, String, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import inspect
 from sqlalchemy.sql.schema import CheckConstraint
@@ -51,6 +51,9 @@ class Sites(Base, movieDbBaseClass):
     title_xpath = Column(String(250))
     active = Column(Integer())
     locations_ref = Column(Integer, ForeignKey("locations.id"))
+    page_param = Column(String(250))
+    next_page_xpath = Column(String(250))
+    max_pages = Column(Integer)
     CheckConstraint("active  in (0, 1)", name = "site_active_constraint")
 
 class Titles(Base, movieDbBaseClass):
@@ -69,16 +72,94 @@ class TitlesInLocations(Base, movieDbBaseClass):
     id = Column(Integer, primary_key = True)
     titles_ref = Column(Integer, ForeignKey('titles.id'))
     locations_ref = Column(Integer, ForeignKey('locations.id'))
+    first_show = Column(String(250))
+    last_show = Column(String(250))
+    show_count = Column(Integer, nullable = False, default = 0)
 
 class Shows(Base, movieDbBaseClass):
     """
-    Table for all shows.
+    View of all shows, one per day, from the runs of shows and the daily shows
+    (the days of the runs have no id).
     """
     __tablename__ = 'shows'
+    id = Column(Integer)
+    date = Column(String(250), primary_key = True)
+    titles_in_locations_ref = Column(Integer, ForeignKey('titles_in_locations.id'), primary_key = True)
+
+class ShowsDaily(Base, movieDbBaseClass):
+    """
+    Table for the daily shows, not yet converted into runs of shows.
+    """
+    __tablename__ = 'shows_daily'
     id = Column(Integer, primary_key = True)
     date = Column(String(250))
     titles_in_locations_ref = Column(Integer, ForeignKey('titles_in_locations.id'))
 
+class ShowRuns(Base, movieDbBaseClass):
+    """
+    Table for the shows of a title in a location on consecutive days.
+    """
+    __tablename__ = 'show_runs'
+    id = Column(Integer, primary_key = True)
+    titles_in_locations_ref = Column(Integer, ForeignKey('titles_in_locations.id'), nullable = False)
+    first_date = Column(String(250), nullable = False)
+    last_date = Column(String(250), nullable = False)
+
+class DailyStats(Base, movieDbBaseClass):
+    """
+    Table for the aggregates of the shows of a location on a day (see aggregates.py).
+    """
+    __tablename__ = 'daily_stats'
+    id = Column(Integer, primary_key = True)
+    locations_ref = Column(Integer, ForeignKey('locations.id'), nullable = False)
+    date = Column(String(250), nullable = False)
+    titles = Column(Integer, nullable = False)
+    new_titles = Column(Integer, nullable = False)
+    departed_titles = Column(Integer, nullable = False)
+
+class PeriodStats(Base, movieDbBaseClass):
+    """
+    Table for the aggregates of the shows of a location in a week or a month (see aggregates.py).
+    """
+    __tablename__ = 'period_stats'
+    id = Column(Integer, primary_key = True)
+    locations_ref = Column(Integer, ForeignKey('locations.id'), nullable = False)
+    period = Column(String(250), nullable = False)
+    start_date = Column(String(250), nullable = False)
+    titles = Column(Integer, nullable = False)
+    title_days = Column(Integer, nullable = False)
+    new_titles = Column(Integer, nullable = False)
+    departed_titles = Column(Integer, nullable = False)
+
+class AggregateWatermarks(Base, movieDbBaseClass):
+    """
+    Table for the last records already aggregated (see aggregates.py).
+    """
+    __tablename__ = 'aggregate_watermarks'
+    id = Column(Integer, primary_key = True)
+    name = Column(String(250), nullable = False)
+    last_id = Column(Integer, nullable = False)
+
+class TitleBitmaps(Base, movieDbBaseClass):
+    """
+    Table for the bitmaps of the titles shown in a location on a day (see bitmaps.py).
+    """
+    __tablename__ = 'title_bitmaps'
+    id = Column(Integer, primary_key = True)
+    locations_ref = Column(Integer, ForeignKey('locations.id'), nullable = False)
+    date = Column(String(250), nullable = False)
+    bitmap = Column(LargeBinary, nullable = False)
+
+class TitleSketches(Base, movieDbBaseClass):
+    """
+    Table for the sketches of the titles shown in a location on a day (see sketches.py).
+    """
+    __tablename__ = 'title_sketches'
+    id = Column(Integer, primary_key = True)
+    locations_ref = Column(Integer, ForeignKey('locations.id'), nullable = False)
+    date = Column(String(250), nullable = False)
+    sketch = Column(LargeBinary, nullable = False)
+
 class Translations(Base, movieDbBaseClass):
     """
     Table for all translations.
@@ -89,6 +170,17 @@ class Translations(Base, movieDbBaseClass):
     title_from_ref = Column(Integer, ForeignKey('titles.id'))
     tmdb_id = Column(Integer, nullable = False)
 
+class TitleAliases(Base, movieDbBaseClass):
+    """
+    Table mapping the exact titles scraped in a location to the titles they were resolved to.
+    """
+    __tablename__ = 'title_aliases'
+    id = Column(Integer, primary_key = True)
+    raw_title = Column(String(250), nullable = False)
+    locations_ref = Column(Integer, ForeignKey('locations.id'), nullable = False)
+    titles_ref = Column(Integer, ForeignKey('titles.id'), nullable = False)
+    titles_in_locations_ref = Column(Integer, ForeignKey('titles_in_locations.id'), nullable = False)
+
 class SQLite_Master(Base):
     """
     Master table of the database.
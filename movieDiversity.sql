@@ -13,6 +13,9 @@ CREATE TABLE sites (id integer PRIMARY KEY,
                     title_xpath text,
                     active integer,
                     locations_ref integer,
+                    page_param text,
+                    next_page_xpath text,
+                    max_pages integer,
                     FOREIGN KEY (locations_ref) references locations(id),
                     CHECK (active in (0, 1)));
 
@@ -22,19 +25,132 @@ CREATE TABLE titles (id integer PRIMARY KEY,
 CREATE TABLE titles_in_locations (id integer PRIMARY KEY,
                                   titles_ref integer NOT NULL,
                                   locations_ref integer NOT NULL,
+                                  first_show text,
+                                  last_show text,
+                                  show_count integer NOT NULL DEFAULT 0,
                                   FOREIGN KEY (titles_ref) references titles(id),
                                   FOREIGN KEY (locations_ref) references locations(id));
 
-CREATE TABLE shows (id integer PRIMARY KEY,
-                    date text,
-                    titles_in_locations_ref integer NOT NULL,
-                    FOREIGN KEY(titles_in_locations_ref) references titles_in_locations(id));
+CREATE UNIQUE INDEX titles_in_locations_unique ON titles_in_locations (titles_ref, locations_ref);
+CREATE INDEX titles_in_locations_locations ON titles_in_locations (locations_ref);
+CREATE INDEX titles_in_locations_first_show ON titles_in_locations (locations_ref, first_show);
+CREATE INDEX titles_in_locations_last_show ON titles_in_locations (locations_ref, last_show);
+
+-- the daily shows, as written before the runs of shows: converted into runs by maintenance.py --compactShows
+CREATE TABLE shows_daily (id integer PRIMARY KEY,
+                          date text,
+                          titles_in_locations_ref integer NOT NULL,
+                          FOREIGN KEY(titles_in_locations_ref) references titles_in_locations(id));
+
+CREATE UNIQUE INDEX shows_daily_unique ON shows_daily (titles_in_locations_ref, date);
+CREATE INDEX shows_daily_date ON shows_daily (date);
+
+-- the shows of consecutive days, as written by Sources
+CREATE TABLE show_runs (id integer PRIMARY KEY,
+                        titles_in_locations_ref integer NOT NULL,
+                        first_date text NOT NULL,
+                        last_date text NOT NULL,
+                        FOREIGN KEY (titles_in_locations_ref) references titles_in_locations(id),
+                        CHECK (first_date <= last_date));
+
+CREATE UNIQUE INDEX show_runs_unique ON show_runs (titles_in_locations_ref, first_date);
+CREATE INDEX show_runs_last_date ON show_runs (titles_in_locations_ref, last_date);
+CREATE INDEX show_runs_dates ON show_runs (last_date, first_date);
+
+-- one row per day shown, from the runs and the daily shows
+CREATE VIEW daily_shows AS
+    WITH RECURSIVE days (titles_in_locations_ref, date, last_date) AS (
+        SELECT titles_in_locations_ref, first_date, last_date FROM show_runs
+        UNION ALL
+        SELECT titles_in_locations_ref, date(date, '+1 day'), last_date FROM days WHERE date < last_date)
+    SELECT date, titles_in_locations_ref FROM days
+    UNION
+    SELECT date, titles_in_locations_ref FROM shows_daily;
+
+-- all the shows, one per day, under the name of the table of the daily shows, for the queries written
+-- against it: the days of the runs have no id. The inserts go to shows_daily.
+CREATE VIEW shows AS
+    WITH RECURSIVE days (titles_in_locations_ref, date, last_date) AS (
+        SELECT titles_in_locations_ref, first_date, last_date FROM show_runs
+        UNION ALL
+        SELECT titles_in_locations_ref, date(date, '+1 day'), last_date FROM days WHERE date < last_date)
+    SELECT NULL AS id, date, titles_in_locations_ref FROM days d
+    WHERE NOT EXISTS (SELECT 1 FROM shows_daily s
+                      WHERE s.titles_in_locations_ref = d.titles_in_locations_ref AND s.date = d.date)
+    UNION ALL
+    SELECT id, date, titles_in_locations_ref FROM shows_daily;
+
+CREATE TRIGGER shows_insert INSTEAD OF INSERT ON shows
+    BEGIN
+        INSERT INTO shows_daily (id, date, titles_in_locations_ref) VALUES (NEW.id, NEW.date, NEW.titles_in_locations_ref);
+    END;
 
 CREATE TABLE translations (id integer PRIMARY KEY,
                            lang_from text,
                            title_from_ref integer,
                            tmdb_id integer,
-                           FOREIGN KEY(title_from_ref) references titles(id);
+                           FOREIGN KEY(title_from_ref) references titles(id));
+
+CREATE INDEX translations_title_from ON translations (title_from_ref, lang_from);
+
+CREATE TABLE title_aliases (id integer PRIMARY KEY,
+                            raw_title text NOT NULL,
+                            locations_ref integer NOT NULL,
+                            titles_ref integer NOT NULL,
+                            titles_in_locations_ref integer NOT NULL,
+                            FOREIGN KEY (locations_ref) references locations(id),
+                            FOREIGN KEY (titles_ref) references titles(id),
+                            FOREIGN KEY (titles_in_locations_ref) references titles_in_locations(id));
+
+CREATE UNIQUE INDEX title_aliases_raw_title ON title_aliases (raw_title, locations_ref);
+
+-- aggregates of the shows, maintained by Sources (see aggregates.py)
+CREATE TABLE daily_stats (id integer PRIMARY KEY,
+                          locations_ref integer NOT NULL,
+                          date text NOT NULL,
+                          titles integer NOT NULL,
+                          new_titles integer NOT NULL,
+                          departed_titles integer NOT NULL,
+                          FOREIGN KEY (locations_ref) references locations(id));
+
+CREATE UNIQUE INDEX daily_stats_unique ON daily_stats (locations_ref, date);
+
+CREATE TABLE period_stats (id integer PRIMARY KEY,
+                           locations_ref integer NOT NULL,
+                           period text NOT NULL,
+                           start_date text NOT NULL,
+                           titles integer NOT NULL,
+                           title_days integer NOT NULL,
+                           new_titles integer NOT NULL,
+                           departed_titles integer NOT NULL,
+                           FOREIGN KEY (locations_ref) references locations(id),
+                           CHECK (period in ('week', 'month')));
+
+CREATE UNIQUE INDEX period_stats_unique ON period_stats (locations_ref, period, start_date);
+
+CREATE TABLE aggregate_watermarks (id integer PRIMARY KEY,
+                                   name text NOT NULL,
+                                   last_id integer NOT NULL);
+
+CREATE UNIQUE INDEX aggregate_watermarks_name ON aggregate_watermarks (name);
+
+-- bitmaps of the titles shown, maintained by Sources (see bitmaps.py)
+CREATE TABLE title_bitmaps (id integer PRIMARY KEY,
+                            locations_ref integer NOT NULL,
+                            date text NOT NULL,
+                            bitmap blob NOT NULL,
+                            FOREIGN KEY (locations_ref) references locations(id));
+
+CREATE UNIQUE INDEX title_bitmaps_unique ON title_bitmaps (locations_ref, date);
+
+-- sketches of the titles shown, maintained by Sources (see sketches.py)
+CREATE TABLE title_sketches (id integer PRIMARY KEY,
+                             locations_ref integer NOT NULL,
+                             date text NOT NULL,
+                             sketch blob NOT NULL,
+                             FOREIGN KEY (locations_ref) references locations(id));
+
+CREATE UNIQUE INDEX title_sketches_unique ON title_sketches (locations_ref, date);
 
 --
 -- Seed data
@@ -45,41 +161,49 @@ INSERT INTO locations VALUES (3, 'New York',      'en');
 INSERT INTO locations VALUES (4, 'Cairo',         'en');
 INSERT INTO locations VALUES (5, 'München',       'de');
 
-INSERT INTO sites VALUES (1,
+INSERT INTO sites (id, name, url, title_xpath, active, locations_ref) VALUES (1,
                           'sfgate.com',
                           'http://www.sfgate.com/cgi-bin/movies/listings/theatershowtimes?county=San%20Francisco',
                           '//div[@class="movie_listing_list"]/div[@class="list"]/div[@class="item"]/div/div[@class="theater"]/a/text()',
                           1,
                           1);
-INSERT INTO sites VALUES (2,
+INSERT INTO sites (id, name, url, title_xpath, active, locations_ref) VALUES (2,
                           'film.it',
                           'http://www.film.it/cercacinema/luogo/milano/',
                           '//div[@class="contenutoscheda_citta"]/p/a/text()',
                           1,
                           2);
-INSERT INTO sites VALUES (3,
+INSERT INTO sites (id, name, url, title_xpath, active, locations_ref) VALUES (3,
                           'mymovies.it',
                           'http://www.mymovies.it/cinema/milano/',
                           '//div[@id="elenco_film"]/div[@class="link"]/div/a/text()',
                           1,
                           2);
-INSERT INTO sites VALUES (4,
+INSERT INTO sites (id, name, url, title_xpath, active, locations_ref) VALUES (4,
 						  'Imdb',
 						  'http://www.imdb.com/showtimes/location/US/10001?ref_=sh_lc&sort=alpha,asc&mode=showtimes_grid&page=1',
 						  '//div[@class="title"]/a/text()',
 						  1,
 						  3);
-INSERT INTO sites VALUES (5,
+INSERT INTO sites (id, name, url, title_xpath, active, locations_ref) VALUES (5,
 						  'cairoscene',
 						  'http://www.cairoscene.com/Movies',
 						  '//div[@class="content-4"]/div/div/div/div[@class="movie-title"]/h2/a/text()',
 						  1,
 						  4);
-INSERT INTO sites VALUES (6,
+INSERT INTO sites (id, name, url, title_xpath, active, locations_ref) VALUES (6,
 						  'muenchen.de',
 						  'https://kino.muenchen.de/kinos-muenchen.html',
 						  '//div[@class="item__content row collapse"]/div/div[@class="upcoming night"]/a/span/text()',
 						  1,
 						  5);
 
+-- paginated listings
+UPDATE sites SET page_param = 'page', max_pages = 10 WHERE id = 4;
+
+--
+-- Schema version: the number of the last migration in migrations.py
+--
+PRAGMA user_version = 11;
+
 COMMIT;
\ No newline at end of file
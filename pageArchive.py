@@ -0,0 +1,339 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Record-and-replay archive of the pages fetched by the scraper.
+"""
+import os
+import io
+import gzip
+import shutil
+import logging
+import datetime
+import threading
+from contextlib import closing, contextmanager
+
+import movieLogger
+import httpTransport
+from utils import dbUtils as db
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class PageArchive(object):
+    """
+    A directory holding the pages fetched by the scraper, so that they can be parsed again later.
+
+    Pages are appended, as WARC-like records (with their URL, sites.id, date and headers),
+    to segment files; each record is compressed on its own (zstd if the zstandard package
+    is available, gzip otherwise) so that it can be read back without reading the
+    whole segment. The index of all the records is kept in a sqlite file in the same directory.
+
+    A page which was not modified since it was last fetched (HTTP 304) is archived as a
+    "revisit" record pointing to the last full copy of the same page.
+    """
+    logger = None
+
+    _INDEX_FILE = "index.db"
+    _maxSegmentSize = 64 * 1024 * 1024
+
+    _archiveDir = None
+    _conn = None
+    _lock = None
+
+    # current segment being written
+    _segmentName = None
+    _segmentSize = 0
+
+    def __init__(self, archiveDir = None):
+        """
+        Opens (or creates) the archive in archiveDir.
+        """
+        self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+
+        self._archiveDir = archiveDir
+        os.makedirs(archiveDir, exist_ok = True)
+
+        self._lock = threading.Lock()
+        self._conn = db.connect(dbfile = os.path.join(archiveDir, self._INDEX_FILE), checkSameThread = False)
+
+        with closing(self._conn.cursor()) as cur:
+            cur.execute("""CREATE TABLE IF NOT EXISTS records (id integer PRIMARY KEY,
+                                                               record_type text NOT NULL,
+                                                               site_id integer,
+                                                               url text NOT NULL,
+                                                               scrape_date text NOT NULL,
+                                                               fetched_at text NOT NULL,
+                                                               status integer,
+                                                               segment text,
+                                                               offset integer,
+                                                               length integer,
+                                                               refers_to integer,
+                                                               FOREIGN KEY (refers_to) references records(id));""")
+            cur.execute("CREATE INDEX IF NOT EXISTS records_url ON records (url, scrape_date);")
+
+        self.logger.info("Page archive opened in '%s'.", archiveDir)
+
+    def record(self, siteId = None, url = "", status = None, headers = None, body = b""):
+        """
+        Appends a fetched page to the archive. Returns the id of its record, or None if
+        the page was not modified (HTTP 304) and there is no full copy of it to point to.
+
+        body is either bytes or a binary file, which is copied to the archive in chunks
+        from its current position.
+        """
+        now = datetime.datetime.now()
+        headers = dict(headers) if headers is not None else {}
+        if isinstance(body, bytes):
+            body = io.BytesIO(body)
+
+        with self._lock:
+            if status == 304:
+                # not modified: point to the last full copy, if there is one
+                previous = self._findLocked(url = url, recordType = 'response')
+                if previous is None:
+                    # a response record with no body would be replayed as an empty page
+                    self.logger.warning("Page %s not modified, but not in the archive: not archived.", url)
+                    return None
+                return self._index('revisit', siteId, url, now, status, None, None, None, previous['id'])
+
+            start = body.tell()
+            bodySize = body.seek(0, io.SEEK_END) - start
+            body.seek(start)
+
+            httpHeaders = ("HTTP/1.1 %s\r\n" % status +
+                           "".join(["%s: %s\r\n" % (k, v) for k, v in headers.items()]) +
+                           "\r\n").encode("utf-8")
+            warcHeaders = ("WARC/1.0\r\n" +
+                           "WARC-Type: response\r\n" +
+                           "WARC-Target-URI: %s\r\n" % url +
+                           "WARC-Date: %s\r\n" % now.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ') +
+                           "X-Site-Id: %s\r\n" % siteId +
+                           "Content-Length: %d\r\n" % (len(httpHeaders) + bodySize) +
+                           "\r\n").encode("utf-8")
+            size = len(warcHeaders) + len(httpHeaders) + bodySize + 4
+
+            # the segment is chosen on the size before compression, which is never smaller
+            segment = self._getSegment(size)
+            with open(os.path.join(self._archiveDir, segment), "ab") as fp:
+                offset = fp.tell()
+                with self._compressor(fp, size) as writer:
+                    writer.write(warcHeaders)
+                    writer.write(httpHeaders)
+                    shutil.copyfileobj(body, writer, httpTransport.HttpTransport._chunkSize)
+                    writer.write(b"\r\n\r\n")
+                length = fp.tell() - offset
+            self._segmentSize = offset + length
+
+            return self._index('response', siteId, url, now, status, segment, offset, length, None)
+
+    def find(self, url = "", date = None, recordType = None):
+        """
+        Returns the index entry of the most recent copy of the page at url
+        fetched on date (a '%Y-%m-%d' string, or None for the latest one),
+        or None if the page is not in the archive.
+        If recordType is given, only the records of that type ('response' or 'revisit') are looked at.
+        """
+        with self._lock:
+            return self._findLocked(url = url, date = date, recordType = recordType)
+
+    def getLatestDate(self):
+        """
+        Returns the last day ('%Y-%m-%d') pages were archived on, or None if the archive is empty.
+        """
+        with self._lock, closing(self._conn.cursor()) as cur:
+            cur.execute("SELECT MAX(scrape_date) FROM records;")
+            return cur.fetchone()[0]
+
+    def read(self, entry = None):
+        """
+        Given an index entry, returns the archived page as (status, headers, body).
+        Revisit records are resolved to the full copy they point to.
+        """
+        with self._lock, closing(self._conn.cursor()) as cur:
+            if entry['record_type'] == 'revisit':
+                cur.execute("SELECT * FROM records WHERE id = ?;", (entry['refers_to'],))
+                entry = dict(cur.fetchone())
+
+        with open(os.path.join(self._archiveDir, entry['segment']), "rb") as fp:
+            fp.seek(entry['offset'])
+            warcBlock = self._decompress(entry['segment'], fp.read(entry['length']))
+
+        # skip the WARC headers, then split the HTTP headers from the body
+        httpBlock = warcBlock[warcBlock.index(b"\r\n\r\n") + 4:-4]
+        httpHeaders, body = httpBlock.split(b"\r\n\r\n", 1)
+        lines = httpHeaders.decode("utf-8").split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        headers = dict([x.split(": ", 1) for x in lines[1:]])
+
+        return status, headers, body
+
+    def close(self):
+        """
+        Closes the index.
+        """
+        self._conn.close()
+
+    def _findLocked(self, url = "", date = None, recordType = None):
+        """
+        Implementation of find(), to be called holding the lock.
+        """
+        qry = "SELECT * FROM records WHERE url = ?"
+        params = [url]
+        if date is not None:
+            qry += " AND scrape_date = ?"
+            params.append(date)
+        if recordType is not None:
+            qry += " AND record_type = ?"
+            params.append(recordType)
+        qry += " ORDER BY scrape_date DESC, id DESC LIMIT 1;"
+
+        with closing(self._conn.cursor()) as cur:
+            cur.execute(qry, params)
+            rec = cur.fetchone()
+
+        return dict(rec) if rec is not None else None
+
+    def _index(self, recordType, siteId, url, when, status, segment, offset, length, refersTo):
+        """
+        Adds a record to the index, returning its id. To be called holding the lock.
+        """
+        with closing(self._conn.cursor()) as cur:
+            cur.execute("INSERT INTO records (record_type, site_id, url, scrape_date, fetched_at, status, " +
+                        "segment, offset, length, refers_to) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                        (recordType, siteId, url, when.strftime('%Y-%m-%d'), when.isoformat(),
+                         status, segment, offset, length, refersTo))
+            return cur.lastrowid
+
+    def _getSegment(self, size = 0):
+        """
+        Returns the name of the segment the next record of the given size goes to,
+        starting a new one if the current one is full. To be called holding the lock.
+        """
+        if self._segmentName is None or self._segmentSize + size > self._maxSegmentSize:
+            extension = ".warc.zst" if zstandard is not None else ".warc.gz"
+            existing = [x for x in os.listdir(self._archiveDir) if x.startswith("segment-")]
+            self._segmentName = "segment-%05d%s" % (len(existing) + 1, extension)
+            self._segmentSize = 0
+
+        return self._segmentName
+
+    def _compressor(self, fp = None, size = 0):
+        """
+        Returns a writer compressing one record of the given size into fp,
+        to be closed (leaving fp open) once the whole record is written.
+        """
+        if zstandard is not None:
+            return zstandard.ZstdCompressor().stream_writer(fp, size = size, closefd = False)
+
+        return gzip.GzipFile(fileobj = fp, mode = "wb")
+
+    def _decompress(self, segment = "", data = b""):
+        """
+        Decompresses one record of the given segment.
+        """
+        if segment.endswith(".zst"):
+            assert zstandard is not None, "The zstandard package is needed to read %s" % segment
+            return zstandard.ZstdDecompressor().decompress(data)
+
+        return gzip.decompress(data)
+
+class _ReplayedResponse(object):
+    """
+    A page read from the archive, with the same interface as httpTransport.TransportResponse.
+    """
+    url = None
+    status_code = None
+    headers = None
+    bytesRead = 0
+
+    _body = None
+
+    def __init__(self, url = "", status = None, headers = None, body = b""):
+        self.url = url
+        self.status_code = status
+        self.headers = headers
+        self._body = body
+
+    def iterContent(self):
+        """
+        Yields the body in chunks.
+        """
+        stream = io.BytesIO(self._body)
+        chunk = stream.read(httpTransport.HttpTransport._chunkSize)
+        while chunk:
+            self.bytesRead += len(chunk)
+            yield chunk
+            chunk = stream.read(httpTransport.HttpTransport._chunkSize)
+
+    @property
+    def content(self):
+        """
+        The whole body, as bytes.
+        """
+        self.bytesRead = len(self._body)
+        return self._body
+
+class ReplayTransport(object):
+    """
+    Transport serving the pages from a PageArchive instead of the network,
+    with the same interface as httpTransport.HttpTransport.
+
+    Each page is served as it was fetched on the given date (a '%Y-%m-%d' string),
+    the last day pages were archived on if date is None: a page not fetched on that
+    day is not served at all, so that all the pages replayed come from the same day.
+    """
+    logger = None
+
+    _archive = None
+    _date = None
+    _replayed = 0
+
+    def __init__(self, archive = None, date = None):
+        self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+        self._archive = archive
+        self._date = date if date is not None else archive.getLatestDate()
+
+    @contextmanager
+    def stream(self, url = "", headers = None, site = None):
+        """
+        Yields the archived copy of the page at url, raising a TransportError if there is none.
+        Conditional headers are ignored: the full page is always served.
+        """
+        entry = self._archive.find(url = url, date = self._date)
+        if entry is None:
+            raise httpTransport.TransportError("Page %s not found in the archive (date: %s)." % (url, self._date))
+
+        status, pageHeaders, body = self._archive.read(entry)
+        self._replayed += 1
+        yield _ReplayedResponse(url = url, status = status, headers = pageHeaders, body = body)
+
+    def getDate(self):
+        """
+        Returns the day ('%Y-%m-%d') of the pages replayed.
+        """
+        return self._date
+
+    def fetch(self, url = "", headers = None, site = None):
+        """
+        Returns the archived copy of the page at url.
+        """
+        with self.stream(url = url, headers = headers, site = site) as response:
+            response.content
+
+        return response
+
+    def logStats(self):
+        """
+        Logs the number of pages replayed.
+        """
+        self.logger.info("Replayed %d page(s) from the archive.", self._replayed)
+
+    def close(self):
+        """
+        Closes the archive.
+        """
+        self._archive.close()
@@ -0,0 +1,153 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+On-disk cache of the listing pages fetched by the scraper.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import closing
+
+import movieLogger
+from utils import dbUtils as db
+
+class PageCache(object):
+    """
+    Remembers, for each (sites.id, URL), the validators of the last page fetched
+    (ETag, Last-Modified and a hash of its content) together with the titles that were
+    extracted from it, so that an unchanged page does not need to be parsed again.
+
+    The cache lives in its own sqlite file and keeps at most maxEntries pages,
+    evicting the least recently used ones.
+    """
+    logger = None
+
+    _maxEntries = 1000
+
+    # version of the layout of the cache file: a cache with a different one is rebuilt
+    _FORMAT_VERSION = 2
+
+    _conn = None
+    _lock = None
+
+    # statistics for this run: pages reused and pages parsed
+    hits = 0
+    misses = 0
+
+    def __init__(self, cacheFile = None, maxEntries = None):
+        """
+        Opens (or creates) the cache in cacheFile.
+        """
+        self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+
+        if maxEntries is not None:
+            assert maxEntries > 0, "Expected a positive number of entries, got %s" % maxEntries
+            self._maxEntries = maxEntries
+
+        self._lock = threading.Lock()
+        self._conn = db.connect(dbfile = cacheFile, checkSameThread = False)
+
+        with closing(self._conn.cursor()) as cur:
+            cur.execute("PRAGMA user_version;")
+            if cur.fetchone()[0] != self._FORMAT_VERSION:
+                # the cache can always be thrown away
+                cur.execute("DROP TABLE IF EXISTS pages;")
+                cur.execute("PRAGMA user_version = %d;" % self._FORMAT_VERSION)
+
+            cur.execute("""CREATE TABLE IF NOT EXISTS pages (site_id integer NOT NULL,
+                                                             url text NOT NULL,
+                                                             etag text,
+                                                             last_modified text,
+                                                             content_hash text,
+                                                             title_xpath text,
+                                                             titles text,
+                                                             next_page_xpath text,
+                                                             links text,
+                                                             last_used real,
+                                                             PRIMARY KEY (site_id, url));""")
+            cur.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);")
+
+        self.logger.info("Page cache opened in '%s'.", cacheFile)
+
+    def get(self, siteId = None, url = ""):
+        """
+        Returns the cached entry for this site and URL as a dictionary, or None if there is none:
+            {'etag', 'last_modified', 'content_hash', 'title_xpath', 'titles' (a set),
+             'next_page_xpath', 'links' (the list of the links to the other pages of the listing)}
+        """
+        with self._lock, closing(self._conn.cursor()) as cur:
+            cur.execute("SELECT etag, last_modified, content_hash, title_xpath, titles, next_page_xpath, links " +
+                        "FROM pages WHERE site_id = ? AND url = ?;", (siteId, url))
+            rec = cur.fetchone()
+
+        if rec is None:
+            return None
+
+        return {'etag': rec['etag'],
+                'last_modified': rec['last_modified'],
+                'content_hash': rec['content_hash'],
+                'title_xpath': rec['title_xpath'],
+                'titles': set(json.loads(rec['titles'])),
+                'next_page_xpath': rec['next_page_xpath'],
+                'links': json.loads(rec['links'])}
+
+    def conditionalHeaders(self, entry = None):
+        """
+        Returns the headers to make a conditional GET for the page cached in entry.
+        """
+        headers = {}
+        if entry['etag'] is not None:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified'] is not None:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        return headers
+
+    def put(self, siteId = None, url = "", etag = None, lastModified = None,
+            contentHash = None, titleXpath = None, titles = None,
+            nextPageXpath = None, links = None, parsed = True):
+        """
+        Stores (or refreshes) the entry for this site and URL, evicting the
+        least recently used entries if the cache grows beyond its size.
+
+        parsed is False when the titles are the ones of the entry, reused as
+        the content of the page did not change.
+        """
+        with self._lock, closing(self._conn.cursor()) as cur:
+            cur.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                        (siteId, url, etag, lastModified, contentHash, titleXpath,
+                         json.dumps(sorted(titles)), nextPageXpath,
+                         json.dumps(links if links is not None else []), time.time()))
+            cur.execute("DELETE FROM pages WHERE rowid IN " +
+                        "(SELECT rowid FROM pages ORDER BY last_used DESC LIMIT -1 OFFSET ?);",
+                        (self._maxEntries,))
+            if cur.rowcount > 0:
+                self.logger.debug("Evicted %d page(s) from the cache.", cur.rowcount)
+            if parsed:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def touch(self, siteId = None, url = ""):
+        """
+        Marks the entry for this site and URL as just reused.
+        """
+        with self._lock, closing(self._conn.cursor()) as cur:
+            cur.execute("UPDATE pages SET last_used = ? WHERE site_id = ? AND url = ?;",
+                        (time.time(), siteId, url))
+            self.hits += 1
+
+    def logStats(self):
+        """
+        Logs how many pages were reused and how many had to be parsed in this run.
+        """
+        self.logger.info("Page cache: %d page(s) reused, %d parsed.", self.hits, self.misses)
+
+    def close(self):
+        """
+        Closes the underlying db.
+        """
+        self._conn.close()
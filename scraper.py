@@ -5,14 +5,22 @@ Created on May 5, 2017
 
 Main module to perform the MovieDiversity data collection app.
 """
+import sys
 import logging
 import argparse
+import hashlib
+import tempfile
+import threading
 from pprint import pformat
-import requests
-from lxml import html
-import sources
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, urljoin, parse_qsl, urlencode
 import movieLogger
+import httpTransport
+import pageCache
+import titleExtractor
+import pageArchive
 from utils import stringUtils
+from utils import dbUtils as db
 
 class Scraper(object):
     """
@@ -22,44 +30,178 @@ class Scraper(object):
         the Sources and movieLogger.MovieLogger classes.
     """
     _source = None
+    _transport = None
+    _pageCache = None
+    _extractor = None
+    _archive = None
+    _replayDate = None
     logger = None
 
-    def __init__(self, dbfile = None):
+    # concurrency limits when fetching the sites of a location:
+    # total number of parallel requests and parallel requests per host
+    _maxWorkers = 4
+    _maxPerHost = 2
+
+    # pages fetched for a paginated listing, unless the site sets its own max_pages
+    _maxPages = 10
+
+    # pages up to this size are read in full before being parsed
+    _maxBufferedPage = 1024 * 1024
+
+    # semaphore limiting the requests in flight to _maxWorkers, whatever the locations
+    # and pages fetched in parallel, and per-host semaphores, built lazily
+    _fetchLimit = None
+    _hostLimits = None
+    _hostLimitsLock = None
+
+    def __init__(self,
+                 dbfile = None,
+                 maxWorkers = None,
+                 maxPerHost = None,
+                 connectTimeout = None,
+                 readTimeout = None,
+                 maxPageSize = None,
+                 pageCacheFile = None,
+                 archiveDir = None,
+                 replayDir = None,
+                 replayDate = None):
         """
-        Builds a local instance of the Sources class and
-        one of the MovieLogger engine.
+        Builds a local instance of the Sources class,
+        one of the HttpTransport and one of the MovieLogger engine.
+
+        maxWorkers and maxPerHost, when given, override the default
+        limits on the number of sites fetched concurrently, overall and per host.
+        connectTimeout, readTimeout (in seconds) and maxPageSize (in bytes), when given,
+        override the transport's defaults.
+        If pageCacheFile is given, the pages fetched are remembered there and are
+        not parsed again as long as they do not change.
+        If archiveDir is given, all the pages fetched are recorded in a PageArchive there.
+        If replayDir is given, the pages are read from the PageArchive there instead of the
+        network, as they were fetched on replayDate ('%Y-%m-%d', defaults to the last day archived),
+        and the shows are recorded on that day.
         """
+        # the ORM is imported only when a scraper is actually built
+        import sources
+
         self._source = sources.Sources(dbfile = dbfile)
         self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
 
+        if maxWorkers is not None:
+            assert maxWorkers > 0, "Expected a positive number of workers, got %s" % maxWorkers
+            self._maxWorkers = maxWorkers
+        if maxPerHost is not None:
+            assert maxPerHost > 0, "Expected a positive number of requests per host, got %s" % maxPerHost
+            self._maxPerHost = maxPerHost
+
+        self._fetchLimit = threading.BoundedSemaphore(self._maxWorkers)
+        self._hostLimits = {}
+        self._hostLimitsLock = threading.Lock()
+
+        assert archiveDir is None or replayDir is None, "Cannot record and replay at the same time."
+
+        if replayDir is not None:
+            # replayed pages are always parsed: no page cache
+            self._transport = pageArchive.ReplayTransport(archive = pageArchive.PageArchive(archiveDir = replayDir),
+                                                          date = replayDate)
+            self._replayDate = self._transport.getDate()
+            pageCacheFile = None
+        else:
+            self._transport = httpTransport.HttpTransport(connectTimeout = connectTimeout,
+                                                          readTimeout = readTimeout,
+                                                          maxBodySize = maxPageSize,
+                                                          maxPerHost = self._maxPerHost)
+
+        self._extractor = titleExtractor.TitleExtractor()
+
+        if pageCacheFile is not None:
+            self._pageCache = pageCache.PageCache(cacheFile = pageCacheFile)
+
+        if archiveDir is not None:
+            self._archive = pageArchive.PageArchive(archiveDir = archiveDir)
+
         self.logger.info("Scraper instance inited.")
 
-    def updateLocationMovies(self, locationName = None):
+    def updateLocationsMovies(self, locationNames = None, parallelLocations = 1, date = None):
+        """
+        Given a list of location names, fetches the data off the net and
+        populates the db for each one of them, all in this same process.
+        If locationNames is None, all the locations in the db are updated.
+        The shows are recorded on date ('%Y-%m-%d'), which defaults to today
+        (or to the day of the pages replayed, see __init__()).
+
+        Up to parallelLocations locations are fetched off the net at the same time,
+        while the db is always updated one location after the other.
+        A failure in one location is logged and does not stop the others.
+
+        Returns the list of the locations that could not be updated.
+        """
+        assert parallelLocations > 0, \
+            "Expected a positive number of parallel locations, got %s" % parallelLocations
+
+        if locationNames is None:
+            locationNames = [x.name for x in self._source.getAllLocations()]
+
+        failed = []
+
+        # the sites are read here: the workers must not touch the db session
+        sites = {x: self._source.getLocationSitesData(x) for x in locationNames}
+
+        with ThreadPoolExecutor(max_workers = parallelLocations) as executor:
+            # the fetching of the next locations proceeds while the db is updated
+            futures = [executor.submit(self.getMoviesTitlesInLocation, locationName = x, sites = sites[x]) \
+                       for x in locationNames]
+
+            for locationName, future in zip(locationNames, futures):
+                self.logger.info("Looking for: %s...", locationName)
+                try:
+                    self.updateLocationMovies(locationName = locationName,
+                                              titles = future.result(),
+                                              date = date)
+                except Exception:
+                    self.logger.exception("Could not update the movies in %s.", locationName)
+                    self._source.rollbackSession()
+                    failed.append(locationName)
+
+        return failed
+
+    def updateLocationMovies(self, locationName = None, titles = None, date = None):
         """
         Given a location name, fetches the data off the net and
         populates the db.
+
+        If titles is given, it is used in place of the data off the net.
+        The shows are recorded on date ('%Y-%m-%d'), which defaults to today
+        (or to the day of the pages replayed, see __init__()).
         """
+        if date is None:
+            date = self._replayDate
 
         # Gets the movie titles
         locationData = self._source.getLocationSitesData(locationName = locationName)
         assert isinstance(locationData, type([])), \
                           "Expected a list for locations, instead got %s" % type(locationData)
-        titles = self.getMoviesTitlesInLocation(locationName = locationName)
-
-        successfullyInserted = 0
-        # stores each title
-        for title in titles:
-            titleId = self._source.insertTitleInLocation(title, locationData[0]['locations_ref'])[0]
+        assert len(locationData) > 0, "No sites found for location '%s'." % locationName
+        if titles is None:
+            titles = self.getMoviesTitlesInLocation(locationName = locationName)
+
+        # stores all the titles and their shows in one transaction
+        titles = list(titles)
+        resolved = self._source.insertTitlesInLocationBatch(titles = titles,
+                                                             locationId = locationData[0]['locations_ref'],
+                                                             commit = False)
+        for title, (titleId, _) in zip(titles, resolved):
             if titleId is None:
                 self.logger.error("Could not identify '%s' correctly, skipping it.", title)
-            else:
-                self._source.insertShow(titleId, locationData[0]['locations_ref'])
-                successfullyInserted += 1
-                self.logger.debug("Inserted show %d for '%s' in %s (%d) today.",
-                                  successfullyInserted,
-                                  title,
-                                  locationName,
-                                  locationData[0]['locations_ref'])
+
+        titleIds = [x[0] for x in resolved if x[0] is not None]
+        self._source.insertShowsBatch(titlesRefs = titleIds,
+                                      locationsRef = locationData[0]['locations_ref'],
+                                      date = date)
+        successfullyInserted = len(titleIds)
+        self.logger.debug("Inserted %d shows in %s (%d).",
+                          successfullyInserted,
+                          locationName,
+                          locationData[0]['locations_ref'])
 
         # logs some information
         self.logger.info("Inserted %d new shows for today in %s.",
@@ -70,46 +212,261 @@ class Scraper(object):
                                 len(titles) - successfullyInserted,
                                 locationName)
 
-    def getMoviesTitlesInLocation(self, locationName = None):
+    def getMoviesTitlesInLocation(self, locationName = None, sites = None):
         """
         Given the id of a location, it returns a
         set of all movie titles playing there today.
+
+        The sites of the location are read from the db, unless they are given in sites.
         """
         self.logger.info("Looking for movie titles in %s.", locationName)
 
         titles = set()
 
-        data = self._source.getLocationSitesData(locationName)
+        data = sites if sites is not None else self._source.getLocationSitesData(locationName)
+        activeSites = [x for x in data if x['active']]
 
-        # for every active site in the list, get the titles and insert them in the output set
-        for site in data:
-            if site['active']:
-                titles = titles.union(self.getMoviesTitlesFromURL(url = site['url'],
-                                                                  title_xpath = site['title_xpath']))
-                self.logger.debug("Got titles from site %s, now I have %d in total.",
-                                  site['name'],
-                                  len(titles))
+        # fetch all the active sites in parallel and merge their titles as they come in
+        if len(activeSites) > 0:
+            with ThreadPoolExecutor(max_workers = min(self._maxWorkers, len(activeSites))) as executor:
+                futures = {executor.submit(self._getSiteTitles, site): site for site in activeSites}
+
+                for future in as_completed(futures):
+                    titles = titles.union(future.result())
+                    self.logger.debug("Got titles from site %s, now I have %d in total.",
+                                      futures[future]['name'],
+                                      len(titles))
 
         # clean up before sending back
         return self.cleanupTitles(titles)
 
-    def getMoviesTitlesFromURL(self, url = "", title_xpath = ""):
+    def _getSiteTitles(self, site = None):
+        """
+        Fetches the titles of a single site, waiting for a free slot on
+        its host if too many requests are already running against it,
+        and for a free one overall if _maxWorkers requests are running.
+
+        Paginated sites (with a page_param or a next_page_xpath) have all
+        their pages fetched, see _getPaginatedTitles().
+        """
+        if site.get('page_param') is None and site.get('next_page_xpath') is None:
+            with self._getHostLimit(site['url']), self._fetchLimit:
+                return self.getMoviesTitlesFromURL(url = site['url'],
+                                                   title_xpath = site['title_xpath'],
+                                                   siteName = site['name'],
+                                                   siteId = site['id'])
+
+        return self._getPaginatedTitles(site)
+
+    def _getPaginatedTitles(self, site = None):
+        """
+        Fetches the titles of all the pages of a paginated site, up to its max_pages.
+
+        The first page is the site's URL. If the site has a next_page_xpath, the links it finds
+        on each page are the other pages to fetch; otherwise the pages are numbered through the
+        site's page_param, and the listing is over at the first page bringing no new titles.
+        The other pages are fetched concurrently, in waves of up to _maxPerHost pages,
+        and their titles merged as they come in.
+        """
+        maxPages = site.get('max_pages') or self._maxPages
+
+        titles, links = self._getPage(site, site['url'])
+        seen = set([site['url']])
+        pageNumber = 1
+
+        with ThreadPoolExecutor(max_workers = self._maxPerHost) as executor:
+            while len(seen) < maxPages:
+                if site.get('next_page_xpath') is not None:
+                    urls = []
+                    for link in links:
+                        link = urljoin(site['url'], link)
+                        if link not in seen and link not in urls:
+                            urls.append(link)
+                    urls = urls[:maxPages - len(seen)]
+                else:
+                    wave = min(self._maxPerHost, maxPages - len(seen))
+                    urls = [self._getPageUrl(site['url'], site['page_param'], pageNumber + i + 1) for i in range(wave)]
+                    pageNumber += wave
+
+                if len(urls) == 0:
+                    break
+                seen.update(urls)
+
+                links = []
+                lastPage = False
+                futures = [executor.submit(self._getPage, site, x) for x in urls]
+                for future in as_completed(futures):
+                    pageTitles, pageLinks = future.result()
+                    if len(pageTitles.difference(titles)) == 0:
+                        lastPage = True
+                    titles = titles.union(pageTitles)
+                    links.extend(pageLinks)
+
+                if site.get('next_page_xpath') is None and lastPage:
+                    break
+
+        self.logger.info("Got %d titles from %d page(s) of %s.", len(titles), len(seen), site['name'])
+
+        return titles
+
+    def _getPage(self, site = None, url = ""):
+        """
+        Fetches one page of a paginated site, within the limits of its host and overall.
+        Returns its titles and the links to the other pages found on it.
+        """
+        with self._getHostLimit(url), self._fetchLimit:
+            return self._getPageData(url = url,
+                                     title_xpath = site['title_xpath'],
+                                     next_page_xpath = site.get('next_page_xpath'),
+                                     siteName = site['name'],
+                                     siteId = site['id'])
+
+    def _getPageUrl(self, url = "", pageParam = "", pageNumber = 1):
+        """
+        Returns the URL of the given page of a listing, setting (or adding) pageParam in its query.
+        """
+        parsed = urlparse(url)
+        query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values = True) if k != pageParam]
+        query.append((pageParam, str(pageNumber)))
+
+        return parsed._replace(query = urlencode(query)).geturl()
+
+    def _getHostLimit(self, url = ""):
+        """
+        Returns the semaphore limiting the concurrent requests to the host of the given URL.
+        """
+        host = urlparse(url).netloc.lower()
+
+        with self._hostLimitsLock:
+            if host not in self._hostLimits:
+                self._hostLimits[host] = threading.BoundedSemaphore(self._maxPerHost)
+
+            return self._hostLimits[host]
+
+    def getMoviesTitlesFromURL(self, url = "", title_xpath = "", siteName = None, siteId = None):
         """
         Function which given a URL and an xpath query to identify the titles of the movies on the
         page returned by the URL, it returns a set of all the titles.
+
+        siteName is only used to keep the transport's counters, it defaults to the URL's host.
+        If siteId is given and the page cache is on, the page is fetched with a conditional GET
+        and the titles cached for it are reused if it did not change.
+        """
+        return self._getPageData(url = url, title_xpath = title_xpath, siteName = siteName, siteId = siteId)[0]
+
+    def _getPageData(self, url = "", title_xpath = "", next_page_xpath = None, siteName = None, siteId = None):
+        """
+        Implementation of getMoviesTitlesFromURL(): returns the set of the titles on the page
+        and, if next_page_xpath is given, the list of the links it selects on the page.
         """
         self.logger.info("Querying %s ...", url)
 
-        page = requests.get(url)
-        self.logger.debug("Returned status: %s. Got %d bytes back.",
-                          page.status_code,
-                          len(page.content))
+        # look for a previous version of this page, extracted with the same xpaths
+        cached = None
+        headers = None
+        if self._pageCache is not None and siteId is not None:
+            cached = self._pageCache.get(siteId = siteId, url = url)
+            if cached is not None and cached['title_xpath'] == title_xpath and \
+               cached['next_page_xpath'] == next_page_xpath:
+                headers = self._pageCache.conditionalHeaders(cached)
+            else:
+                cached = None
+
+        # a page is archived in full the first time: a 304 would leave nothing to replay
+        if headers is not None and self._archive is not None and \
+           self._archive.find(url = url, recordType = 'response') is None:
+            headers = None
+
+        with self._transport.stream(url = url, headers = headers, site = siteName) as page:
+            self.logger.debug("Returned status: %s.", page.status_code)
+
+            if cached is not None and page.status_code == 304:
+                if self._archive is not None:
+                    self._archive.record(siteId = siteId, url = url, status = page.status_code, headers = page.headers)
+                self._pageCache.touch(siteId = siteId, url = url)
+                self.logger.info("Page not modified, reusing %d titles.", len(cached['titles']))
+                return cached['titles'], cached['links']
+
+            if page.status_code >= 400:
+                self.logger.warning("Got status %s from %s.", page.status_code, url)
+
+            # pages up to _maxBufferedPage are read in full before parsing them,
+            # so that an unchanged page is recognised without parsing it;
+            # larger pages are parsed while they are read
+            hasher = hashlib.sha256()
+            chunks = page.iterContent()
+            if self._archive is not None:
+                # the page is spooled to a temporary file, if large, until it can be archived
+                archived = tempfile.SpooledTemporaryFile(max_size = self._maxBufferedPage)
+                chunks = self._archivedChunks(chunks, archived)
+            buffered = []
+            complete = True
+            for chunk in chunks:
+                hasher.update(chunk)
+                buffered.append(chunk)
+                if page.bytesRead > self._maxBufferedPage:
+                    complete = False
+                    break
+
+            parsed = False
+            if complete and cached is not None and cached['content_hash'] == hasher.hexdigest():
+                titles = cached['titles']
+                links = cached['links']
+                self.logger.info("Page unchanged, reusing %d titles.", len(titles))
+            else:
+                parsed = True
+                xpaths = [title_xpath] if next_page_xpath is None else [title_xpath, next_page_xpath]
+                results = self._extractor.extractAll(chunks = self._hashedChunks(buffered, chunks, hasher),
+                                                     xpaths = xpaths)
+                titles = set(results[0])
+                links = results[1] if next_page_xpath is not None else []
+                self.logger.info("Identified %d titles.", len(titles))
+
+            self.logger.debug("Got %d bytes back.", page.bytesRead)
+
+        if self._archive is not None:
+            with archived:
+                archived.seek(0)
+                self._archive.record(siteId = siteId,
+                                     url = url,
+                                     status = page.status_code,
+                                     headers = page.headers,
+                                     body = archived)
+
+        contentHash = hasher.hexdigest()
+
+        if self._pageCache is not None and siteId is not None and page.status_code < 400:
+            self._pageCache.put(siteId = siteId,
+                                url = url,
+                                etag = page.headers.get('ETag'),
+                                lastModified = page.headers.get('Last-Modified'),
+                                contentHash = contentHash,
+                                titleXpath = title_xpath,
+                                titles = titles,
+                                nextPageXpath = next_page_xpath,
+                                links = links,
+                                parsed = parsed)
+
+        return titles, links
+
+    def _hashedChunks(self, buffered = None, chunks = None, hasher = None):
+        """
+        Yields the chunks already buffered, then the remaining ones, adding these to the hash.
+        """
+        for chunk in buffered:
+            yield chunk
 
-        tree = html.fromstring(page.content)
-        titles = set(tree.xpath(title_xpath))
-        self.logger.info("Identified %d titles.", len(titles))
+        for chunk in chunks:
+            hasher.update(chunk)
+            yield chunk
 
-        return titles
+    def _archivedChunks(self, chunks = None, archived = None):
+        """
+        Yields the chunks, writing a copy of each one to the archived file.
+        """
+        for chunk in chunks:
+            archived.write(chunk)
+            yield chunk
 
     def cleanupTitles(self, titles = None):
         """
@@ -118,6 +475,9 @@ class Scraper(object):
 
         For instance "Star Wars: a new hope" and "Star Wars - A New Hope"
         should be deemed similar and reported only once.
+
+        Each title is compared only with the candidates returned by a
+        stringUtils.TitleBlockIndex, in the same order as with all the others.
         """
         assert isinstance(titles, set), "Expecting a set of titles, got %s" % type(titles)
         if len(titles) == 0:
@@ -129,9 +489,14 @@ class Scraper(object):
         # set of movies discarded as similar to other ones, captured here for debugging purposes
         similar = set()
 
+        # only the titles which can pass the similarity threshold are compared
+        index = stringUtils.TitleBlockIndex()
+        for position, title in enumerate(titlesList):
+            index.add(position, title)
+
         # check if the title is a duplicate of a similar one, if so skip it
         for first in range(0, len(titlesList)):
-            for second in range(first + 1, len(titlesList)):
+            for second in sorted([x for x in index.candidates(titlesList[first]) if x > first]):
                 if stringUtils.isSimilar(titlesList[first], titlesList[second]):
                     self.logger.debug("Found title '%s', similar to '%s', using the latter.",
                                       titlesList[first],
@@ -162,21 +527,97 @@ if __name__ == "__main__":
                         required = False,
                         choices = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                         help = 'The level of output for logging. Defaults to INFO.')
-    parser.add_argument('--location', '-loc',
-                        required = True,
-                        help = 'The location for which to collect data.')
+    locationsGroup = parser.add_mutually_exclusive_group(required = True)
+    locationsGroup.add_argument('--location', '-loc',
+                                action = 'append',
+                                help = 'The location for which to collect data. Can be repeated.')
+    locationsGroup.add_argument('--allLocations', '-all',
+                                action = 'store_true',
+                                help = 'Collect data for all the locations in the db.')
+    parser.add_argument('--connectTimeout', '-ct',
+                        required = False,
+                        type = float,
+                        help = 'Seconds allowed to connect to a site. Defaults to %.1f.' % httpTransport.HttpTransport._connectTimeout)
+    parser.add_argument('--readTimeout', '-rt',
+                        required = False,
+                        type = float,
+                        help = 'Seconds allowed between two reads from a site. Defaults to %.1f.' % httpTransport.HttpTransport._readTimeout)
+    parser.add_argument('--maxPageSize', '-mps',
+                        required = False,
+                        type = int,
+                        help = 'The largest page accepted, in bytes. Defaults to %d.' % httpTransport.HttpTransport._maxBodySize)
+    parser.add_argument('--pageCache', '-pc',
+                        required = False,
+                        help = 'The file where the pages fetched are cached. Defaults to the db file name + ".pagecache".')
+    parser.add_argument('--noPageCache', '-npc',
+                        action = 'store_true',
+                        help = 'Fetch and parse all the pages, without using the page cache.')
+    parser.add_argument('--archive', '-ar',
+                        required = False,
+                        help = 'A directory where all the pages fetched are archived.')
+    parser.add_argument('--replay', '-rp',
+                        required = False,
+                        help = 'A page archive directory to read the pages from, instead of the network.')
+    parser.add_argument('--replayDate', '-rd',
+                        required = False,
+                        help = 'With --replay, use the pages archived on this date (YYYY-MM-DD) ' +
+                               'and record the shows on it. Defaults to the last day archived.')
+    parser.add_argument('--parallelLocations', '-pl',
+                        required = False,
+                        type = int,
+                        default = 1,
+                        help = 'The number of locations fetched in parallel. Defaults to 1.')
+    parser.add_argument('--maxWorkers', '-mw',
+                        required = False,
+                        type = int,
+                        help = 'The maximum number of pages fetched in parallel, over all the locations. Defaults to %d.' % Scraper._maxWorkers)
+    parser.add_argument('--maxPerHost', '-mph',
+                        required = False,
+                        type = int,
+                        help = 'The maximum number of parallel requests to the same host. Defaults to %d.' % Scraper._maxPerHost)
+    parser.add_argument('--storageProfile', '-sp',
+                        required = False,
+                        choices = sorted(db.STORAGE_PROFILES.keys()),
+                        default = 'fast-ingest',
+                        help = 'The storage profile of the db connections. Defaults to fast-ingest.')
 
     args = parser.parse_args()
 
     # Init the logging system
     movieLogger.MovieLoggger().initLogger(level = args.logLevel)
 
-    S = Scraper(dbfile = args.dbfile)
+    # all the connections opened from here on use this profile
+    db.setStorageProfile(args.storageProfile)
+
+    pageCacheFile = None
+    if not args.noPageCache:
+        pageCacheFile = args.pageCache if args.pageCache is not None else args.dbfile + ".pagecache"
+
+    S = Scraper(dbfile = args.dbfile,
+                maxWorkers = args.maxWorkers,
+                maxPerHost = args.maxPerHost,
+                connectTimeout = args.connectTimeout,
+                readTimeout = args.readTimeout,
+                maxPageSize = args.maxPageSize,
+                pageCacheFile = pageCacheFile,
+                archiveDir = args.archive,
+                replayDir = args.replay,
+                replayDate = args.replayDate)
 
     allLocations = S._source.getAllLocations()
-    S.logger.info("Locations definitions found for: %s", allLocations)
+    S.logger.info("Locations definitions found for: %s", [x.name for x in allLocations])
+
+    failedLocations = S.updateLocationsMovies(locationNames = None if args.allLocations else args.location,
+                                              parallelLocations = args.parallelLocations)
+    S._transport.logStats()
+    S._source.logAliasStats()
+    if S._pageCache is not None:
+        S._pageCache.logStats()
+
+    if len(failedLocations) > 0:
+        S.logger.error("Could not update: %s", failedLocations)
+        S.logger.info("End run.")
+        sys.exit(1)
 
-    S.logger.info("Looking for: %s...", args.location)
-    S.updateLocationMovies(args.location)
     S.logger.info("End run.")
 
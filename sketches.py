@@ -0,0 +1,111 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+HyperLogLog sketches of the titles shown in each location on each day, for the approximate
+counts of the distinct titles shown over many days and locations.
+
+title_sketches has a row for each location and day with shows, whose sketch has 2^PRECISION
+registers of a byte, compressed with zlib: each title (id) is hashed to a register, which keeps
+the highest rank (position of the first bit set) of the hashes fallen in it. The sketch of the titles
+shown over some days and locations is the maximum of the registers of theirs, and its estimate
+of the distinct titles has a standard error of 1.04 / sqrt(2^PRECISION), about 1.6%.
+
+Sources refreshes the days of the shows it writes, in the same transaction, like the other
+aggregates (see aggregates.py). The functions reading the db take a cursor on it, and run
+in its current transaction; merge() and estimate() need numpy.
+"""
+import zlib
+import math
+import hashlib
+
+import titlesShown
+
+# bits of the hash choosing the register: 4096 registers
+PRECISION = 12
+_REGISTERS = 1 << PRECISION
+_RANK_BITS = 64 - PRECISION
+
+def _hash(titleId = None):
+    """
+    Returns the 64 bits hash of a title (id).
+    """
+    return int.from_bytes(hashlib.blake2b(b"%d" % titleId, digest_size = 8).digest(), 'big')
+
+def encode(titleIds = None):
+    """
+    Returns the compressed sketch of the given titles (ids).
+    """
+    registers = bytearray(_REGISTERS)
+    for titleId in titleIds:
+        value = _hash(titleId)
+        index = value >> _RANK_BITS
+        rank = _RANK_BITS - (value & ((1 << _RANK_BITS) - 1)).bit_length() + 1
+        if rank > registers[index]:
+            registers[index] = rank
+
+    return zlib.compress(bytes(registers))
+
+def decode(blob = None):
+    """
+    Returns the registers (bytes) of a compressed sketch.
+    """
+    return zlib.decompress(blob)
+
+def merge(sketches = None):
+    """
+    Returns the registers (bytes) of the union of the given ones.
+
+    Needs numpy.
+    """
+    import numpy
+
+    merged = numpy.zeros(_REGISTERS, dtype = numpy.uint8)
+    for registers in sketches:
+        numpy.maximum(merged, numpy.frombuffer(registers, dtype = numpy.uint8), out = merged)
+
+    return merged.tobytes()
+
+def estimate(registers = None):
+    """
+    Returns the estimate of the distinct titles of the registers (bytes), counting the empty
+    registers instead (linear counting) when they are still many.
+
+    Needs numpy.
+    """
+    import numpy
+
+    ranks = numpy.frombuffer(registers, dtype = numpy.uint8)
+    alpha = 0.7213 / (1 + 1.079 / _REGISTERS)
+    raw = alpha * _REGISTERS * _REGISTERS / numpy.sum(numpy.ldexp(1.0, -ranks.astype(numpy.int32)))
+
+    zeros = int(numpy.count_nonzero(ranks == 0))
+    if raw <= 2.5 * _REGISTERS and zeros > 0:
+        return int(round(_REGISTERS * math.log(_REGISTERS / zeros)))
+
+    return int(round(raw))
+
+def refreshDays(cur = None, days = None):
+    """
+    Recomputes the sketches of the given (locations_ref, date) from their runs of shows and daily shows.
+    """
+    for locationsRef, date in sorted(set(days)):
+        titles = titlesShown.titlesOfDay(cur, locationsRef, date)
+
+        if len(titles) == 0:
+            cur.execute("DELETE FROM title_sketches WHERE locations_ref = ? AND date = ?", (locationsRef, date))
+        else:
+            cur.execute("INSERT INTO title_sketches (locations_ref, date, sketch) VALUES (?, ?, ?) " +
+                        "ON CONFLICT (locations_ref, date) DO UPDATE SET sketch = excluded.sketch",
+                        (locationsRef, date, encode(titles)))
+
+def rebuild(cur = None):
+    """
+    Recomputes all the sketches from the runs of shows and the daily shows, one (location, day) at a time.
+    Returns the number of (location, day) with shows.
+    """
+    cur.execute("DELETE FROM title_sketches")
+
+    return titlesShown.insertDays(cur, "INSERT INTO title_sketches (locations_ref, date, sketch) VALUES (?, ?, ?)",
+                                  ((x[0], x[1], encode(x[2])) for x in titlesShown.iterDays(cur)))
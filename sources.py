@@ -6,17 +6,24 @@ Created on March 3, 2019
 Source module for the MovieDiversity app.
 '''
 from pprint import pformat
+from collections import namedtuple
+import os
+import time
 import logging
 import datetime
 
 import movieLogger
-import tests.utils
+import migrations
+import aggregates
+import bitmaps
+import sketches
+from utils import dbUtils as db
 from utils import stringUtils
 
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from sqlalchemy import event
-from sqlalchemy import func
+from sqlalchemy import exists
 from sqlalchemy import text
 
 import movieDbClasses
@@ -24,10 +31,25 @@ from movieDbClasses import Locations
 from movieDbClasses import Sites
 from movieDbClasses import Titles
 from movieDbClasses import TitlesInLocations
-from movieDbClasses import Shows
+from movieDbClasses import ShowsDaily
+from movieDbClasses import ShowRuns
+from movieDbClasses import DailyStats
 from movieDbClasses import Translations
+from movieDbClasses import TitleAliases
 from movieDbClasses import SQLite_Master
 
+# lightweight rows yielded by the iter methods of Sources
+TitleRow = namedtuple('TitleRow', ['id', 'title'])
+TitleAndLocationRow = namedtuple('TitleAndLocationRow', ['id', 'title', 'locations_ref', 'tilid'])
+TitleInLocationRow = namedtuple('TitleInLocationRow', ['tid', 'tilid', 'title', 'first_show', 'last_show',
+                                                       'locations_ref', 'language', 'show_count'])
+ShowRow = namedtuple('ShowRow', ['date', 'titles_ref', 'title', 'locations_ref', 'titles_in_locations_ref'])
+DailyStatsRow = namedtuple('DailyStatsRow', ['locations_ref', 'date', 'titles', 'new_titles', 'departed_titles'])
+PeriodStatsRow = namedtuple('PeriodStatsRow', ['locations_ref', 'period', 'start_date', 'titles', 'title_days',
+                                               'new_titles', 'departed_titles'])
+TitleBitmapRow = namedtuple('TitleBitmapRow', ['locations_ref', 'date', 'bitmap'])
+TitleSketchRow = namedtuple('TitleSketchRow', ['locations_ref', 'date', 'sketch'])
+
 class Sources(object):
     """
         This class exposes commodity methods to query the db and get structured data back.
@@ -39,10 +61,34 @@ class Sources(object):
 
     logger = None
     session = None
+    util = None
+
+    # engine of the session, for the queries streamed on a connection of their own
+    _engine = None
+
+    # locally cached locations and sites, per instance (see _getMetadata)
+    _metadata = None
+    # seconds they are kept before being reloaded from the db (None: until they are written through the session)
+    metadataTTL = None
+
+    # index of the titles in each location, loaded on first use (see _getTitleIndex)
+    _titleIndex = None
+
+    # most variables bound in a single statement by the batch methods (the sqlite default limit is 999)
+    _maxBatchVariables = 900
+
+    # rows fetched at a time by the iter methods
+    _fetchSize = 1000
+
+    # scraped titles resolved through the aliases, and the ones which had to be matched
+    _aliasHits = 0
+    _aliasMisses = 0
 
-    # locally cached data containers
-    _locations = []
-    _sites = []
+    # name of the storage profile of the connections (see dbUtils.STORAGE_PROFILES)
+    storageProfile = None
+
+    # dbs already found free of test records by checkTestData(), as (file, schema version)
+    _cleanDbs = set()
 
     # sqlite db file
     _dbName = '/home/guido/work/git/movie-diversity/movieDiversity.db'
@@ -54,57 +100,114 @@ class Sources(object):
     titlesClass = None
     titlesInLocationsClass = None
     showsClass = None
+    showRunsClass = None
+    dailyStatsClass = None
+    periodStatsClass = None
     translationsClass = None
+    titleAliasesClass = None
     sqliteMasterClass = None
 
     # auto-commit?
     # _isolationLevel = None
 
-    def __init__(self, dbfile = _dbName):
+    def __init__(self, dbfile = _dbName, storageProfile = None, checkTestData = False, metadataTTL = None):
         """
             Gets a local copy of the logger.
             Connects to the sqlite data db specified by "dbfile" and
-            verifies that the schema is clean.
+            brings its schema up to date.
+
+            Every connection is set up with the given storage profile
+            (one of dbUtils.STORAGE_PROFILES, the default one if None).
+
+            If checkTestData is True, verifies that the db holds no test records (see checkTestData()).
+            If metadataTTL is given, the locations and sites are reloaded from the db
+            when older than metadataTTL seconds.
         """
         self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
 
+        if storageProfile is None:
+            storageProfile = db.getStorageProfile()
+        assert storageProfile in db.STORAGE_PROFILES, "Unknown storage profile %s" % storageProfile
+        self.storageProfile = storageProfile
+
         # Create the SQLAlchemy connection
         self._dbConnectString = self._dbConnectString + dbfile
         dbEngine = create_engine(self._dbConnectString)
 
-        # Enforce FK constraints
+        # Enforce FK constraints, and set up the storage
         def _enforceFKContraintsOnConnect(dbapi_conn, con_record):
             dbapi_conn.execute('PRAGMA foreign_keys=ON')
+            db.applyStorageProfile(dbapi_conn, storageProfile)
 
         event.listen(dbEngine, 'connect', _enforceFKContraintsOnConnect)
 
         movieDbClasses.Base.metadata.bind = dbEngine
+        self._engine = dbEngine
         DBSession = sessionmaker()
         DBSession.bind = dbEngine
         self.session = DBSession()
 
+        # the cached locations and sites are dropped whenever they are written
+        self._metadata = None
+        self.metadataTTL = metadataTTL
+        event.listen(self.session, 'after_flush', self._invalidateMetadataOnFlush)
+
         # store copy of the db wrapper classes
         self.locationClass = getattr(movieDbClasses, "Locations")
         self.sitesClass = getattr(movieDbClasses, "Sites")
         self.titlesClass = getattr(movieDbClasses, "Titles")
         self.titlesInLocationsClass = getattr(movieDbClasses, "TitlesInLocations")
         self.showsClass = getattr(movieDbClasses, "Shows")
+        self.showRunsClass = getattr(movieDbClasses, "ShowRuns")
+        self.dailyStatsClass = getattr(movieDbClasses, "DailyStats")
+        self.periodStatsClass = getattr(movieDbClasses, "PeriodStats")
         self.translationClass = getattr(movieDbClasses, "Translations")
+        self.titleAliasesClass = getattr(movieDbClasses, "TitleAliases")
         self.sqliteMasterClass = getattr(movieDbClasses, "SQLite_Master")
 
         self.logger.debug("Created wrapper classes container instances")
+        self.logger.info("Using storage profile '%s': %s.", storageProfile,
+                         ", ".join(["%s=%s" % x for x in db.STORAGE_PROFILES[storageProfile]]))
+
+        # bring an older db up to the latest version of the schema
+        migrator = migrations.SchemaMigrator(dbfile = dbfile, storageProfile = storageProfile)
+        try:
+            migrator.migrate()
+        finally:
+            migrator.close()
+
+        if checkTestData:
+            self.checkTestData(dbfile)
+
+    def checkTestData(self, dbfile = None):
+        """
+        Raises a RuntimeError if the db in dbfile holds test records (see tests.utils.Utils).
+
+        The scan goes through all the titles, so a db found clean is not scanned again
+        by this process as long as it stays at the same schema version.
+        """
+        # test utilities, only needed when asked for
+        import tests.utils
 
         # for direct SQL manipulation of the db: have the util class inited correctly
-        # and check for data cleanliness
-        self.util = tests.utils.Utils(dbfile = self._dbName,
+        self.util = tests.utils.Utils(dbfile = dbfile,
                                       logger = self.logger)
+
+        cacheKey = (os.path.abspath(dbfile), migrations.getVersion(self.util._conn))
+        if cacheKey in Sources._cleanDbs:
+            return
+
         self.util.checkDbDataTestNames()
+        Sources._cleanDbs.add(cacheKey)
 
     def getAllTablesDefinitions(self):
         """
-        Returns all the SQL DDL statements to create the tables, as stored in sqlite_master.
+        Returns all the SQL DDL statements to create the tables, as stored in sqlite_master
+        (without sqlite's own tables, like the statistics of the query planner).
         """
-        output = self.session.query(self.sqliteMasterClass).from_statement(text("SELECT name, sql FROM sqlite_master")).all()
+        output = self.session.query(self.sqliteMasterClass) \
+                             .from_statement(text("SELECT name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite\\_%' ESCAPE '\\'")) \
+                             .all()
         return output
 
     def getAllLocations(self,
@@ -113,18 +216,22 @@ class Sources(object):
         Returns all the locations known to the class up to this point.
         Return type is a list of Locations class instances.
 
-        If "Refresh" is set to True, or if there are not locations in the cache,
+        If "Refresh" is set to True, or if the cached metadata is missing or stale (see _getMetadata),
         performs a new query to the db to get fresh data.
         """
-        if refresh or len(self._locations) == 0:
-
-            # query
-            rec = self.session.query(self.locationClass).all()
-            self.logger.debug("Queried db for locations")
+        return list(self._getMetadata(refresh)['locations'])
 
-            self._locations = rec
+    def getLocationById(self, locationId = None, refresh = False):
+        """
+        Returns the Locations instance with the given id, or None if there is none.
+        """
+        return self._getMetadata(refresh)['locationsById'].get(locationId)
 
-        return self._locations
+    def getLocationByName(self, locationName = "", refresh = False):
+        """
+        Returns the Locations instance with the given name, or None if there is none.
+        """
+        return self._getMetadata(refresh)['locationsByName'].get(locationName)
 
     def getLocationSitesData(self,
                              locationName = "",
@@ -133,15 +240,51 @@ class Sources(object):
         Given a location name, it returns all the currently known data for that
         location, in the form of a list of dictionaries.
 
-        If "Refresh" is set to True, or if there is no data in the cache,
+        If "Refresh" is set to True, or if the cached metadata is missing or stale (see _getMetadata),
         performs a new query to the db to get fresh data.
 
         The data returned is in the form of a list of dictionaries with the
-        information about the URL, title_xpath, and Active status of the sites
-        connected to the given location.
+        information about the URL, title_xpath, pagination (page_param, next_page_xpath
+        and max_pages) and Active status of the sites connected to the given location.
+        """
+        return list(self._getMetadata(refresh)['sitesByLocationName'].get(locationName, []))
+
+    def getSiteData(self, siteId = None, refresh = False):
         """
-        if refresh or len(self._sites) == 0:
-            self.logger.debug("Refreshing data for locations and their sites.")
+        Returns the data of the site with the given id, as in getLocationSitesData(), or None if there is none.
+        """
+        return self._getMetadata(refresh)['sitesById'].get(siteId)
+
+    def _getMetadata(self, refresh = False):
+        """
+        Returns the locations and their sites, indexed for the lookups:
+            {'loadedAt': time.monotonic() of the load,
+             'locations': [Locations],
+             'locationsById': {id: Locations},
+             'locationsByName': {name: Locations},
+             'sitesById': {id: site data},
+             'sitesByLocationName': {location name: [site data]}}
+
+        They are (re)loaded from the db if refresh is True, if they were invalidated
+        by a write to locations or sites through the session, or if they are older
+        than metadataTTL seconds.
+        Like the session, this must be called by the thread owning the Sources instance.
+        """
+        if refresh or self._metadata is None or \
+           (self.metadataTTL is not None and time.monotonic() - self._metadata['loadedAt'] > self.metadataTTL):
+            metadata = {'loadedAt': time.monotonic(),
+                        'locations': [],
+                        'locationsById': {},
+                        'locationsByName': {},
+                        'sitesById': {},
+                        'sitesByLocationName': {}}
+
+            metadata['locations'] = self.session.query(self.locationClass).all()
+            self.logger.debug("Queried db for locations")
+            for loc in metadata['locations']:
+                metadata['locationsById'][loc.id] = loc
+                metadata['locationsByName'][loc.name] = loc
+                metadata['sitesByLocationName'][loc.name] = []
 
             # get all sites and their locations
             allData = self.session.query(self.locationClass, self.sitesClass) \
@@ -149,17 +292,39 @@ class Sources(object):
                                 .all()
             self.logger.debug("Queried db for join locations and sites")
 
-            # Build the dictionary in output
+            # Build the dictionaries of the sites
             for rec in allData:
-                self._sites.append({'id': rec.Sites.id,
-                                    'name': rec.Sites.name,
-                                    'url': rec.Sites.url,
-                                    'title_xpath': rec.Sites.title_xpath,
-                                    'active': rec.Sites.active,
-                                    'locations_ref': rec.Sites.locations_ref,
-                                    'location_name': rec.Locations.name})
+                site = {'id': rec.Sites.id,
+                        'name': rec.Sites.name,
+                        'url': rec.Sites.url,
+                        'title_xpath': rec.Sites.title_xpath,
+                        'active': rec.Sites.active,
+                        'page_param': rec.Sites.page_param,
+                        'next_page_xpath': rec.Sites.next_page_xpath,
+                        'max_pages': rec.Sites.max_pages,
+                        'locations_ref': rec.Sites.locations_ref,
+                        'location_name': rec.Locations.name}
+                metadata['sitesById'][site['id']] = site
+                metadata['sitesByLocationName'][site['location_name']].append(site)
+
+            self._metadata = metadata
+
+        return self._metadata
+
+    def invalidateMetadata(self):
+        """
+        Drops the cached locations and sites: they are loaded again when next needed.
+        """
+        self._metadata = None
 
-        return [x for x in self._sites if x['location_name'] == locationName]
+    def _invalidateMetadataOnFlush(self, session, flushContext):
+        """
+        Session listener: drops the cached locations and sites when some of them are written.
+        """
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, (Locations, Sites)):
+                self.invalidateMetadata()
+                return
 
     def getAllTitles(self):
         """
@@ -203,7 +368,10 @@ class Sources(object):
               'title': title string,
               'first_show': date of the first show of this title in this location,
               'last_show': date of the most recent show of this title in this location,
+              'show_count': days this title was shown in this location,
               'locations_ref': id of the location}]
+
+        The dates and days are read from titles_in_locations, kept up to date by the inserts of the shows.
         """
         output = []
 
@@ -213,14 +381,13 @@ class Sources(object):
                                   self.locationClass.id.label("locations_id"), \
                                   self.locationClass.language.label("language"), \
                                   self.titlesInLocationsClass.id.label("titles_in_locations_id"), \
-                                  func.min(self.showsClass.date).label("first_show"), \
-                                  func.max(self.showsClass.date).label("last_show")) \
+                                  self.titlesInLocationsClass.first_show, \
+                                  self.titlesInLocationsClass.last_show, \
+                                  self.titlesInLocationsClass.show_count) \
                            .filter(Titles.id == TitlesInLocations.titles_ref) \
                            .filter(TitlesInLocations.locations_ref == Locations.id) \
                            .filter(TitlesInLocations.locations_ref == locationsId) \
-                           .filter(Shows.titles_in_locations_ref == TitlesInLocations.id) \
-                           .group_by(Titles.id) \
-                           .group_by(TitlesInLocations.id) \
+                           .filter(TitlesInLocations.first_show != None) \
                            .order_by(Titles.title) \
                            .all()
 
@@ -231,6 +398,7 @@ class Sources(object):
                    'title': rec.title, \
                    'first_show': rec.first_show, \
                    'last_show': rec.last_show, \
+                   'show_count': rec.show_count, \
                    'locations_ref': rec.locations_id, \
                    'language': rec.language} \
                   for rec in recs]
@@ -248,47 +416,331 @@ class Sources(object):
               'title': title string,
               'first_show': date of the first show of this title in this location,
               'last_show': date of the most recent show of this title in this location,
-              'locations_ref': id of the location}]
+              'show_count': days this title was shown in this location,
+              'locations_ref': id of the location,
+              'location_name': name of the location,
+              'language': language of the location}]
         """
-        output = []
-
-        # query only the titles not yet translated
-        translatedTitles = self.session.query(self.translationClass.title_from_ref) \
-                                       .distinct() \
-                                       .all()
-        self.logger.info("Already translated: %d titles" % len(translatedTitles))
-        whereClause = [r[0] for r in translatedTitles]
-
-        qry = self.session.query(self.titlesClass.id.label("titles_id"), \
-                                  self.titlesClass.title, \
-                                  self.locationClass.id.label("locations_id"), \
-                                  self.locationClass.language.label("language"), \
-                                  self.titlesInLocationsClass.id.label("titles_in_locations_id"), \
-                                  func.min(self.showsClass.date).label("first_show"), \
-                                  func.max(self.showsClass.date).label("last_show")) \
-                           .filter(Titles.id.notin_(whereClause)) \
-                           .filter(Titles.id == TitlesInLocations.titles_ref) \
-                           .filter(TitlesInLocations.locations_ref == Locations.id) \
-                           .filter(TitlesInLocations.locations_ref == locationsId) \
-                           .filter(Shows.titles_in_locations_ref == TitlesInLocations.id) \
-                           .group_by(Titles.id) \
-                           .group_by(TitlesInLocations.id) \
-                           .order_by(Titles.title)
-        recs = qry.all()
+        recs = self._getNonTranslatedTitlesQuery(locationsId).all()
 
         # Build the dictionary in output
         self.logger.info("Got: %d titles still to translate" % len(recs))
-        output = [{'tid': rec.titles_id, \
-                   'tilid': rec.titles_in_locations_id, \
-                   'title': rec.title, \
-                   'first_show': rec.first_show, \
-                   'last_show': rec.last_show, \
-                   'locations_ref': rec.locations_id, \
-                   'language': rec.language} \
-                  for rec in recs]
+        output = [self._nonTranslatedTitleData(rec) for rec in recs]
 
         return output
 
+    def getNonTranslatedTitles(self):
+        """
+        Generator yielding the titles for which there is not yet a translation, in all
+        the locations, as dictionaries like the ones of getNonTranslatedTitlesInLocation(),
+        ordered by location and title.
+
+        The titles are streamed from a query on a connection of their own, so the session
+        can keep on writing (e.g. the translations) while they are read. The titles read are
+        the ones without a translation when the query started.
+        """
+        conn = self._engine.connect().execution_options(stream_results = True)
+        try:
+            result = conn.execute(self._getNonTranslatedTitlesQuery().statement)
+            for rec in result:
+                yield self._nonTranslatedTitleData(rec)
+
+        finally:
+            conn.close()
+
+    def _getNonTranslatedTitlesQuery(self, locationsId = None):
+        """
+        Returns the query of the titles with no translation, with the dates of their
+        first and last show, in the given location (in all of them if None).
+
+        The translations are excluded by an anti-join, executed by sqlite on the
+        index of translations.title_from_ref; the dates are the ones of titles_in_locations.
+        """
+        qry = self.session.query(self.titlesClass.id.label("titles_id"), \
+                                 self.titlesClass.title, \
+                                 self.locationClass.id.label("locations_id"), \
+                                 self.locationClass.name.label("location_name"), \
+                                 self.locationClass.language.label("language"), \
+                                 self.titlesInLocationsClass.id.label("titles_in_locations_id"), \
+                                 self.titlesInLocationsClass.first_show, \
+                                 self.titlesInLocationsClass.last_show, \
+                                 self.titlesInLocationsClass.show_count) \
+                          .filter(~exists().where(Translations.title_from_ref == Titles.id)) \
+                          .filter(Titles.id == TitlesInLocations.titles_ref) \
+                          .filter(TitlesInLocations.locations_ref == Locations.id) \
+                          .filter(TitlesInLocations.first_show != None)
+
+        if locationsId is not None:
+            qry = qry.filter(TitlesInLocations.locations_ref == locationsId)
+
+        return qry.order_by(Locations.id, Titles.title)
+
+    def _nonTranslatedTitleData(self, rec = None):
+        """
+        Returns the dictionary of one row of _getNonTranslatedTitlesQuery().
+        """
+        return {'tid': rec.titles_id, \
+                'tilid': rec.titles_in_locations_id, \
+                'title': rec.title, \
+                'first_show': rec.first_show, \
+                'last_show': rec.last_show, \
+                'show_count': rec.show_count, \
+                'locations_ref': rec.locations_id, \
+                'location_name': rec.location_name, \
+                'language': rec.language}
+
+    def iterTitles(self):
+        """
+        Generator yielding all the titles, as TitleRow(id, title), ordered by id.
+
+        Like all the iter methods, it reads the rows in chunks from a cursor of its own,
+        without building ORM objects, so memory stays flat whatever the size of the result.
+        """
+        return self._iterRows(TitleRow, "SELECT id, title FROM titles ORDER BY id")
+
+    def iterTitlesAndLocations(self):
+        """
+        Generator yielding all the titles with their locations,
+        as TitleAndLocationRow(id, title, locations_ref, tilid), ordered by titles_in_locations id.
+        """
+        return self._iterRows(TitleAndLocationRow,
+                              "SELECT t.id, t.title, til.locations_ref, til.id " +
+                              "FROM titles_in_locations til JOIN titles t ON t.id = til.titles_ref " +
+                              "ORDER BY til.id")
+
+    def iterTitlesInLocation(self, locationsId = None):
+        """
+        Generator yielding the titles shown in the given location, as
+        TitleInLocationRow(tid, tilid, title, first_show, last_show, locations_ref, language, show_count),
+        ordered by title: the same data as getAllTitlesInLocation().
+        """
+        return self._iterTitlesInLocationRows("til.locations_ref = ? AND til.first_show IS NOT NULL", (locationsId,), "t.title")
+
+    def iterTitlesOpened(self, locationsId = None, dateFrom = None, dateTo = None):
+        """
+        Generator yielding the titles first shown between dateFrom and dateTo included ('%Y-%m-%d'),
+        in the given location, as TitleInLocationRow, ordered by first show and title.
+        """
+        return self._iterTitlesInLocationRows("til.locations_ref = ? AND til.first_show BETWEEN ? AND ?",
+                                              (locationsId, dateFrom, dateTo), "til.first_show, t.title")
+
+    def iterTitlesClosed(self, locationsId = None, dateFrom = None, dateTo = None):
+        """
+        Generator yielding the titles last shown (so far) between dateFrom and dateTo included ('%Y-%m-%d'),
+        in the given location, as TitleInLocationRow, ordered by last show and title.
+        """
+        return self._iterTitlesInLocationRows("til.locations_ref = ? AND til.last_show BETWEEN ? AND ?",
+                                              (locationsId, dateFrom, dateTo), "til.last_show, t.title")
+
+    def _iterTitlesInLocationRows(self, condition = "", params = (), orderBy = ""):
+        """
+        Generator yielding the titles_in_locations matching the condition as TitleInLocationRow.
+        """
+        return self._iterRows(TitleInLocationRow,
+                              "SELECT t.id, til.id, t.title, til.first_show, til.last_show, l.id, l.language, til.show_count " +
+                              "FROM titles_in_locations til " +
+                              "JOIN titles t ON t.id = til.titles_ref " +
+                              "JOIN locations l ON l.id = til.locations_ref " +
+                              "WHERE " + condition + " ORDER BY " + orderBy,
+                              params)
+
+    def iterShows(self, locationId = None, dateFrom = None, dateTo = None):
+        """
+        Generator yielding the shows, one per day, as ShowRow(date, titles_ref, title, locations_ref, titles_in_locations_ref),
+        ordered by date and titles_in_locations, in the given location (all of them if None) and between dateFrom
+        and dateTo included ('%Y-%m-%d', either can be None for no limit).
+
+        The shows are read one day at a time, on a connection of their own: the runs covering the day,
+        found through their show_runs_dates index among the ones ending before the longest run is over,
+        and the daily shows of the day not yet compacted which no run covers. Only the shows of a day
+        are held at once, to sort them.
+        """
+        # the CROSS JOINs keep sqlite from going through all the titles_in_locations (of the location) each day
+        dayQuery = "SELECT :date, t.id, t.title, til.locations_ref, til.id " + \
+                   "FROM (SELECT r.titles_in_locations_ref AS titles_in_locations_ref FROM show_runs r " + \
+                   "      WHERE r.last_date BETWEEN :date AND :lastEnd AND r.first_date <= :date " + \
+                   "      UNION ALL " + \
+                   "      SELECT s.titles_in_locations_ref FROM shows_daily s WHERE s.date = :date AND NOT EXISTS (" + \
+                   "       SELECT 1 FROM show_runs c WHERE c.titles_in_locations_ref = s.titles_in_locations_ref " + \
+                   "       AND c.first_date <= s.date AND c.last_date >= s.date)) d " + \
+                   "CROSS JOIN titles_in_locations til ON til.id = d.titles_in_locations_ref " + \
+                   "CROSS JOIN titles t ON t.id = til.titles_ref " + \
+                   ("WHERE til.locations_ref = :location " if locationId is not None else "") + \
+                   "ORDER BY til.id"
+
+        conn = self._engine.raw_connection()
+        try:
+            cur = conn.cursor()
+
+            # the days to go through (the ones with shows, within the dates), and the longest run:
+            # the runs covering a day end at most that many days after it
+            cur.execute("SELECT MIN(first_day), MAX(last_day), MAX(run_days) FROM (" +
+                        " SELECT MIN(first_date) AS first_day, MAX(last_date) AS last_day, " +
+                        "  MAX(julianday(last_date) - julianday(first_date)) AS run_days FROM show_runs " +
+                        " UNION ALL " +
+                        " SELECT MIN(date), MAX(date), 0 FROM shows_daily)")
+            firstDay, lastDay, runDays = cur.fetchone()
+            if firstDay is None:
+                return
+            firstDay = max(firstDay, dateFrom or firstDay)
+            lastDay = min(lastDay, dateTo or lastDay)
+
+            day = datetime.datetime.strptime(firstDay, '%Y-%m-%d').date()
+            end = datetime.datetime.strptime(lastDay, '%Y-%m-%d').date()
+            while day <= end:
+                cur.execute(dayQuery, {'date': day.strftime('%Y-%m-%d'),
+                                       'lastEnd': (day + datetime.timedelta(days = int(runDays))).strftime('%Y-%m-%d'),
+                                       'location': locationId})
+
+                rows = cur.fetchmany(self._fetchSize)
+                while rows:
+                    yield from map(ShowRow._make, rows)
+                    rows = cur.fetchmany(self._fetchSize)
+                day += datetime.timedelta(days = 1)
+            cur.close()
+
+        finally:
+            conn.close()
+
+    def iterDailyStats(self, locationId = None, dateFrom = None, dateTo = None):
+        """
+        Generator yielding the aggregates of the shows of each location and day (see aggregates.py), as
+        DailyStatsRow(locations_ref, date, titles, new_titles, departed_titles), ordered by location and date,
+        in the given location (all of them if None) and between dateFrom and dateTo included.
+        """
+        conditions, params = self._statsConditions("date", locationId, dateFrom, dateTo)
+
+        return self._iterRows(DailyStatsRow,
+                              "SELECT locations_ref, date, titles, new_titles, departed_titles FROM daily_stats" +
+                              conditions + " ORDER BY locations_ref, date",
+                              params)
+
+    def iterPeriodStats(self, period = 'week', locationId = None, dateFrom = None, dateTo = None):
+        """
+        Generator yielding the aggregates of the shows of each location by week or by month (see aggregates.py), as
+        PeriodStatsRow(locations_ref, period, start_date, titles, title_days, new_titles, departed_titles),
+        ordered by location and start of the period, in the given location (all of them if None)
+        and for the periods starting between dateFrom and dateTo included.
+        """
+        assert period in [x[0] for x in aggregates.PERIODS], "Unknown period %s" % period
+
+        conditions, params = self._statsConditions("start_date", locationId, dateFrom, dateTo)
+
+        return self._iterRows(PeriodStatsRow,
+                              "SELECT locations_ref, period, start_date, titles, title_days, new_titles, departed_titles " +
+                              "FROM period_stats WHERE period = ?" + conditions.replace(" WHERE ", " AND ", 1) +
+                              " ORDER BY locations_ref, start_date",
+                              [period] + params)
+
+    def iterTitleBitmaps(self, locationIds = None, dateFrom = None, dateTo = None):
+        """
+        Generator yielding the bitmaps of the titles shown in each location and day (see bitmaps.py), as
+        TitleBitmapRow(locations_ref, date, bitmap), the bitmap as an int, ordered by location and date,
+        in the given locations (list of ids, all of them if None) and between dateFrom and dateTo included.
+        """
+        conditions, params = self._dayConditions(locationIds, dateFrom, dateTo)
+
+        rows = self._iterRows(TitleBitmapRow,
+                              "SELECT locations_ref, date, bitmap FROM title_bitmaps" + conditions +
+                              " ORDER BY locations_ref, date",
+                              params)
+        return (x._replace(bitmap = bitmaps.decode(x.bitmap)) for x in rows)
+
+    def iterTitleSketches(self, locationIds = None, dateFrom = None, dateTo = None):
+        """
+        Generator yielding the sketches of the titles shown in each location and day (see sketches.py), as
+        TitleSketchRow(locations_ref, date, sketch), the sketch as its registers, ordered by location and date,
+        in the given locations (list of ids, all of them if None) and between dateFrom and dateTo included.
+        """
+        conditions, params = self._dayConditions(locationIds, dateFrom, dateTo)
+
+        rows = self._iterRows(TitleSketchRow,
+                              "SELECT locations_ref, date, sketch FROM title_sketches" + conditions +
+                              " ORDER BY locations_ref, date",
+                              params)
+        return (x._replace(sketch = sketches.decode(x.sketch)) for x in rows)
+
+    def countDistinctTitles(self, locationIds = None, dateFrom = None, dateTo = None):
+        """
+        Returns the exact number of distinct titles shown in the given locations (list of ids, all of
+        them if None) between dateFrom and dateTo included, from the runs of shows and the daily shows.
+        sketches.estimate() gives an approximation of it from the sketches, with no reads of the shows.
+        """
+        runsConditions = []
+        dailyConditions = []
+        params = {}
+        if locationIds is not None:
+            params.update({'l%d' % i: x for i, x in enumerate(locationIds)})
+            locations = "til.locations_ref IN (" + ", ".join([":l%d" % i for i in range(len(locationIds))]) + ")"
+            runsConditions.append(locations)
+            dailyConditions.append(locations)
+        if dateFrom is not None:
+            params['dateFrom'] = dateFrom
+            runsConditions.append("r.last_date >= :dateFrom")
+            dailyConditions.append("s.date >= :dateFrom")
+        if dateTo is not None:
+            params['dateTo'] = dateTo
+            runsConditions.append("r.first_date <= :dateTo")
+            dailyConditions.append("s.date <= :dateTo")
+
+        return self.session.execute(text("SELECT COUNT(DISTINCT titles_ref) FROM (" +
+                                         " SELECT til.titles_ref AS titles_ref FROM show_runs r " +
+                                         " JOIN titles_in_locations til ON til.id = r.titles_in_locations_ref" +
+                                         (" WHERE " + " AND ".join(runsConditions) if len(runsConditions) > 0 else "") +
+                                         " UNION ALL " +
+                                         " SELECT til.titles_ref FROM shows_daily s " +
+                                         " JOIN titles_in_locations til ON til.id = s.titles_in_locations_ref" +
+                                         (" WHERE " + " AND ".join(dailyConditions) if len(dailyConditions) > 0 else "") + ")"),
+                                    params,
+                                    mapper = ShowRuns).scalar()
+
+    def _dayConditions(self, locationIds = None, dateFrom = None, dateTo = None):
+        """
+        Returns the WHERE clause (empty if no conditions) and its parameters of the reads of the
+        bitmaps and sketches, in the given locations (list of ids, all of them if None).
+        """
+        conditions, params = self._statsConditions("date", None, dateFrom, dateTo)
+        if locationIds is not None:
+            conditions += (" AND " if len(params) > 0 else " WHERE ") + \
+                          "locations_ref IN (" + ", ".join("?" * len(locationIds)) + ")"
+            params += list(locationIds)
+
+        return conditions, params
+
+    def _statsConditions(self, dateColumn = None, locationId = None, dateFrom = None, dateTo = None):
+        """
+        Returns the WHERE clause (empty if no conditions) and its parameters of the reads of the aggregates.
+        """
+        conditions = []
+        params = []
+        for condition, value in [("locations_ref = ?", locationId),
+                                 (dateColumn + " >= ?", dateFrom),
+                                 (dateColumn + " <= ?", dateTo)]:
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        return (" WHERE " + " AND ".join(conditions) if len(conditions) > 0 else ""), params
+
+    def _iterRows(self, rowClass = None, query = "", params = ()):
+        """
+        Generator executing the query on a connection of its own and yielding
+        its rows as instances of the rowClass namedtuple, read _fetchSize at a time.
+        """
+        conn = self._engine.raw_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+
+            rows = cur.fetchmany(self._fetchSize)
+            while rows:
+                yield from map(rowClass._make, rows)
+                rows = cur.fetchmany(self._fetchSize)
+            cur.close()
+
+        finally:
+            conn.close()
+
     def insertTitleInLocation(self, aTitle = None, locationId = None):
         """
         Inserts a new title for the given location in the db.
@@ -298,6 +750,9 @@ class Sources(object):
 
         If the same title exists in the given location, this is a no-op.
 
+        The exact string, once resolved, is stored as an alias for this location:
+        the next time it comes up it is resolved without comparing it to the other titles.
+
         Returns the titles_in_locations record primary key (id).
         """
 
@@ -309,11 +764,19 @@ class Sources(object):
         assert locationId != None and isinstance(locationId, int), \
             "Attempted to insert a title with an invalid location (%s)!" % locationId
 
-        dbTitles = self.getAllTitlesAndLocations()
+        # this exact title may have been seen here before
+        alias = self.session.query(self.titleAliasesClass) \
+                            .filter(TitleAliases.raw_title == aTitle) \
+                            .filter(TitleAliases.locations_ref == locationId) \
+                            .first()
+        if alias is not None:
+            self._aliasHits += 1
+            return (alias.titles_ref, alias.titles_in_locations_ref)
+        self._aliasMisses += 1
+
+        titleIndex = self._getTitleIndex()
         # check whether the title is similar to one already in for this location
-        similar = [x for x in dbTitles if x['locations_ref'] == locationId \
-                                        and (stringUtils.isSimilar(aTitle, x['title']))
-                  ]
+        similar = self._findSimilarTitles(aTitle, [locationId])
 
         if len(similar) == 1:
             # found a similar title already in
@@ -328,19 +791,15 @@ class Sources(object):
 
         else:
             # this title is not in the given location: check all other locations
-            similar = [x for x in dbTitles if x['locations_ref'] != locationId \
-                                      and (stringUtils.isSimilar(aTitle, x['title']))
-                      ]
+            similar = self._findSimilarTitles(aTitle, [x for x in titleIndex['locations'] if x != locationId])
             if len(similar) >= 1:
                 # found a similar title in a different location
                 self.logger.debug("Found title '%s', similar to '%s' already in the db " + \
                                  "but in a different location (%d): adding current location.", \
                                  aTitle, similar[0]['title'], locationId)
-                newTitleInLocation = TitlesInLocations(titles_ref = similar[0]['id'], locations_ref = locationId)
-                self.session.add(newTitleInLocation)
-                newTitleInLocationId = self.session.commit()
-                newTitleInLocationId = newTitleInLocation.id
                 newTitleId = similar[0]['id']
+                newTitleInLocationId = self._upsertTitlesInLocations([newTitleId], locationId)[newTitleId]
+                self.session.commit()
             else:
                 # Bona fide new title: insert the title for this location
                 self.logger.debug("Brand new title '%s', adding it to titles and to location %d.", \
@@ -351,22 +810,331 @@ class Sources(object):
                 newTitleId = titleRec.id
 
                 # and then insert it in the TIL table
-                titleInLocRec = self.titlesInLocationsClass(titles_ref = newTitleId, locations_ref = locationId)
-                self.session.add(titleInLocRec)
+                newTitleInLocationId = self._upsertTitlesInLocations([newTitleId], locationId)[newTitleId]
                 self.session.commit()
-                newTitleInLocationId = titleInLocRec.id
+
+        # next time this exact title will be resolved straight away
+        if newTitleInLocationId is not None:
+            self.session.add(self.titleAliasesClass(raw_title = aTitle,
+                                                    locations_ref = locationId,
+                                                    titles_ref = newTitleId,
+                                                    titles_in_locations_ref = newTitleInLocationId))
+            self.session.commit()
 
         return (newTitleId, newTitleInLocationId)
 
+    def insertTitlesInLocationBatch(self, titles = None, locationId = None, commit = True):
+        """
+        Inserts a list of titles for the given location, as insertTitleInLocation would
+        do for each one of them in turn, but looking up all the aliases at once and writing
+        all the new titles, titles_in_locations and aliases with multi-row inserts,
+        in a single transaction (committed only if commit is True).
+
+        If another instance stored the aliases of some of these titles in the meantime,
+        these are resolved as its aliases say.
+
+        Returns the list of the (titles id, titles_in_locations id) of the titles, in the same order.
+        """
+        assert isinstance(titles, list), "Expecting a list of titles, got %s" % type(titles)
+        assert len([x for x in titles if x is None or x == ""]) == 0, \
+            "Attempted to insert a NULL title!"
+        assert locationId != None and isinstance(locationId, int), \
+            "Attempted to insert a title with an invalid location (%s)!" % locationId
+
+        # all the aliases of these titles in this location
+        aliases = {}
+        distinctTitles = list(set(titles))
+        for start in range(0, len(distinctTitles), self._maxBatchVariables):
+            recs = self.session.query(self.titleAliasesClass) \
+                               .filter(TitleAliases.locations_ref == locationId) \
+                               .filter(TitleAliases.raw_title.in_(distinctTitles[start:start + self._maxBatchVariables])) \
+                               .all()
+            for rec in recs:
+                aliases[rec.raw_title] = (rec.titles_ref, rec.titles_in_locations_ref)
+
+        titleIndex = self._getTitleIndex()
+
+        # rows to be inserted: the ids of the new titles and titles_in_locations are referred
+        # to as ('titles', position in newTitles) and ('titles_in_locations', position in newTitlesInLocations)
+        newTitles = []
+        newTitlesInLocations = []
+        newAliases = []
+        results = []
+
+        for aTitle in titles:
+            if aTitle in aliases:
+                self._aliasHits += 1
+                results.append(aliases[aTitle])
+                continue
+            self._aliasMisses += 1
+
+            resolved = (None, None)
+            similar = self._findSimilarTitles(aTitle, [locationId])
+
+            if len(similar) == 1:
+                self.logger.debug("Found title '%s', similar to '%s' already in the db: using db version.", \
+                                  aTitle, similar[0]['title'])
+                resolved = (similar[0]['id'], similar[0]['tilid'])
+
+            elif len(similar) > 1:
+                self.logger.error("Cannot insert title '%s', found too many similar ones already in the db:\n%s", aTitle, pformat(similar))
+
+            else:
+                similar = self._findSimilarTitles(aTitle, [x for x in titleIndex['locations'] if x != locationId])
+                if len(similar) >= 1:
+                    self.logger.debug("Found title '%s', similar to '%s' already in the db " + \
+                                      "but in a different location (%d): adding current location.", \
+                                      aTitle, similar[0]['title'], locationId)
+                    titleId = similar[0]['id']
+                    indexedTitle = similar[0]['title']
+                else:
+                    self.logger.debug("Brand new title '%s', adding it to titles and to location %d.", \
+                                      aTitle, locationId)
+                    titleId = ('titles', len(newTitles))
+                    indexedTitle = aTitle
+                    newTitles.append(aTitle)
+
+                resolved = (titleId, ('titles_in_locations', len(newTitlesInLocations)))
+                newTitlesInLocations.append(titleId)
+                self._indexTitleInLocation(resolved[0], indexedTitle, locationId, resolved[1])
+
+            if resolved[1] is not None:
+                aliases[aTitle] = resolved
+                newAliases.append((aTitle, resolved))
+            results.append(resolved)
+
+        # write everything, then replace the references to the new rows with their ids
+        newIds = {}
+        for position, titleId in enumerate(self._insertRows(Titles.__table__, [{'title': x} for x in newTitles])):
+            newIds[('titles', position)] = titleId
+
+        tilTitles = [newIds.get(x, x) for x in newTitlesInLocations]
+        tilIds = self._upsertTitlesInLocations(tilTitles, locationId, index = False)
+        for position, titleId in enumerate(tilTitles):
+            newIds[('titles_in_locations', position)] = tilIds[titleId]
+            self._reindexTitleInLocation(('titles_in_locations', position), titleId, tilIds[titleId])
+
+        # another instance may have resolved some of these titles since they were looked up:
+        # its aliases win, and the titles added here in their place are dropped
+        winners = self._upsertTitleAliases([(x, newIds.get(titleId, titleId), newIds.get(tilId, tilId))
+                                            for x, (titleId, tilId) in newAliases],
+                                           locationId)
+        lost = {}
+        for x, (titleId, tilId) in newAliases:
+            if titleId in newIds and newTitles[titleId[1]] == x and winners[x][0] != newIds[titleId]:
+                lost[newIds[titleId]] = winners[x]
+
+        if len(lost) > 0:
+            self.logger.info("%d title(s) already added to location %d by somebody else, using theirs.", len(lost), locationId)
+            # the aliases written here for the dropped titles go to the winning ones
+            for x, (titleId, tilId) in newAliases:
+                if newIds.get(titleId) in lost and winners[x][0] == newIds[titleId]:
+                    winners[x] = lost[newIds[titleId]]
+                    self._executeOrRollback(text("UPDATE title_aliases SET titles_ref = :titles_ref, " +
+                                                 "titles_in_locations_ref = :titles_in_locations_ref " +
+                                                 "WHERE raw_title = :raw_title AND locations_ref = :locations_ref"),
+                                            {'titles_ref': winners[x][0], 'titles_in_locations_ref': winners[x][1],
+                                             'raw_title': x, 'locations_ref': locationId},
+                                            mapper = TitleAliases)
+
+            params = {'t%d' % i: x for i, x in enumerate(lost)}
+            placeholders = ", ".join([":t%d" % i for i in range(len(lost))])
+            self._executeOrRollback(text("DELETE FROM titles_in_locations WHERE titles_ref IN (%s)" % placeholders),
+                                    params,
+                                    mapper = TitlesInLocations)
+            self._executeOrRollback(text("DELETE FROM titles WHERE id IN (%s)" % placeholders), params, mapper = Titles)
+            self.invalidateTitleIndex()
+
+        if commit:
+            self.session.commit()
+
+        return [winners.get(aTitle, (newIds.get(x, x), newIds.get(y, y))) for aTitle, (x, y) in zip(titles, results)]
+
+    def _upsertTitleAliases(self, aliases = None, locationsRef = None):
+        """
+        Adds the aliases, as (raw title, titles id, titles_in_locations id), to the location,
+        unless they are already there, in the current transaction.
+        Returns a dictionary with the (titles id, titles_in_locations id) of each raw title in the db.
+        """
+        output = {}
+
+        for start in range(0, len(aliases), self._maxBatchVariables // 4):
+            chunk = aliases[start:start + self._maxBatchVariables // 4]
+            params = {'locations_ref': locationsRef}
+            for i, (rawTitle, titleId, tilId) in enumerate(chunk):
+                params.update({'r%d' % i: rawTitle, 't%d' % i: titleId, 'til%d' % i: tilId})
+
+            self._executeOrRollback(text("INSERT INTO title_aliases (raw_title, locations_ref, titles_ref, titles_in_locations_ref) VALUES " +
+                                         ", ".join(["(:r%d, :locations_ref, :t%d, :til%d)" % (i, i, i) for i in range(len(chunk))]) +
+                                         " ON CONFLICT (raw_title, locations_ref) DO NOTHING"),
+                                    params,
+                                    mapper = TitleAliases)
+            recs = self.session.execute(text("SELECT raw_title, titles_ref, titles_in_locations_ref FROM title_aliases " +
+                                             "WHERE locations_ref = :locations_ref AND raw_title IN (" +
+                                             ", ".join([":r%d" % i for i in range(len(chunk))]) + ")"),
+                                        params,
+                                        mapper = TitleAliases).fetchall()
+            output.update({x[0]: (x[1], x[2]) for x in recs})
+
+        return output
+
+    def insertShowsBatch(self, titlesRefs = None, locationsRef = None, date = None, commit = True):
+        """
+        Inserts a show on the given date for each one of the titles (ids) in the given location,
+        as insertShow would do for each one of them in turn, but with set-based updates and inserts
+        of the titles_in_locations and runs of shows and one lookup of their ids,
+        in a single transaction (committed only if commit is True).
+
+        Returns the list of the ids of the runs of shows, in the same order as titlesRefs.
+        """
+        assert isinstance(titlesRefs, list), "Expecting a list of titles ids, got %s" % type(titlesRefs)
+        assert len([x for x in titlesRefs if not isinstance(x, int)]) == 0, \
+            "Cannot insert shows with titlesRefs which are not all ints!"
+        assert locationsRef != None, "Cannot insert a show with a null locationsRef!"
+        assert isinstance(locationsRef, int), "Cannot insert a show with a locationsRef of type %s, should be an int!" % (type(locationsRef))
+
+        if date is None:
+            date = datetime.date.today().strftime('%Y-%m-%d')
+
+        titlesInLocations = self._upsertTitlesInLocations(titlesRefs, locationsRef)
+        shows = self._upsertShowRuns([titlesInLocations[x] for x in titlesRefs], date)
+        if len(titlesRefs) > 0:
+            self._refreshAggregates([(locationsRef, date)], list(titlesInLocations.values()))
+
+        if commit:
+            self.session.commit()
+
+        return [shows[titlesInLocations[x]] for x in titlesRefs]
+
+    def _executeOrRollback(self, statement = None, params = None, mapper = None):
+        """
+        Executes a statement in the current transaction. If it fails, the whole transaction is
+        rolled back, as the session does when a flush fails, and the exception raised again.
+        """
+        try:
+            return self.session.execute(statement, params, mapper = mapper)
+        except Exception:
+            self.rollbackSession()
+            raise
+
+    def _insertRows(self, table = None, rows = None):
+        """
+        Inserts the rows (dictionaries) in the table with multi-row inserts, in the current transaction.
+        Returns the list of the ids given to the rows, in the same order.
+        """
+        ids = []
+        columns = max(1, len(table.columns))
+        chunkSize = max(1, self._maxBatchVariables // columns)
+
+        for start in range(0, len(rows), chunkSize):
+            chunk = rows[start:start + chunkSize]
+            result = self._executeOrRollback(table.insert().values(chunk))
+            # the rowids of the rows of a single insert are consecutive
+            ids.extend(range(result.lastrowid - len(chunk) + 1, result.lastrowid + 1))
+
+        return ids
+
+    def getAliasStats(self):
+        """
+        Returns how many titles were inserted by this instance so far, split between
+        the ones found in the aliases ('hits') and the ones which had to be matched ('misses').
+        """
+        return {'hits': self._aliasHits, 'misses': self._aliasMisses}
+
+    def logAliasStats(self):
+        """
+        Logs how many titles were found in the aliases and how many had to be matched.
+        """
+        self.logger.info("Title aliases: %d title(s) resolved through their alias, %d matched.",
+                         self._aliasHits,
+                         self._aliasMisses)
+
+    def _getTitleIndex(self):
+        """
+        Returns the index of the titles in the db, loading it if needed:
+            {'entries': {titles_in_locations id: {'id', 'title', 'locations_ref', 'tilid', 'order'}},
+             'locations': {locations_ref: stringUtils.TitleBlockIndex of the entries in that location}}
+
+        The index is kept up to date by the inserts done through this class:
+        invalidateTitleIndex() needs to be called when the titles are changed in any other way.
+        """
+        if self._titleIndex is None:
+            self._titleIndex = {'entries': {}, 'locations': {}}
+            for entry in self.getAllTitlesAndLocations():
+                self._indexTitleInLocation(entry['id'], entry['title'], entry['locations_ref'], entry['tilid'])
+
+            self.logger.debug("Loaded the index of %d titles in locations.", len(self._titleIndex['entries']))
+
+        return self._titleIndex
+
+    def _indexTitleInLocation(self, titleId = None, title = None, locationId = None, titleInLocationId = None):
+        """
+        Adds a titles_in_locations record to the index of the titles, if this is loaded.
+        """
+        if self._titleIndex is None:
+            return
+
+        entry = {'id': titleId,
+                 'title': title,
+                 'locations_ref': locationId,
+                 'tilid': titleInLocationId,
+                 # position in the order the titles came out of the db, used to keep the results in that order
+                 'order': len(self._titleIndex['entries'])}
+        self._titleIndex['entries'][titleInLocationId] = entry
+        self._titleIndex['locations'].setdefault(locationId, stringUtils.TitleBlockIndex()).add(titleInLocationId, title)
+
+    def _reindexTitleInLocation(self, oldKey = None, titleId = None, titleInLocationId = None):
+        """
+        Once written, gives its ids to a titles_in_locations record indexed with a temporary key.
+        """
+        if self._titleIndex is None or oldKey not in self._titleIndex['entries']:
+            return
+
+        entry = self._titleIndex['entries'].pop(oldKey)
+        entry['id'] = titleId
+        entry['tilid'] = titleInLocationId
+        self._titleIndex['entries'][titleInLocationId] = entry
+
+        locationIndex = self._titleIndex['locations'][entry['locations_ref']]
+        locationIndex.remove(oldKey)
+        locationIndex.add(titleInLocationId, entry['title'])
+
+    def _findSimilarTitles(self, aTitle = None, locationIds = None):
+        """
+        Returns the list of the titles in the given locations which are similar to aTitle,
+        as dictionaries as returned by getAllTitlesAndLocations and in the same order.
+        """
+        titleIndex = self._getTitleIndex()
+
+        similar = []
+        for locationId in locationIds:
+            if locationId in titleIndex['locations']:
+                for key in titleIndex['locations'][locationId].candidates(aTitle):
+                    entry = titleIndex['entries'][key]
+                    if stringUtils.isSimilar(aTitle, entry['title']):
+                        similar.append(entry)
+
+        return sorted(similar, key = lambda x: x['order'])
+
+    def invalidateTitleIndex(self):
+        """
+        Drops the index of the titles, which will be loaded again from the db when needed.
+        To be called when the titles or their locations are changed other than through this class.
+        """
+        self._titleIndex = None
+
     def insertShow(self, titlesRef = None, locationsRef = None, date = None):
         """
         Inserts a new show for the given titles(id) on the specified date.
         If the same (titles_ref , date) tuple is already there, this is a no-op.
 
+        The shows are stored as runs of consecutive days: a show on the day before or after
+        a run extends it (and a show filling the gap between two runs merges them).
+
         If date is None, then today's date is used.
         The format for the date string should be '%Y-%m-%d'.
 
-        Returns the show primary key.
+        Returns the primary key of the run of shows including the date.
         """
         assert titlesRef != None, "Cannot insert a show with a null titlesRef!"
         assert isinstance(titlesRef, int), "Cannot insert a show with a titlesRef of type %s, should be an int!" % (type(titlesRef))
@@ -378,38 +1146,207 @@ class Sources(object):
         if date is None:
             date = currDate
 
-        # find this title in this location
-        titleInLoc_recs = self.session.query(self.titlesInLocationsClass) \
-                         .filter(TitlesInLocations.titles_ref == titlesRef) \
-                         .filter(TitlesInLocations.locations_ref == locationsRef) \
-                         .all()
-
-        # if this title was not shown before in this location, add it to the titles_in_locations table
-        if len(titleInLoc_recs) == 0:
-            newTitleInLocation = TitlesInLocations(titles_ref = titlesRef, locations_ref = locationsRef)
-            self.session.add(newTitleInLocation)
-            newTitleInLocationId = self.session.commit()
-            newTitleInLocationId = newTitleInLocation.id
-        else:
-            newTitleInLocationId = titleInLoc_recs[0].id
-
-        # check if there has been already a show in this location for this date
-        shows_recs = self.session.query(self.showsClass) \
-                    .filter(Shows.date == date) \
-                    .filter(Shows.titles_in_locations_ref == newTitleInLocationId) \
-                    .all()
-
-        # if there was one, record it, if not insert it on today's date
-        if len(shows_recs) == 0:
-            newShow = Shows(date = date, titles_in_locations_ref = newTitleInLocationId)
-            self.session.add(newShow)
-            newShowId = self.session.commit()
-            newShowId = newShow.id
-        else:
-            newShowId = shows_recs[0].id
+        # add this title to this location, if it was not shown here before, then the show
+        # if there was none on this date: the unique constraints make the inserts no-ops otherwise
+        newTitleInLocationId = self._upsertTitlesInLocations([titlesRef], locationsRef)[titlesRef]
+        newShowId = self._upsertShowRuns([newTitleInLocationId], date)[newTitleInLocationId]
+        self._refreshAggregates([(locationsRef, date)], [newTitleInLocationId])
+        self.session.commit()
 
         return newShowId
 
+    def _upsertTitlesInLocations(self, titlesRefs = None, locationsRef = None, index = True):
+        """
+        Adds the titles (ids) to the location, unless they are already there, in the current transaction.
+        Returns a dictionary with the titles_in_locations id of each title.
+
+        If index is True, the new records are added to the index of the titles, if this is loaded.
+        """
+        distinctTitles = list(dict.fromkeys(titlesRefs))
+        output = {}
+
+        for start in range(0, len(distinctTitles), self._maxBatchVariables // 2):
+            chunk = distinctTitles[start:start + self._maxBatchVariables // 2]
+            params = {'locations_ref': locationsRef}
+            params.update({'t%d' % i: x for i, x in enumerate(chunk)})
+
+            self._executeOrRollback(text("INSERT INTO titles_in_locations (titles_ref, locations_ref) VALUES " +
+                                      ", ".join(["(:t%d, :locations_ref)" % i for i in range(len(chunk))]) +
+                                      " ON CONFLICT (titles_ref, locations_ref) DO NOTHING"),
+                                 params,
+                                 mapper = TitlesInLocations)
+            recs = self.session.execute(text("SELECT titles_ref, id FROM titles_in_locations " +
+                                             "WHERE locations_ref = :locations_ref AND titles_ref IN (" +
+                                             ", ".join([":t%d" % i for i in range(len(chunk))]) + ")"),
+                                        params,
+                                        mapper = TitlesInLocations).fetchall()
+            output.update({x[0]: x[1] for x in recs})
+
+        if index and self._titleIndex is not None:
+            added = [x for x in distinctTitles if output[x] not in self._titleIndex['entries']]
+            if len(added) > 0:
+                titles = {x.id: x.title for x in self.session.query(self.titlesClass).filter(Titles.id.in_(added)).all()}
+                for titleId in added:
+                    self._indexTitleInLocation(titleId, titles[titleId], locationsRef, output[titleId])
+
+        return output
+
+    def _upsertShowRuns(self, titlesInLocationsRefs = None, date = None):
+        """
+        Adds a show on the date for the titles_in_locations (ids), unless one of their runs covers it already,
+        in the current transaction. Returns a dictionary with the id of the run of each titles_in_locations.
+
+        The runs of a titles_in_locations never overlap nor touch: a run ending the day before is extended
+        to the date, one starting the day after is merged into it (or moved back to the date),
+        and a new run of a single day is added only when there is none of these.
+        The daily shows not yet compacted are not looked at: compactShows() merges them with the runs.
+        """
+        distinctTils = list(dict.fromkeys(titlesInLocationsRefs))
+        output = {}
+
+        day = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+        dates = {'date': date,
+                 'previous': (day - datetime.timedelta(days = 1)).strftime('%Y-%m-%d'),
+                 'next': (day + datetime.timedelta(days = 1)).strftime('%Y-%m-%d')}
+        covered = "EXISTS (SELECT 1 FROM show_runs c WHERE c.titles_in_locations_ref = %s " + \
+                  "AND c.first_date <= :date AND c.last_date >= :date)"
+
+        for start in range(0, len(distinctTils), self._maxBatchVariables // 2):
+            chunk = distinctTils[start:start + self._maxBatchVariables // 2]
+            params = dict(dates)
+            params.update({'t%d' % i: x for i, x in enumerate(chunk)})
+            tils = "titles_in_locations_ref IN (" + ", ".join([":t%d" % i for i in range(len(chunk))]) + ")"
+
+            for statement in [
+                    # the runs up to the day before get to the date
+                    "UPDATE show_runs SET last_date = :date WHERE last_date = :previous AND " + tils,
+                    # and absorb the runs starting on the day after, which are then dropped
+                    "UPDATE show_runs SET last_date = (SELECT n.last_date FROM show_runs n " +
+                    " WHERE n.titles_in_locations_ref = show_runs.titles_in_locations_ref AND n.first_date = :next) " +
+                    "WHERE last_date = :date AND first_date < :date AND " + tils + " AND EXISTS (SELECT 1 FROM show_runs n " +
+                    " WHERE n.titles_in_locations_ref = show_runs.titles_in_locations_ref AND n.first_date = :next)",
+                    "DELETE FROM show_runs WHERE first_date = :next AND " + tils + " AND EXISTS (SELECT 1 FROM show_runs p " +
+                    " WHERE p.titles_in_locations_ref = show_runs.titles_in_locations_ref AND p.first_date < :next AND p.last_date >= :next)",
+                    # the runs starting on the day after start on the date
+                    "UPDATE show_runs SET first_date = :date WHERE first_date = :next AND " + tils +
+                    " AND NOT " + covered % "show_runs.titles_in_locations_ref",
+                    # a new run for the others
+                    "INSERT INTO show_runs (titles_in_locations_ref, first_date, last_date) " +
+                    "SELECT v.column1, :date, :date FROM (VALUES " + ", ".join(["(:t%d)" % i for i in range(len(chunk))]) + ") v " +
+                    "WHERE NOT " + covered % "v.column1"]:
+                self._executeOrRollback(text(statement), params, mapper = ShowRuns)
+
+            recs = self.session.execute(text("SELECT titles_in_locations_ref, id FROM show_runs " +
+                                             "WHERE first_date <= :date AND last_date >= :date AND " + tils),
+                                        params,
+                                        mapper = ShowRuns).fetchall()
+            output.update({x[0]: x[1] for x in recs})
+
+        return output
+
+    def _refreshAggregates(self, days = None, titlesInLocationsRefs = None):
+        """
+        Recomputes the aggregates of the given (locations_ref, date) and titles_in_locations (ids)
+        in the current transaction (see aggregates.py, bitmaps.py and sketches.py). If it fails, the whole transaction is rolled back.
+        """
+        self._runAggregates(aggregates.refreshDays, days)
+        self._runAggregates(bitmaps.refreshDays, days)
+        self._runAggregates(sketches.refreshDays, days)
+        self._runAggregates(aggregates.refreshTitlesInLocations, titlesInLocationsRefs)
+
+    def _runAggregates(self, function = None, *args):
+        """
+        Calls the function of aggregates.py with a cursor on the connection of the current transaction,
+        and returns its result. If it fails, the whole transaction is rolled back.
+        """
+        cur = self.session.connection(mapper = DailyStats).connection.cursor()
+        try:
+            return function(cur, *args)
+        except Exception:
+            self.rollbackSession()
+            raise
+        finally:
+            cur.close()
+
+    def catchUpAggregates(self):
+        """
+        Aggregates the daily shows written by other means than this class (see aggregates.catchUp()),
+        and commits. Returns the number of (location, day) refreshed.
+        """
+        days = self._runAggregates(aggregates.catchUp)
+        self.session.commit()
+
+        self.logger.info("Caught up the aggregates of %d days of the locations.", days)
+
+        return days
+
+    def rebuildAggregates(self):
+        """
+        Recomputes all the aggregates from the shows (see aggregates.py, bitmaps.py and sketches.py), and commits.
+        Returns the number of (location, day) aggregated.
+        """
+        days = self._runAggregates(aggregates.rebuild)
+        self._runAggregates(bitmaps.rebuild)
+        self._runAggregates(sketches.rebuild)
+        self._runAggregates(aggregates.refreshTitlesInLocations)
+        self.session.commit()
+
+        self.logger.info("Rebuilt the aggregates of %d days of the locations.", days)
+
+        return days
+
+    def compactShows(self):
+        """
+        Converts the daily shows into runs of shows, merging them with the runs of the same
+        titles_in_locations, in a single transaction. The daily shows are deleted.
+
+        Returns a dictionary with the number of daily shows converted ('shows') and of
+        runs of shows of their titles_in_locations afterwards ('runs').
+
+        The daily shows not aggregated yet are aggregated first (see catchUpAggregates()),
+        as their ids are lost in the runs, and the watermark goes back to 0, as the ids
+        of the deleted shows are given to the next ones.
+        """
+        self._runAggregates(aggregates.catchUp)
+
+        # islands of overlapping or touching days: a new one starts where a span begins after
+        # the day following the latest end of the spans before it
+        merged = self._executeOrRollback(text(
+                        "WITH spans AS (" +
+                        " SELECT titles_in_locations_ref, first_date, last_date FROM show_runs " +
+                        " WHERE titles_in_locations_ref IN (SELECT titles_in_locations_ref FROM shows_daily) " +
+                        " UNION ALL " +
+                        " SELECT titles_in_locations_ref, date, date FROM shows_daily), " +
+                        "marked AS (" +
+                        " SELECT titles_in_locations_ref, first_date, last_date, " +
+                        "  CASE WHEN first_date <= date(MAX(last_date) OVER (PARTITION BY titles_in_locations_ref " +
+                        "   ORDER BY first_date, last_date ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), '+1 day') " +
+                        "  THEN 0 ELSE 1 END AS island_start " +
+                        " FROM spans), " +
+                        "islands AS (" +
+                        " SELECT titles_in_locations_ref, first_date, last_date, " +
+                        "  SUM(island_start) OVER (PARTITION BY titles_in_locations_ref " +
+                        "   ORDER BY first_date, last_date ROWS UNBOUNDED PRECEDING) AS island " +
+                        " FROM marked) " +
+                        "SELECT titles_in_locations_ref, MIN(first_date), MAX(last_date) FROM islands " +
+                        "GROUP BY titles_in_locations_ref, island"),
+                    {},
+                    mapper = ShowRuns).fetchall()
+
+        self._executeOrRollback(text("DELETE FROM show_runs WHERE titles_in_locations_ref IN " +
+                                     "(SELECT titles_in_locations_ref FROM shows_daily)"),
+                                {},
+                                mapper = ShowRuns)
+        self._insertRows(ShowRuns.__table__, [{'titles_in_locations_ref': x[0], 'first_date': x[1], 'last_date': x[2]}
+                                               for x in merged])
+        shows = self._executeOrRollback(text("DELETE FROM shows_daily"), {}, mapper = ShowsDaily).rowcount
+        self._runAggregates(aggregates.resetWatermark)
+        self.session.commit()
+
+        self.logger.info("Compacted %d daily shows into %d runs of shows.", shows, len(merged))
+
+        return {'shows': shows, 'runs': len(merged)}
+
     def getAllTranslationsAlreadyIn(self, titlesRef = None, lang_from = None):
         """
             Returns all the translations for this title already in the table. 
@@ -486,3 +1423,6 @@ class Sources(object):
         by rolling it back before being able to initiate another one.
         """
         self.session.rollback()
+        # the index of the titles and the metadata may hold records which are not in the db
+        self.invalidateTitleIndex()
+        self.invalidateMetadata()
@@ -0,0 +1,141 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import closing
+import xmlrunner
+import movieLogger
+
+from utils import dbUtils as db
+import tests.utils
+import aggregates
+
+class testAggregates(unittest.TestCase):
+    """
+    Tests for the aggregate tables of the shows.
+    """
+    dbDir = None
+    dbFile = None
+    src = None
+    titleIds = None
+
+    # the daily stats of Milano, as (date, titles, new_titles, departed_titles)
+    _expectedDays = [('2017-05-01', 1, 1, 0), ('2017-05-02', 2, 1, 0), ('2017-05-03', 2, 1, 1), ('2017-05-04', 2, 0, 0),
+                     ('2017-05-05', 0, 0, 2), ('2017-05-08', 1, 1, 0), ('2017-05-09', 0, 0, 1)]
+
+    @classmethod
+    def setUpClass(cls):
+        super(testAggregates, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+    def setUp(self):
+        """
+        A db of its own, with three titles in Milano (2), inserted out of order:
+            title 1: 2017-05-01 .. 2017-05-04, and 2017-05-08 (the Monday after)
+            title 2: 2017-05-02
+            title 3: 2017-05-03 .. 2017-05-04
+        """
+        unittest.TestCase.setUp(self)
+        self.dbDir = tempfile.TemporaryDirectory()
+        self.dbFile = os.path.join(self.dbDir.name, "movies.db")
+        self.src, self.titleIds = tests.utils.Utils.createDb(self.dbFile)
+        for date in ['2017-05-08', '2017-05-03', '2017-05-01', '2017-05-04', '2017-05-02']:
+            self.src.insertShow(titlesRef = self.titleIds[0], locationsRef = 2, date = date)
+        self.src.insertShowsBatch(titlesRefs = self.titleIds[1:], locationsRef = 2, date = '2017-05-03')
+        self.src.insertShow(titlesRef = self.titleIds[1], locationsRef = 2, date = '2017-05-02')
+        self.src.insertShow(titlesRef = self.titleIds[2], locationsRef = 2, date = '2017-05-04')
+
+        # Amarcord was not shown on 2017-05-03 after all
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            conn.execute("UPDATE show_runs SET last_date = '2017-05-02' WHERE first_date = '2017-05-02' " +
+                         "AND titles_in_locations_ref = (SELECT id FROM titles_in_locations WHERE titles_ref = ?);",
+                         (self.titleIds[1],))
+            aggregates.refreshDays(conn.cursor(), [(2, '2017-05-03')])
+            conn.commit()
+
+    def tearDown(self):
+        self.dbDir.cleanup()
+        unittest.TestCase.tearDown(self)
+
+    def _stats(self):
+        """
+        Returns all the daily and period stats.
+        """
+        return ([tuple(x) for x in self.src.iterDailyStats()],
+                [tuple(x) for x in self.src.iterPeriodStats('week')] + [tuple(x) for x in self.src.iterPeriodStats('month')])
+
+    def testDailyStats(self):
+        """Tests the daily stats maintained on the inserts of the shows."""
+        self.assertEqual([x[1:] for x in self.src.iterDailyStats(locationId = 2)], self._expectedDays)
+        self.assertEqual([x.date for x in self.src.iterDailyStats(dateFrom = '2017-05-03', dateTo = '2017-05-05')],
+                         ['2017-05-03', '2017-05-04', '2017-05-05'])
+        self.assertEqual(list(self.src.iterDailyStats(locationId = 5)), [])
+
+    def testPeriodStats(self):
+        """Tests the rollups by week, starting on Monday, and by month."""
+        self.assertEqual([x[1:] for x in self.src.iterPeriodStats('week', locationId = 2)],
+                         [('week', '2017-05-01', 3, 7, 3, 3), ('week', '2017-05-08', 1, 1, 1, 1)])
+        self.assertEqual([x[1:] for x in self.src.iterPeriodStats('month', dateFrom = '2017-05-01', dateTo = '2017-05-31')],
+                         [('month', '2017-05-01', 3, 8, 4, 4)])
+        self.assertRaises(AssertionError, self.src.iterPeriodStats, 'year')
+
+    def testRebuild(self):
+        """Tests that the incremental stats are the same a rebuild computes."""
+        incremental = self._stats()
+        self.assertEqual(self.src.rebuildAggregates(), len(self._expectedDays))
+        self.assertEqual(self._stats(), incremental)
+
+    def testCatchUp(self):
+        """Tests aggregating the daily shows written by other means, from the watermark."""
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            self.assertEqual(aggregates.getWatermark(conn.cursor()), 0)
+            tilId = conn.execute("SELECT id FROM titles_in_locations WHERE titles_ref = ?;", (self.titleIds[1],)).fetchone()[0]
+            conn.executemany("INSERT INTO shows (date, titles_in_locations_ref) VALUES (?, ?);",
+                             [('2017-05-08', tilId), ('2017-06-01', tilId)])
+            conn.commit()
+
+        self.assertEqual(self.src.catchUpAggregates(), 2)
+        self.assertEqual([x[1:] for x in self.src.iterDailyStats(dateFrom = '2017-05-08')],
+                         [('2017-05-08', 2, 2, 0), ('2017-05-09', 0, 0, 2), ('2017-06-01', 1, 1, 0), ('2017-06-02', 0, 0, 1)])
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            self.assertEqual(aggregates.getWatermark(conn.cursor()), 2)
+        self.assertEqual(self.src.catchUpAggregates(), 0)
+
+        # the compaction keeps them
+        stats = self._stats()
+        self.assertEqual(self.src.compactShows()['shows'], 2)
+        self.assertEqual(self._stats(), stats)
+        self.src.rebuildAggregates()
+        self.assertEqual(self._stats(), stats)
+
+    def testCatchUpAfterCompaction(self):
+        """Tests that the daily shows written after a compaction, reusing the ids of the deleted ones, are caught up."""
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            tilId = conn.execute("SELECT id FROM titles_in_locations WHERE titles_ref = ?;", (self.titleIds[1],)).fetchone()[0]
+            conn.executemany("INSERT INTO shows (date, titles_in_locations_ref) VALUES (?, ?);",
+                             [('2017-05-08', tilId), ('2017-06-01', tilId)])
+            conn.commit()
+
+        self.assertEqual(self.src.compactShows()['shows'], 2)
+
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            self.assertEqual(aggregates.getWatermark(conn.cursor()), 0)
+            conn.execute("INSERT INTO shows (date, titles_in_locations_ref) VALUES ('2017-06-10', ?);", (tilId,))
+            conn.commit()
+            self.assertEqual(conn.execute("SELECT id FROM shows_daily;").fetchone()[0], 1)
+
+        self.assertEqual(self.src.catchUpAggregates(), 1)
+        self.assertEqual([x[1:] for x in self.src.iterDailyStats(dateFrom = '2017-06-10')],
+                         [('2017-06-10', 1, 1, 0), ('2017-06-11', 0, 0, 1)])
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
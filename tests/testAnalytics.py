@@ -0,0 +1,125 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import os
+import sys
+import io
+import math
+import tempfile
+import unittest
+from contextlib import closing
+import xmlrunner
+import movieLogger
+
+from utils import dbUtils as db
+import tests.utils
+import analytics
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class testAnalytics(unittest.TestCase):
+    """
+    Tests for the diversity reports.
+    """
+    dbDir = None
+    dbFile = None
+    analytics = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(testAnalytics, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+    def setUp(self):
+        """
+        A db of its own, with three titles in Milano (2) and one in München (5):
+            title 1: 2017-05-01 .. 2017-05-04, as a run
+            title 2: 2017-05-01 .. 2017-05-02, as daily shows, 2017-05-02 also in a run
+            title 3: 2017-05-03 .. 2017-05-04
+            title 1 in München: 2017-05-02
+        """
+        unittest.TestCase.setUp(self)
+        self.dbDir = tempfile.TemporaryDirectory()
+        self.dbFile = os.path.join(self.dbDir.name, "movies.db")
+        src, titleIds = tests.utils.Utils.createDb(self.dbFile)
+        for date in ['2017-05-01', '2017-05-02', '2017-05-03', '2017-05-04']:
+            src.insertShow(titlesRef = titleIds[0], locationsRef = 2, date = date)
+        src.insertShow(titlesRef = titleIds[1], locationsRef = 2, date = '2017-05-02')
+        for date in ['2017-05-03', '2017-05-04']:
+            src.insertShow(titlesRef = titleIds[2], locationsRef = 2, date = date)
+        src.insertShow(titlesRef = titleIds[0], locationsRef = 5, date = '2017-05-02')
+
+        # daily shows, as written by an older version
+        tilId = [x['tilid'] for x in src.getAllTitlesInLocation(2) if x['tid'] == titleIds[1]][0]
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            conn.executemany("INSERT INTO shows (date, titles_in_locations_ref) VALUES (?, ?);",
+                             [('2017-05-01', tilId), ('2017-05-02', tilId)])
+            conn.commit()
+
+        self.analytics = analytics.DiversityAnalytics(dbfile = self.dbFile)
+
+    def tearDown(self):
+        self.dbDir.cleanup()
+        unittest.TestCase.tearDown(self)
+
+    def testLoad(self):
+        """Tests loading the runs and the daily shows, once per location, day and title."""
+        self.assertEqual(self.analytics.load(), 9)
+        self.assertEqual(self.analytics.load(locationIds = [5]), 1)
+        self.assertEqual(self.analytics.load(locationIds = [2], dateFrom = '2017-05-02', dateTo = '2017-05-03'), 4)
+        self.assertEqual(sorted(set([analytics.dayToDate(x) for x in self.analytics.day])), ['2017-05-02', '2017-05-03'])
+        self.assertEqual(self.analytics.load(locationIds = [1]), 0)
+        self.assertEqual([len(x) for x in self.analytics.turnover()], [0] * 6)
+
+    def testDailyTitles(self):
+        """Tests the number of titles per location and day."""
+        self.analytics.load()
+        locations, days, titles = self.analytics.dailyTitles()
+        self.assertEqual(list(zip(locations.tolist(), [analytics.dayToDate(x) for x in days], titles.tolist())),
+                         [(2, '2017-05-01', 2), (2, '2017-05-02', 2), (2, '2017-05-03', 2), (2, '2017-05-04', 2),
+                          (5, '2017-05-02', 1)])
+
+    def testDiversity(self):
+        """Tests the Shannon and Simpson indices over windows of days."""
+        self.analytics.load(locationIds = [2])
+        locations, days, titles, shannon, simpson = self.analytics.diversity(windowDays = 4)
+
+        # Roma 4 days, Amarcord 2, Otto e mezzo 2
+        shares = [0.5, 0.25, 0.25]
+        self.assertEqual((locations.tolist(), [analytics.dayToDate(x) for x in days], titles.tolist()),
+                         ([2], ['2017-05-01'], [3]))
+        self.assertAlmostEqual(shannon[0], -sum([x * math.log(x) for x in shares]))
+        self.assertAlmostEqual(simpson[0], 1 - sum([x * x for x in shares]))
+
+        # two titles each day, with a share of 1/2 each
+        locations, days, titles, shannon, simpson = self.analytics.diversity(windowDays = 1)
+        self.assertEqual(titles.tolist(), [2, 2, 2, 2])
+        self.assertTrue(numpy.allclose(shannon, math.log(2)))
+        self.assertTrue(numpy.allclose(simpson, 0.5))
+
+    def testTurnover(self):
+        """Tests the titles entering and leaving each day."""
+        self.analytics.load()
+        report = list(zip(*[x.tolist() for x in self.analytics.turnover()]))
+        self.assertEqual([x[:5] for x in report],
+                         [(2, 17288, 17287, 0, 0), (2, 17289, 17288, 1, 1), (2, 17290, 17289, 0, 0)])
+        self.assertEqual([x[5] for x in report], [0.0, 0.5, 0.0])
+
+    def testFormatReport(self):
+        """Tests the output of the reports."""
+        output = io.StringIO()
+        analytics.formatReport(['location', 'titles', 'shannon'], [('Milano', 3, 1.0397207708399179)], output)
+        self.assertEqual(output.getvalue(), "location\ttitles\tshannon\nMilano\t3\t1.0397\n")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
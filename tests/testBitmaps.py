@@ -0,0 +1,122 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import os
+import sys
+import tempfile
+import unittest
+import xmlrunner
+import movieLogger
+
+import tests.utils
+import bitmaps
+import titlesShown
+
+class testBitmaps(unittest.TestCase):
+    """
+    Tests for the bitmaps of the titles shown.
+    """
+    dbDir = None
+    dbFile = None
+    src = None
+    titleIds = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(testBitmaps, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+    def setUp(self):
+        """
+        A db of its own, with four titles shown in Milano (2), München (5) and San Francisco (1):
+            Milano: title 1 2017-05-01 .. 2017-05-04, title 2 2017-05-02, title 3 2017-05-08
+            München: title 1 2017-05-02, title 4 2017-05-03, title 2 2017-05-09
+            San Francisco: title 1 2017-05-01
+        """
+        unittest.TestCase.setUp(self)
+        self.dbDir = tempfile.TemporaryDirectory()
+        self.dbFile = os.path.join(self.dbDir.name, "movies.db")
+        self.src, self.titleIds = tests.utils.Utils.createDb(self.dbFile)
+        self.titleIds.append(self.src.insertTitleInLocation(aTitle = "Paisà", locationId = 5)[0])
+
+        for date in ['2017-05-01', '2017-05-02', '2017-05-03', '2017-05-04']:
+            self.src.insertShow(titlesRef = self.titleIds[0], locationsRef = 2, date = date)
+        self.src.insertShow(titlesRef = self.titleIds[1], locationsRef = 2, date = '2017-05-02')
+        self.src.insertShow(titlesRef = self.titleIds[2], locationsRef = 2, date = '2017-05-08')
+        self.src.insertShowsBatch(titlesRefs = [self.titleIds[0]], locationsRef = 5, date = '2017-05-02')
+        self.src.insertShow(titlesRef = self.titleIds[3], locationsRef = 5, date = '2017-05-03')
+        self.src.insertShow(titlesRef = self.titleIds[1], locationsRef = 5, date = '2017-05-09')
+        self.src.insertShow(titlesRef = self.titleIds[0], locationsRef = 1, date = '2017-05-01')
+
+    def tearDown(self):
+        self.dbDir.cleanup()
+        unittest.TestCase.tearDown(self)
+
+    def _bitmaps(self, **kwargs):
+        """
+        Returns the bitmaps as (locations_ref, date, title ids).
+        """
+        return [(x.locations_ref, x.date, bitmaps.titleIds(x.bitmap)) for x in self.src.iterTitleBitmaps(**kwargs)]
+
+    def testEncode(self):
+        """Tests the compressed bitmaps."""
+        self.assertEqual(bitmaps.titleIds(bitmaps.decode(bitmaps.encode([1000, 3, 9, 3]))), [3, 9, 1000])
+        self.assertEqual(bitmaps.decode(bitmaps.encode([])), 0)
+        self.assertLess(len(bitmaps.encode(range(0, 100000, 10))), 100000 // 8)
+
+    def testBitmaps(self):
+        """Tests the bitmaps maintained on the inserts of the shows, against a rebuild."""
+        milano = self._bitmaps(locationIds = [2])
+        self.assertEqual(milano, [(2, '2017-05-01', [self.titleIds[0]]),
+                                  (2, '2017-05-02', sorted(self.titleIds[:2])),
+                                  (2, '2017-05-03', [self.titleIds[0]]),
+                                  (2, '2017-05-04', [self.titleIds[0]]),
+                                  (2, '2017-05-08', [self.titleIds[2]])])
+        self.assertEqual([x[:2] for x in self._bitmaps(locationIds = [1, 5], dateFrom = '2017-05-02', dateTo = '2017-05-08')],
+                         [(5, '2017-05-02'), (5, '2017-05-03')])
+
+        allBitmaps = self._bitmaps()
+        self.assertEqual(self.src.rebuildAggregates(), 14)
+        self.assertEqual(self._bitmaps(), allBitmaps)
+
+    def testRebuildInBatches(self):
+        """Tests the rebuild of the bitmaps over several batches of inserts."""
+        allBitmaps = self._bitmaps()
+        insertBatch = titlesShown._INSERT_BATCH
+        titlesShown._INSERT_BATCH = 3
+        try:
+            self.assertEqual(self.src.rebuildAggregates(), 14)
+        finally:
+            titlesShown._INSERT_BATCH = insertBatch
+        self.assertEqual(self._bitmaps(), allBitmaps)
+
+    def testOverlap(self):
+        """Tests the comparison of the titles shown in the locations."""
+        rows = bitmaps.overlap(self.src.iterTitleBitmaps(locationIds = [2, 5]))
+        self.assertEqual(rows, [('2017-05-01', 2, 5, 3, 3, 2, 4, 0.5)])
+
+        rows = bitmaps.overlap(self.src.iterTitleBitmaps(locationIds = [2, 5]), 'week')
+        self.assertEqual(rows, [('2017-05-01', 2, 5, 2, 2, 1, 3, 1 / 3), ('2017-05-08', 2, 5, 1, 1, 0, 2, 0.0)])
+
+        # only the days both locations have shows
+        self.assertEqual(bitmaps.overlap(self.src.iterTitleBitmaps(dateFrom = '2017-05-02', dateTo = '2017-05-02'), 'day'),
+                         [('2017-05-02', 2, 5, 2, 1, 1, 2, 0.5)])
+
+        # the pairs with a location
+        self.assertEqual([x[1:3] for x in bitmaps.overlap(self.src.iterTitleBitmaps())], [(1, 2), (1, 5), (2, 5)])
+        self.assertEqual([x[1:3] for x in bitmaps.overlap(self.src.iterTitleBitmaps(), locationId = 5)], [(1, 5), (2, 5)])
+
+    def testPeriodStart(self):
+        """Tests the first days of the periods."""
+        self.assertEqual([bitmaps.periodStart('2017-05-07', x) for x in [None, 'day', 'week', 'month']],
+                         [None, '2017-05-07', '2017-05-01', '2017-05-01'])
+        self.assertRaises(ValueError, bitmaps.periodStart, '2017-05-07', 'year')
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
@@ -0,0 +1,86 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import sys
+import gzip
+import threading
+import unittest
+import xmlrunner
+import movieLogger
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from httpTransport import HttpTransport, TransportError
+
+class _PagesHandler(BaseHTTPRequestHandler):
+    """
+    Serves a small gzipped page on /small and a large one on /large, keeping connections alive.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"<html><body>" + (b"x" * (200000 if self.path == "/large" else 100)) + b"</body></html>"
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class testHttpTransport(unittest.TestCase):
+    """
+    Tests for the pooled http transport, against a local server.
+    """
+    server = None
+    baseUrl = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(testHttpTransport, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+        cls.server = HTTPServer(("127.0.0.1", 0), _PagesHandler)
+        threading.Thread(target = cls.server.serve_forever, daemon = True).start()
+        cls.baseUrl = "http://127.0.0.1:%d" % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(testHttpTransport, cls).tearDownClass()
+
+    def testConnectionsAreReused(self):
+        """Tests that consecutive requests to the same host reuse the same connection."""
+        transport = HttpTransport()
+        for _ in range(3):
+            response = transport.fetch(self.baseUrl + "/small", site = "local")
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.content.endswith(b"</body></html>"), "Body should be decompressed.")
+
+        stats = transport.getStats()
+        self.assertEqual(stats['connectionsOpened'], 1, "Expected a single connection, got %s" % stats)
+        self.assertEqual(stats['connectionsReused'], 2, "Expected two reuses, got %s" % stats)
+        self.assertEqual(stats['sites']['local']['requests'], 3)
+        self.assertTrue(stats['wireBytes'] < stats['bytes'], "Expected compressed transfers, got %s" % stats)
+        transport.close()
+
+    def testMaxBodySize(self):
+        """Tests that bodies larger than the limit are refused."""
+        transport = HttpTransport(maxBodySize = 1000)
+        with self.assertRaises(TransportError):
+            transport.fetch(self.baseUrl + "/large")
+        transport.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
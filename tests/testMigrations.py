@@ -0,0 +1,188 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import closing
+import xmlrunner
+import movieLogger
+
+from utils import dbUtils as db
+import migrations
+import bitmaps
+import sketches
+from migrations import SchemaMigrator, MigrationError
+
+# the schema as it was before the first migration
+_VERSION_0_DDL = """
+CREATE TABLE locations (id integer primary key, name text, language text);
+CREATE TABLE sites (id integer PRIMARY KEY, name text NOT NULL, url text NOT NULL, title_xpath text,
+                    active integer, locations_ref integer, FOREIGN KEY (locations_ref) references locations(id));
+CREATE TABLE titles (id integer PRIMARY KEY, title text NOT NULL);
+CREATE TABLE titles_in_locations (id integer PRIMARY KEY, titles_ref integer NOT NULL, locations_ref integer NOT NULL,
+                                  FOREIGN KEY (titles_ref) references titles(id),
+                                  FOREIGN KEY (locations_ref) references locations(id));
+CREATE TABLE shows (id integer PRIMARY KEY, date text, titles_in_locations_ref integer NOT NULL,
+                    FOREIGN KEY(titles_in_locations_ref) references titles_in_locations(id));
+CREATE TABLE translations (id integer PRIMARY KEY, lang_from text, title_from_ref integer, tmdb_id integer,
+                           FOREIGN KEY(title_from_ref) references titles(id));
+INSERT INTO locations VALUES (1, 'Milano', 'it');
+INSERT INTO titles VALUES (1, 'Roma');
+INSERT INTO titles_in_locations VALUES (1, 1, 1);
+INSERT INTO titles_in_locations VALUES (2, 1, 1);
+INSERT INTO shows VALUES (1, '2017-05-05', 1);
+INSERT INTO shows VALUES (2, '2017-05-05', 2);
+INSERT INTO shows VALUES (3, '2017-05-06', 2);
+"""
+
+class testMigrations(unittest.TestCase):
+    """
+    Tests for the migrations of the db schema.
+    """
+    dbDir = None
+    dbFile = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(testMigrations, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.dbDir = tempfile.TemporaryDirectory()
+        self.dbFile = os.path.join(self.dbDir.name, "movies.db")
+
+    def tearDown(self):
+        self.dbDir.cleanup()
+        unittest.TestCase.tearDown(self)
+
+    def _query(self, qry = "", params = ()):
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            return [tuple(x) for x in conn.execute(qry, params).fetchall()]
+
+    def testMigrateOldDb(self):
+        """Tests bringing a db created before the migrations to the latest version."""
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            conn.executescript(_VERSION_0_DDL)
+
+        migrator = SchemaMigrator(dbfile = self.dbFile)
+        self.assertEqual(migrator.getVersion(), 0)
+        self.assertEqual(len(migrator.getPendingMigrations()), migrator.getLatestVersion())
+
+        self.assertEqual(migrator.migrate(), migrator.getLatestVersion())
+        self.assertEqual(migrator.getPendingMigrations(), [])
+        migrator.close()
+
+        indexes = [x[0] for x in self._query("SELECT name FROM sqlite_master WHERE type = 'index';")]
+        for index in ['titles_in_locations_unique', 'titles_in_locations_locations', 'shows_daily_unique',
+                      'shows_daily_date', 'translations_title_from', 'title_aliases_raw_title',
+                      'show_runs_unique', 'show_runs_last_date', 'show_runs_dates',
+                      'daily_stats_unique', 'period_stats_unique', 'aggregate_watermarks_name',
+                      'titles_in_locations_first_show', 'titles_in_locations_last_show', 'title_bitmaps_unique',
+                      'title_sketches_unique']:
+            self.assertIn(index, indexes)
+        self.assertIn(('sqlite_stat1',), self._query("SELECT name FROM sqlite_master WHERE type = 'table';"))
+        self.assertEqual(self._query("SELECT name FROM sqlite_master WHERE type = 'view' ORDER BY name;"),
+                         [('daily_shows',), ('shows',)])
+
+        # the duplicated titles_in_locations are merged, and so are their shows
+        self.assertEqual(self._query("SELECT id, first_show, last_show, show_count FROM titles_in_locations;"),
+                         [(1, '2017-05-05', '2017-05-06', 2)])
+        self.assertEqual(self._query("SELECT id, date, titles_in_locations_ref FROM shows_daily ORDER BY id;"),
+                         [(1, '2017-05-05', 1), (3, '2017-05-06', 1)])
+        self.assertEqual(self._query("SELECT id, date, titles_in_locations_ref FROM shows ORDER BY id;"),
+                         [(1, '2017-05-05', 1), (3, '2017-05-06', 1)])
+
+        # and aggregated, up to the last of them
+        self.assertEqual(self._query("SELECT date, titles, new_titles, departed_titles FROM daily_stats ORDER BY date;"),
+                         [('2017-05-05', 1, 1, 0), ('2017-05-06', 1, 0, 0), ('2017-05-07', 0, 0, 1)])
+        self.assertEqual(self._query("SELECT last_id FROM aggregate_watermarks WHERE name = 'shows';"), [(3,)])
+        self.assertEqual([(x[0], bitmaps.titleIds(bitmaps.decode(x[1])))
+                          for x in self._query("SELECT date, bitmap FROM title_bitmaps ORDER BY date;")],
+                         [('2017-05-05', [1]), ('2017-05-06', [1])])
+        self.assertEqual(self._query("SELECT date, sketch FROM title_sketches ORDER BY date;"),
+                         [('2017-05-05', sketches.encode([1])), ('2017-05-06', sketches.encode([1]))])
+
+    def testRebuildAfterMigrations(self):
+        """Tests that the data derived from the shows is rebuilt once the db is migrated far enough."""
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            conn.executescript(_VERSION_0_DDL)
+
+        # the rebuild waits for the daily shows to be in shows_daily
+        migrator = SchemaMigrator(dbfile = self.dbFile)
+        self.assertEqual(migrator.migrate(targetVersion = migrations.AGGREGATES_VERSION), migrations.AGGREGATES_VERSION)
+        self.assertEqual(self._query("SELECT count(*) FROM daily_stats;"), [(0,)])
+        self.assertEqual(self._query("SELECT name FROM aggregate_watermarks;"), [(migrations.REBUILD_MARKER,)])
+        self.assertFalse(migrator.rebuild(), "Nothing should be rebuilt before version %d." % migrations.SHOWS_DAILY_VERSION)
+
+        self.assertEqual(migrator._applyMigrations(), migrator.getLatestVersion())
+        self.assertEqual(self._query("SELECT count(*) FROM title_bitmaps;"), [(0,)])
+        self.assertTrue(migrator.rebuild())
+        self.assertEqual(self._query("SELECT date, titles FROM daily_stats ORDER BY date;"),
+                         [('2017-05-05', 1), ('2017-05-06', 1), ('2017-05-07', 0)])
+        self.assertEqual(self._query("SELECT name FROM aggregate_watermarks;"), [('shows',)])
+        self.assertEqual(self._query("SELECT count(*) FROM title_bitmaps;"), [(2,)])
+        self.assertEqual(self._query("SELECT id, first_show, last_show, show_count FROM titles_in_locations;"),
+                         [(1, '2017-05-05', '2017-05-06', 2)])
+        self.assertFalse(migrator.rebuild(), "Nothing should be left to rebuild.")
+        migrator.close()
+
+    def testScriptIsLatestVersion(self):
+        """Tests that a db created by movieDiversity.sql needs no migration."""
+        scriptFile = os.path.join(os.path.dirname(os.path.abspath(migrations.__file__)), "movieDiversity.sql")
+        with closing(db.connect(dbfile = self.dbFile)) as conn, open(scriptFile, encoding = "utf-8") as fp:
+            conn.executescript(fp.read())
+
+        migrator = SchemaMigrator(dbfile = self.dbFile)
+        self.assertEqual(migrator.getVersion(), migrator.getLatestVersion(),
+                         "movieDiversity.sql should be stamped with the latest version.")
+        self.assertEqual(migrator.getPendingMigrations(), [])
+        migrator.close()
+
+        # and its schema is the same the migrations build
+        scriptSchema = self._query("SELECT type, name FROM sqlite_master ORDER BY name;")
+        os.remove(self.dbFile)
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            conn.executescript(_VERSION_0_DDL)
+        migrator = SchemaMigrator(dbfile = self.dbFile)
+        migrator.migrate()
+        migrator.close()
+        migratedSchema = self._query("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite%' ORDER BY name;")
+        self.assertEqual(scriptSchema, migratedSchema)
+
+    def testFailedMigration(self):
+        """Tests that a failing migration leaves the db at the previous version."""
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            conn.executescript(_VERSION_0_DDL)
+
+        def failing(cur):
+            cur.execute("CREATE TABLE half_done (id integer);")
+            raise RuntimeError("boom")
+
+        migrator = SchemaMigrator(dbfile = self.dbFile)
+        migrator._migrations = migrator._migrations[:2] + [(3, "failing", failing)]
+
+        with self.assertRaises(MigrationError):
+            migrator.migrate()
+        self.assertEqual(migrator.getVersion(), 2)
+        self.assertEqual(self._query("SELECT name FROM sqlite_master WHERE name = 'half_done';"), [])
+        migrator.close()
+
+    def testEmptyDb(self):
+        """Tests that an empty db is left alone."""
+        migrator = SchemaMigrator(dbfile = self.dbFile)
+        self.assertEqual(migrator.migrate(), 0)
+        migrator.close()
+
+        self.assertEqual(self._query("SELECT name FROM sqlite_master;"), [])
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
@@ -20,7 +20,15 @@ from movieDbClasses import Sites
 from movieDbClasses import Titles
 from movieDbClasses import TitlesInLocations
 from movieDbClasses import Shows
+from movieDbClasses import ShowsDaily
+from movieDbClasses import ShowRuns
+from movieDbClasses import DailyStats
+from movieDbClasses import PeriodStats
+from movieDbClasses import AggregateWatermarks
+from movieDbClasses import TitleBitmaps
+from movieDbClasses import TitleSketches
 from movieDbClasses import Translations
+from movieDbClasses import TitleAliases
 from movieDbClasses import SQLite_Master
 
 class testMovieDbClasses(unittest.TestCase):
@@ -43,7 +51,15 @@ class testMovieDbClasses(unittest.TestCase):
             Titles,
             TitlesInLocations,
             Shows,
+            ShowsDaily,
+            ShowRuns,
+            DailyStats,
+            PeriodStats,
+            AggregateWatermarks,
+            TitleBitmaps,
+            TitleSketches,
             Translations,
+            TitleAliases,
             SQLite_Master
         ]
 
@@ -60,6 +76,9 @@ class testMovieDbClasses(unittest.TestCase):
                 "title_xpath",
                 "active",
                 "locations_ref",
+                "page_param",
+                "next_page_xpath",
+                "max_pages",
                 ],
             "Titles": [
                 "id",
@@ -69,18 +88,74 @@ class testMovieDbClasses(unittest.TestCase):
                  "id",
                  "titles_ref",
                  "locations_ref",
+                 "first_show",
+                 "last_show",
+                 "show_count",
                  ],
             "Shows": [
                 "id",
                 "date",
                 "titles_in_locations_ref",
                ],
+            "ShowsDaily": [
+                "id",
+                "date",
+                "titles_in_locations_ref",
+               ],
+            "ShowRuns": [
+                "id",
+                "titles_in_locations_ref",
+                "first_date",
+                "last_date",
+               ],
+            "DailyStats": [
+                "id",
+                "locations_ref",
+                "date",
+                "titles",
+                "new_titles",
+                "departed_titles",
+               ],
+            "PeriodStats": [
+                "id",
+                "locations_ref",
+                "period",
+                "start_date",
+                "titles",
+                "title_days",
+                "new_titles",
+                "departed_titles",
+               ],
+            "AggregateWatermarks": [
+                "id",
+                "name",
+                "last_id",
+               ],
+            "TitleBitmaps": [
+                "id",
+                "locations_ref",
+                "date",
+                "bitmap",
+               ],
+            "TitleSketches": [
+                "id",
+                "locations_ref",
+                "date",
+                "sketch",
+               ],
             "Translations": [
                 "id",
                 "lang_from",
                 "title_from_ref",
                 "tmdb_id",
                 ],
+            "TitleAliases": [
+                "id",
+                "raw_title",
+                "locations_ref",
+                "titles_ref",
+                "titles_in_locations_ref",
+                ],
             "SQLite_Master": [
                 "type",
                 "name",
@@ -0,0 +1,123 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import os
+import sys
+import sqlite3
+import datetime
+import tempfile
+import unittest
+from contextlib import closing
+import xmlrunner
+import movieLogger
+
+from pageArchive import PageArchive, ReplayTransport
+from httpTransport import TransportError
+
+class testPageArchive(unittest.TestCase):
+    """
+    Tests for the record-and-replay page archive.
+    """
+    archiveDir = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(testPageArchive, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.archiveDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.archiveDir.cleanup()
+        unittest.TestCase.tearDown(self)
+
+    def testRecordAndRead(self):
+        """Tests archiving pages and reading them back, including revisits."""
+        archive = PageArchive(archiveDir = self.archiveDir.name)
+        archive.record(siteId = 2, url = "http://example.com/a", status = 200,
+                       headers = {'ETag': '"v1"', 'Content-Type': 'text/html'}, body = b"<html>A1</html>")
+        archive.record(siteId = 2, url = "http://example.com/b", status = 200, headers = {}, body = b"<html>B</html>")
+        archive.record(siteId = 2, url = "http://example.com/a", status = 304, headers = {'ETag': '"v1"'})
+
+        entry = archive.find(url = "http://example.com/a")
+        self.assertEqual(entry['record_type'], 'revisit')
+        self.assertEqual(entry['site_id'], 2)
+
+        status, headers, body = archive.read(entry)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['ETag'], '"v1"')
+        self.assertEqual(body, b"<html>A1</html>")
+
+        self.assertEqual(archive.read(archive.find(url = "http://example.com/b"))[2], b"<html>B</html>")
+        self.assertIsNone(archive.find(url = "http://example.com/c"))
+
+        # a page not modified, with no full copy to point to, is not archived
+        self.assertIsNone(archive.record(siteId = 2, url = "http://example.com/d", status = 304, headers = {}))
+        self.assertIsNone(archive.find(url = "http://example.com/d"))
+        self.assertEqual(archive.find(url = "http://example.com/a", recordType = 'response')['record_type'], 'response')
+
+        yesterday = (datetime.date.today() - datetime.timedelta(days = 1)).strftime('%Y-%m-%d')
+        self.assertIsNone(archive.find(url = "http://example.com/a", date = yesterday),
+                          "Nothing was archived before today.")
+
+        # a body spooled to a file is copied in chunks
+        with tempfile.TemporaryFile() as fp:
+            fp.write(b"<html>" + b"C" * 300000 + b"</html>")
+            fp.seek(0)
+            archive.record(siteId = 2, url = "http://example.com/c", status = 200, headers = {}, body = fp)
+        self.assertEqual(archive.read(archive.find(url = "http://example.com/c"))[2], b"<html>" + b"C" * 300000 + b"</html>")
+        self.assertEqual(archive.read(archive.find(url = "http://example.com/b"))[2], b"<html>B</html>")
+        archive.close()
+
+    def testReplayTransport(self):
+        """Tests serving the archived pages through the transport interface."""
+        archive = PageArchive(archiveDir = self.archiveDir.name)
+        archive.record(siteId = 1, url = "http://example.com/", status = 200, headers = {}, body = b"x" * 200000)
+        archive.close()
+
+        transport = ReplayTransport(archive = PageArchive(archiveDir = self.archiveDir.name))
+        with transport.stream(url = "http://example.com/") as page:
+            self.assertEqual(page.status_code, 200)
+            self.assertEqual(b"".join(page.iterContent()), b"x" * 200000)
+            self.assertEqual(page.bytesRead, 200000)
+
+        with self.assertRaises(TransportError):
+            transport.fetch(url = "http://example.com/missing")
+        transport.close()
+
+    def testReplayDate(self):
+        """Tests that only the pages fetched on the day replayed are served."""
+        archive = PageArchive(archiveDir = self.archiveDir.name)
+        archive.record(siteId = 1, url = "http://example.com/a", status = 200, headers = {}, body = b"A")
+        archive.record(siteId = 2, url = "http://example.com/b", status = 200, headers = {}, body = b"B")
+        archive.close()
+
+        # the copy of page a was fetched the day before
+        yesterday = (datetime.date.today() - datetime.timedelta(days = 1)).strftime('%Y-%m-%d')
+        with closing(sqlite3.connect(os.path.join(self.archiveDir.name, PageArchive._INDEX_FILE))) as conn:
+            conn.execute("UPDATE records SET scrape_date = ? WHERE url = 'http://example.com/a';", (yesterday,))
+            conn.commit()
+
+        transport = ReplayTransport(archive = PageArchive(archiveDir = self.archiveDir.name))
+        self.assertEqual(transport.getDate(), datetime.date.today().strftime('%Y-%m-%d'))
+        self.assertEqual(transport.fetch(url = "http://example.com/b").content, b"B")
+        with self.assertRaises(TransportError):
+            transport.fetch(url = "http://example.com/a")
+        transport.close()
+
+        transport = ReplayTransport(archive = PageArchive(archiveDir = self.archiveDir.name), date = yesterday)
+        self.assertEqual(transport.fetch(url = "http://example.com/a").content, b"A")
+        with self.assertRaises(TransportError):
+            transport.fetch(url = "http://example.com/b")
+        transport.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
@@ -0,0 +1,73 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import sys
+import time
+import tempfile
+import unittest
+import xmlrunner
+import movieLogger
+
+from pageCache import PageCache
+
+class testPageCache(unittest.TestCase):
+    """
+    Tests for the on-disk page cache.
+    """
+    cacheDir = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(testPageCache, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.cacheDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cacheDir.cleanup()
+        unittest.TestCase.tearDown(self)
+
+    def testPutAndGet(self):
+        """Tests storing a page and reading it back, with its conditional headers."""
+        cache = PageCache(cacheFile = self.cacheDir.name + "/pages.cache")
+
+        self.assertIsNone(cache.get(1, "http://example.com/"), "Empty cache should return None.")
+
+        cache.put(1, "http://example.com/", etag = '"abc"', lastModified = "Wed, 21 Oct 2015 07:28:00 GMT",
+                  contentHash = "123", titleXpath = "//a/text()", titles = {"Roma", "Amarcord"})
+        entry = cache.get(1, "http://example.com/")
+        self.assertEqual(entry['titles'], {"Roma", "Amarcord"})
+        self.assertEqual(entry['content_hash'], "123")
+        self.assertEqual(cache.conditionalHeaders(entry),
+                         {'If-None-Match': '"abc"', 'If-Modified-Since': "Wed, 21 Oct 2015 07:28:00 GMT"})
+
+        self.assertIsNone(cache.get(2, "http://example.com/"), "Entries are per site.")
+        cache.close()
+
+    def testLRUEviction(self):
+        """Tests that the least recently used pages are evicted first."""
+        cache = PageCache(cacheFile = self.cacheDir.name + "/pages.cache", maxEntries = 2)
+
+        cache.put(1, "a", titles = {"A"})
+        time.sleep(0.01)
+        cache.put(1, "b", titles = {"B"})
+        time.sleep(0.01)
+        cache.touch(1, "a")
+        time.sleep(0.01)
+        cache.put(1, "c", titles = {"C"})
+
+        self.assertIsNotNone(cache.get(1, "a"), "Recently used page should be kept.")
+        self.assertIsNone(cache.get(1, "b"), "Least recently used page should be evicted.")
+        self.assertIsNotNone(cache.get(1, "c"), "Newest page should be kept.")
+        cache.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
@@ -3,16 +3,66 @@ Created on May 6, 2017
 
 @author: Guido
 '''
+import os
 import sys
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
 import unittest
 import xmlrunner
 import scraper
 
+class _FakeResponse(object):
+    """
+    A page served by _FakeTransport, with the interface of httpTransport.TransportResponse.
+    """
+    bytesRead = 0
+
+    def __init__(self, status = 200, headers = None, body = b""):
+        self.status_code = status
+        self.headers = headers if headers is not None else {}
+        self._body = body
+
+    def iterContent(self):
+        self.bytesRead = len(self._body)
+        if len(self._body) > 0:
+            yield self._body
+
+class _FakeTransport(object):
+    """
+    Transport serving the given responses in turn, remembering the headers of the requests.
+    """
+
+    def __init__(self, responses = None):
+        self.responses = list(responses)
+        self.requests = []
+
+    @contextmanager
+    def stream(self, url = "", headers = None, site = None):
+        self.requests.append(headers)
+        yield self.responses.pop(0)
+
+class _ConditionalTransport(_FakeTransport):
+    """
+    Transport serving always the same page, or a 304 to the conditional requests.
+    """
+
+    def __init__(self, body = b""):
+        _FakeTransport.__init__(self, [])
+        self.body = body
+
+    @contextmanager
+    def stream(self, url = "", headers = None, site = None):
+        self.requests.append(headers)
+        if headers is not None and headers.get('If-None-Match') == '"v1"':
+            yield _FakeResponse(304, {'ETag': '"v1"'})
+        else:
+            yield _FakeResponse(200, {'ETag': '"v1"'}, self.body)
+
 class testScraper(unittest.TestCase):
     """
     Test for the scraper class.
-
-    Currently does nothing.
     """
 
     src = None
@@ -20,9 +70,20 @@ class testScraper(unittest.TestCase):
 
     _dbName = '/home/guido/work/git/movie-diversity/wirkingDb.db'
 
+    # fake sites for a location, all served by the fake fetcher below
+    _sites = [{'id': 1, 'name': 'one', 'url': 'http://one.example.com/a', 'title_xpath': '', 'active': 1},
+              {'id': 2, 'name': 'two', 'url': 'http://two.example.com/a', 'title_xpath': '', 'active': 1},
+              {'id': 3, 'name': 'three', 'url': 'http://two.example.com/b', 'title_xpath': '', 'active': 1},
+              {'id': 4, 'name': 'four', 'url': 'http://four.example.com/a', 'title_xpath': '', 'active': 0}]
+
+    _titles = {'http://one.example.com/a': {'Amarcord', 'La dolce vita'},
+               'http://two.example.com/a': {'Roma', 'Amarcord'},
+               'http://two.example.com/b': {'Otto e mezzo'},
+               'http://four.example.com/a': {'Never fetched'}}
+
     def setUp(self):
         unittest.TestCase.setUp(self)
-        self.scraper = scraper.Scraper(dbfile = self._dbName)
+        self.scraper = scraper.Scraper(dbfile = self._dbName, maxWorkers = 3, maxPerHost = 1)
 
     def testGetMovieTitles(self):
         """
@@ -31,10 +92,153 @@ class testScraper(unittest.TestCase):
         pass
         # self.fail("testGetMovieTitles has not been implemented yet!")
 
+    def testGetMoviesTitlesInLocationConcurrently(self):
+        """Tests that all active sites are fetched and merged, respecting the per-host limit."""
+        lock = threading.Lock()
+        running = {}
+        maxRunning = {}
+
+        def fakeFetch(url = "", title_xpath = "", siteName = None, siteId = None):
+            host = url.split('/')[2]
+            with lock:
+                running[host] = running.get(host, 0) + 1
+                maxRunning[host] = max(maxRunning.get(host, 0), running[host])
+            time.sleep(0.05)
+            with lock:
+                running[host] -= 1
+            return self._titles[url]
+
+        self.scraper._source.getLocationSitesData = lambda locationName: self._sites
+        self.scraper.getMoviesTitlesFromURL = fakeFetch
+
+        titles = self.scraper.getMoviesTitlesInLocation("Roma")
+
+        self.assertEqual(titles, {'Amarcord', 'La dolce vita', 'Roma', 'Otto e mezzo'})
+        self.assertNotIn('four.example.com', maxRunning, "Inactive sites should not be fetched.")
+        self.assertEqual(maxRunning['two.example.com'], 1, "At most one request per host expected.")
+
+    def testMaxWorkersOverLocations(self):
+        """Tests that the locations fetched in parallel share the limit on the requests in flight."""
+        lock = threading.Lock()
+        running = [0]
+        maxRunning = [0]
+
+        def fakeFetch(url = "", title_xpath = "", siteName = None, siteId = None):
+            with lock:
+                running[0] += 1
+                maxRunning[0] = max(maxRunning[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return {url}
+
+        self.scraper.getMoviesTitlesFromURL = fakeFetch
+
+        # two locations of three sites each, all on different hosts
+        locations = [[{'id': 10 * x + y, 'name': str(10 * x + y), 'url': 'http://site%d.example.com/' % (10 * x + y),
+                       'title_xpath': '', 'active': 1} for y in range(3)] for x in range(2)]
+        threads = [threading.Thread(target = self.scraper.getMoviesTitlesInLocation, kwargs = {'sites': x}) for x in locations]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(maxRunning[0], 3, "At most maxWorkers requests in flight expected.")
+
+    def testPageCacheStats(self):
+        """Tests that only the pages actually parsed count as misses of the page cache."""
+        page = b"<html><body><ul><li>Roma</li><li>Amarcord</li></ul></body></html>"
+        transport = _FakeTransport([_FakeResponse(200, {'ETag': '"v1"'}, page),
+                                    _FakeResponse(304, {'ETag': '"v1"'}),
+                                    _FakeResponse(200, {'ETag': '"v2"'}, page)])
+
+        with tempfile.TemporaryDirectory() as tmpDir:
+            cachingScraper = scraper.Scraper(dbfile = self._dbName, pageCacheFile = os.path.join(tmpDir, "pages.cache"))
+            cachingScraper._transport = transport
+            extractAll = cachingScraper._extractor.extractAll
+            parsed = []
+            def countingExtractAll(chunks = None, xpaths = None):
+                parsed.append(xpaths)
+                return extractAll(chunks = chunks, xpaths = xpaths)
+            cachingScraper._extractor.extractAll = countingExtractAll
+
+            for _ in range(3):
+                self.assertEqual(cachingScraper.getMoviesTitlesFromURL(url = "http://one.example.com/a", title_xpath = "//li/text()",
+                                                                       siteName = "one", siteId = 1),
+                                 {'Roma', 'Amarcord'})
+            cachingScraper._pageCache.close()
+
+        self.assertEqual(transport.requests[1], {'If-None-Match': '"v1"'})
+        self.assertEqual(len(parsed), 1, "The page should be parsed only once.")
+        self.assertEqual((cachingScraper._pageCache.hits, cachingScraper._pageCache.misses), (2, 1))
+
+    def testArchiveWithPageCache(self):
+        """Tests that a page already in the page cache is archived in full, and then replayed."""
+        page = b"<html><body><ul><li>Roma</li><li>Amarcord</li></ul></body></html>"
+        transport = _ConditionalTransport(page)
+
+        with tempfile.TemporaryDirectory() as tmpDir:
+            cacheFile = os.path.join(tmpDir, "pages.cache")
+            archiveDir = os.path.join(tmpDir, "archive")
+            fetchArgs = {'url': "http://one.example.com/a", 'title_xpath': "//li/text()", 'siteName': "one", 'siteId': 1}
+
+            # the page cache is warm before the archive is
+            cachingScraper = scraper.Scraper(dbfile = self._dbName, pageCacheFile = cacheFile)
+            cachingScraper._transport = transport
+            self.assertEqual(cachingScraper.getMoviesTitlesFromURL(**fetchArgs), {'Roma', 'Amarcord'})
+            cachingScraper._pageCache.close()
+
+            archivingScraper = scraper.Scraper(dbfile = self._dbName, pageCacheFile = cacheFile, archiveDir = archiveDir)
+            archivingScraper._transport = transport
+            self.assertEqual(archivingScraper.getMoviesTitlesFromURL(**fetchArgs), {'Roma', 'Amarcord'})
+            self.assertIsNone(transport.requests[-1], "The first copy should be fetched unconditionally.")
+            # once archived, the page is fetched conditionally again
+            self.assertEqual(archivingScraper.getMoviesTitlesFromURL(**fetchArgs), {'Roma', 'Amarcord'})
+            self.assertEqual(transport.requests[-1], {'If-None-Match': '"v1"'})
+            archivingScraper._pageCache.close()
+            archivingScraper._archive.close()
+
+            replayingScraper = scraper.Scraper(dbfile = self._dbName, replayDir = archiveDir)
+            self.assertEqual(replayingScraper.getMoviesTitlesFromURL(**fetchArgs), {'Roma', 'Amarcord'})
+            replayingScraper._transport.close()
+
+    def testGetPaginatedTitles(self):
+        """Tests that all the pages of a paginated listing are fetched and merged."""
+        pages = {'http://one.example.com/a?page=1': ({'Amarcord'}, ['/a?page=2', '/a?page=3']),
+                 'http://one.example.com/a?page=2': ({'Roma'}, ['/a?page=1', '/a?page=3', '/a?page=4']),
+                 'http://one.example.com/a?page=3': ({'Otto e mezzo', 'Roma'}, ['/a?page=4']),
+                 'http://one.example.com/a?page=4': ({'La dolce vita'}, []),
+                 'http://one.example.com/a?page=5': ({'Amarcord'}, [])}
+        fetched = []
+
+        def fakePage(url = "", title_xpath = "", next_page_xpath = None, siteName = None, siteId = None):
+            fetched.append(url)
+            return pages[url]
+
+        self.scraper._getPageData = fakePage
+
+        # following the links to the other pages
+        site = {'id': 1, 'name': 'one', 'url': 'http://one.example.com/a?page=1', 'title_xpath': '', 'active': 1,
+                'page_param': None, 'next_page_xpath': '//a/@href', 'max_pages': None}
+        self.assertEqual(self.scraper._getSiteTitles(site), {'Amarcord', 'Roma', 'Otto e mezzo', 'La dolce vita'})
+        self.assertEqual(sorted(fetched), sorted(list(pages.keys())[:4]), "Each page should be fetched once.")
+
+        # numbering the pages, up to max_pages
+        del fetched[:]
+        site.update({'page_param': 'page', 'next_page_xpath': None, 'max_pages': 3})
+        self.assertEqual(self.scraper._getSiteTitles(site), {'Amarcord', 'Roma', 'Otto e mezzo'})
+        self.assertEqual(sorted(fetched), sorted(list(pages.keys())[:3]))
+
+        # numbering the pages, until one brings nothing new
+        del fetched[:]
+        site['max_pages'] = 10
+        self.assertEqual(self.scraper._getSiteTitles(site), {'Amarcord', 'Roma', 'Otto e mezzo', 'La dolce vita'})
+        self.assertNotIn('http://one.example.com/a?page=6', fetched, "Should stop after a page with no new titles.")
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testSource']
     if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
         unittest.main()
     else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
         unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
-
@@ -0,0 +1,115 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import closing
+import xmlrunner
+import movieLogger
+
+from utils import dbUtils as db
+import tests.utils
+import sketches
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class testSketches(unittest.TestCase):
+    """
+    Tests for the sketches of the titles shown.
+    """
+    dbDir = None
+    dbFile = None
+    src = None
+    titleIds = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(testSketches, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+    def setUp(self):
+        """
+        A db of its own, with three titles shown in Milano (2) and München (5):
+            Milano: title 1 2017-05-01 .. 2017-05-04, title 2 2017-05-02, title 3 2017-05-08
+            München: title 1 2017-05-02, title 2 2017-05-09, as a daily show written by an older version
+        """
+        unittest.TestCase.setUp(self)
+        self.dbDir = tempfile.TemporaryDirectory()
+        self.dbFile = os.path.join(self.dbDir.name, "movies.db")
+        self.src, self.titleIds = tests.utils.Utils.createDb(self.dbFile)
+
+        for date in ['2017-05-01', '2017-05-02', '2017-05-03', '2017-05-04']:
+            self.src.insertShow(titlesRef = self.titleIds[0], locationsRef = 2, date = date)
+        self.src.insertShow(titlesRef = self.titleIds[1], locationsRef = 2, date = '2017-05-02')
+        self.src.insertShowsBatch(titlesRefs = [self.titleIds[2]], locationsRef = 2, date = '2017-05-08')
+        self.src.insertShow(titlesRef = self.titleIds[0], locationsRef = 5, date = '2017-05-02')
+
+        with closing(db.connect(dbfile = self.dbFile)) as conn:
+            conn.execute("INSERT INTO titles_in_locations (titles_ref, locations_ref) VALUES (?, 5);", (self.titleIds[1],))
+            conn.execute("INSERT INTO shows (date, titles_in_locations_ref) VALUES ('2017-05-09', last_insert_rowid());")
+            conn.commit()
+
+    def tearDown(self):
+        self.dbDir.cleanup()
+        unittest.TestCase.tearDown(self)
+
+    def _estimate(self, *args):
+        """
+        Returns the estimate of the distinct titles from the sketches read with the given arguments.
+        """
+        return sketches.estimate(sketches.merge(x.sketch for x in self.src.iterTitleSketches(*args)))
+
+    def testSketches(self):
+        """Tests the sketches maintained on the inserts of the shows, against a rebuild."""
+        self.assertEqual([(x.locations_ref, x.date) for x in self.src.iterTitleSketches([2], '2017-05-02', '2017-05-08')],
+                         [(2, '2017-05-02'), (2, '2017-05-03'), (2, '2017-05-04'), (2, '2017-05-08')])
+        self.assertEqual([x.sketch for x in self.src.iterTitleSketches([2], '2017-05-02', '2017-05-02')],
+                         [sketches.decode(sketches.encode(self.titleIds[:2]))])
+
+        # the daily shows are there once caught up
+        self.assertEqual(list(self.src.iterTitleSketches([5], '2017-05-09')), [])
+        self.src.catchUpAggregates()
+        self.assertEqual([x.date for x in self.src.iterTitleSketches([5])], ['2017-05-02', '2017-05-09'])
+
+        allSketches = list(self.src.iterTitleSketches())
+        self.src.rebuildAggregates()
+        self.assertEqual(list(self.src.iterTitleSketches()), allSketches)
+
+    def testCountDistinctTitles(self):
+        """Tests the exact counts of the distinct titles, from the runs and the daily shows."""
+        self.assertEqual(self.src.countDistinctTitles(), 3)
+        self.assertEqual(self.src.countDistinctTitles([5]), 2)
+        self.assertEqual(self.src.countDistinctTitles([5], '2017-05-03'), 1)
+        self.assertEqual(self.src.countDistinctTitles([2], '2017-05-03', '2017-05-07'), 1)
+        self.assertEqual(self.src.countDistinctTitles([1, 2], '2017-05-09', '2017-05-31'), 0)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testEstimate(self):
+        """Tests the estimates of the distinct titles from the sketches."""
+        self.src.catchUpAggregates()
+        for args in [(), ([5],), ([5], '2017-05-03'), ([2], '2017-05-03', '2017-05-07'), ([1, 2], '2017-05-09', '2017-05-31')]:
+            self.assertEqual(self._estimate(*args), self.src.countDistinctTitles(*args), "Wrong estimate for %s" % (args,))
+
+        # a standard error of about 1.6%
+        for count in [1000, 20000, 200000]:
+            estimate = sketches.estimate(sketches.decode(sketches.encode(range(count))))
+            self.assertLess(abs(estimate - count) / count, 0.05, "Estimate %d of %d titles" % (estimate, count))
+
+        union = sketches.merge([sketches.decode(sketches.encode(range(0, 20000))),
+                                sketches.decode(sketches.encode(range(10000, 30000)))])
+        self.assertLess(abs(sketches.estimate(union) - 30000) / 30000, 0.05)
+        self.assertEqual(sketches.estimate(sketches.merge([])), 0)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
@@ -3,19 +3,25 @@ Created on May 6, 2017
 
 @author: Guido
 '''
+import os
 import sys
+import time
+import sqlite3
+import tempfile
 import unittest
 from contextlib import closing
 import datetime
 import xmlrunner
 from sqlalchemy.exc import IntegrityError
 import sqlalchemy
+import sqlalchemy.dialects.sqlite
 
 from utils import dbUtils as db
 import movieLogger
 import tests.utils
 
 import sources
+import migrations
 from movieDbClasses import Locations
 from movieDbClasses import SQLite_Master
 
@@ -41,7 +47,10 @@ class testSource(unittest.TestCase):
                     "url text",
                     "title_xpath text",
                     "active integer",
-                    "locations_ref integer"],
+                    "locations_ref integer",
+                    "page_param text",
+                    "next_page_xpath text",
+                    "max_pages integer"],
                    'titles':
                    ["id integer primary key",
                     "title text",
@@ -50,17 +59,68 @@ class testSource(unittest.TestCase):
                    ["id integer primary key",
                     "titles_ref integer",
                     "locations_ref integer",
+                    "first_show text",
+                    "last_show text",
+                    "show_count integer not null default 0",
                    ],
-                   'shows':
+                   'shows_daily':
                    ["id integer primary key",
                     "date text",
                     "titles_in_locations_ref integer"
                    ],
+                   'show_runs':
+                   ["id integer primary key",
+                    "titles_in_locations_ref integer not null",
+                    "first_date text not null",
+                    "last_date text not null"
+                   ],
+                   'daily_stats':
+                   ["id integer primary key",
+                    "locations_ref integer not null",
+                    "date text not null",
+                    "titles integer not null",
+                    "new_titles integer not null",
+                    "departed_titles integer not null"
+                   ],
+                   'period_stats':
+                   ["id integer primary key",
+                    "locations_ref integer not null",
+                    "period text not null",
+                    "start_date text not null",
+                    "titles integer not null",
+                    "title_days integer not null",
+                    "new_titles integer not null",
+                    "departed_titles integer not null"
+                   ],
+                   'aggregate_watermarks':
+                   ["id integer primary key",
+                    "name text not null",
+                    "last_id integer not null"
+                   ],
+                   'title_bitmaps':
+                   ["id integer primary key",
+                    "locations_ref integer not null",
+                    "date text not null",
+                    "bitmap blob not null"
+                   ],
+                   'title_sketches':
+                   ["id integer primary key",
+                    "locations_ref integer not null",
+                    "date text not null",
+                    "sketch blob not null"
+                   ],
                    'translations':
                    ["id integer primary key",
                     "lang_from text",
                     "title_from_ref integer",
                     "tmdb_id integer"
+                   ],
+                   'title_aliases':
+                   ["id integer primary key",
+                    "raw_title text not null",
+                    "locations_ref integer not null",
+                    "titles_ref integer not null",
+                    "titles_in_locations_ref integer not null"
                    ]
                   }
 
@@ -92,8 +152,9 @@ class testSource(unittest.TestCase):
 
         allTables = self.src.getAllTablesDefinitions()
 
-        assert len(allTables) == 6, \
-            "%s file should have 6 tables defined (found %d)." % (self._dbName, len(allTables))
+        assert len([x for x in allTables if x.sql.lower().startswith("create table")]) == 13, \
+            "%s file should have 13 tables defined (found %d)." % \
+            (self._dbName, len([x for x in allTables if x.sql.lower().startswith("create table")]))
 
         assert isinstance(allTables, type([])), \
             "Expected a list of sqlite3.Row, got instead %s" % (type(allTables))
@@ -118,8 +179,52 @@ class testSource(unittest.TestCase):
                 assert c in stmt[0], \
                     "Declaration for '%s' not found in table %s.\n schD = %s\nstmt = %s" % \
                     (c, tName, self._schemaData[tName], stmt[0])
+
+        # the db has been brought to the latest version of the schema
+        migrator = migrations.SchemaMigrator(dbfile = self._dbName)
+        assert migrator.getVersion() == migrator.getLatestVersion(), \
+            "%s should be at schema version %d, found %d." % (self._dbName, migrator.getLatestVersion(), migrator.getVersion())
+        migrator.close()
+
         self.src.logger.info("Schema verification terminated and passed.")
 
+    def testStorageProfile(self):
+        """Verifies that the pragmas of the storage profile are set on the connections of both code paths."""
+        readSrc = sources.Sources(dbfile = self._dbName, storageProfile = 'read-mostly')
+        self.assertEqual(readSrc.storageProfile, 'read-mostly')
+
+        pragmas = dict(db.STORAGE_PROFILES['read-mostly'])
+        self.assertEqual(readSrc.session.execute(sqlalchemy.text("PRAGMA journal_mode"), mapper = Locations).scalar(), 'wal')
+        self.assertEqual(readSrc.session.execute(sqlalchemy.text("PRAGMA mmap_size"), mapper = Locations).scalar(),
+                         pragmas['mmap_size'])
+        self.assertEqual(readSrc.session.execute(sqlalchemy.text("PRAGMA synchronous"), mapper = Locations).scalar(), 1)
+        self.assertEqual(readSrc.session.execute(sqlalchemy.text("PRAGMA foreign_keys"), mapper = Locations).scalar(), 1)
+
+        with closing(db.connect(dbfile = self._dbName, profile = 'durable')) as conn:
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 2)
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0],
+                             dict(db.STORAGE_PROFILES['durable'])['cache_size'])
+
+        with self.assertRaises(AssertionError):
+            db.connect(dbfile = self._dbName, profile = 'no-such-profile')
+
+    def testCheckTestData(self):
+        """Verifies that the scan for test records runs on the given db, and only until it is found clean."""
+        sources.Sources._cleanDbs.clear()
+        sources.Sources(dbfile = self._dbName, checkTestData = True)
+
+        self.src.insertTitleInLocation(aTitle = self.util.getNewTestName(), locationId = 1)
+
+        # already found clean: not scanned again
+        sources.Sources(dbfile = self._dbName, checkTestData = True)
+
+        sources.Sources._cleanDbs.clear()
+        with self.assertRaises(RuntimeError):
+            sources.Sources(dbfile = self._dbName, checkTestData = True)
+
+        # and not scanned at all by default
+        sources.Sources(dbfile = self._dbName)
+
     def testPlacesType(self):
         """Tests the places metadata."""
         self.src.logger.debug("Verifying definition for Locations wrapper class.")
@@ -165,6 +270,37 @@ class testSource(unittest.TestCase):
 
         self.src.logger.debug("Verification for Locations seed data passed.")
 
+    def testMetadataCache(self):
+        """Tests the cache of the locations and sites: per instance, indexed, invalidated on writes and by TTL."""
+        sitesCount = len(self.src.getLocationSitesData("Milano"))
+        for _ in range(3):
+            self.assertEqual(len(self.src.getLocationSitesData("Milano", refresh = True)), sitesCount,
+                             "Refreshing should not duplicate the sites.")
+
+        milano = self.src.getLocationByName("Milano")
+        self.assertIs(self.src.getLocationById(milano.id), milano)
+        site = self.src.getLocationSitesData("Milano")[0]
+        self.assertEqual(self.src.getSiteData(site['id']), site)
+        self.assertIsNone(self.src.getLocationByName("Nowhere"))
+        self.assertEqual(self.src.getLocationSitesData("Nowhere"), [])
+
+        # each instance has its own cache
+        otherSrc = sources.Sources(dbfile = self._dbName)
+        self.assertIsNot(otherSrc._getMetadata(), self.src._getMetadata())
+
+        # written through the session: seen straight away
+        newSite = self.src.sitesClass(name = self.util.getNewTestName(), url = "http://example.com/",
+                                      active = 0, locations_ref = milano.id)
+        self.src.session.add(newSite)
+        self.src.session.commit()
+        self.assertIn(newSite.name, [x['name'] for x in self.src.getLocationSitesData("Milano")])
+
+        # written by somebody else: seen on refresh, or once the TTL expires
+        self.assertEqual(len(otherSrc.getLocationSitesData("Milano")), sitesCount)
+        otherSrc.metadataTTL = 0
+        time.sleep(0.01)
+        self.assertEqual(len(otherSrc.getLocationSitesData("Milano")), sitesCount + 1)
+
     def testTitlesData(self):
         """Tests the getAllTitles."""
         self.src.logger.debug("Verification of getAllTitles.")
@@ -229,6 +365,294 @@ class testSource(unittest.TestCase):
         except IntegrityError:
             self.src.logger.info("IntegrityError thrown by the db as expected for invalid location.")
 
+    def testTitleIndex(self):
+        """Tests that the index of the titles follows the inserts, and the changes made by others once invalidated."""
+        testTitle = self.util.getNewTestName()
+        (tid1, tilid1) = self.src.insertTitleInLocation(aTitle = testTitle, locationId = 1)
+
+        # a show in a new location is indexed too
+        self.src.insertShow(titlesRef = tid1, locationsRef = 2)
+        (tid2, tilid2) = self.src.insertTitleInLocation(aTitle = testTitle.upper(), locationId = 2)
+        self.assertEqual(tid2, tid1, "Similar title should be found in the new location.")
+        self.assertEqual(len([x for x in self.src.getAllTitlesAndLocations() if x['id'] == tid1]), 2,
+                         "No new titles_in_locations expected.")
+
+        # another writer adds a title: seen only after invalidating the index
+        otherTitle = self.util.getNewTestName()
+        otherSrc = sources.Sources(dbfile = self._dbName)
+        (tid3, tilid3) = otherSrc.insertTitleInLocation(aTitle = otherTitle, locationId = 1)
+
+        self.src.invalidateTitleIndex()
+        (tid4, tilid4) = self.src.insertTitleInLocation(aTitle = otherTitle, locationId = 1)
+        self.assertEqual((tid4, tilid4), (tid3, tilid3), "Title inserted by another writer should be found.")
+
+    def testTitleAliases(self):
+        """Tests that titles already seen in a location are resolved through their aliases."""
+        testTitle = self.util.getNewTestName()
+
+        (tid1, tilid1) = self.src.insertTitleInLocation(aTitle = testTitle, locationId = 1)
+        self.assertEqual(self.src.getAliasStats(), {'hits': 0, 'misses': 1})
+
+        (tid2, tilid2) = self.src.insertTitleInLocation(aTitle = testTitle, locationId = 1)
+        self.assertEqual((tid2, tilid2), (tid1, tilid1), "Alias should resolve to the same title in location.")
+        self.assertEqual(self.src.getAliasStats(), {'hits': 1, 'misses': 1})
+
+        # a different string, or the same one in another location, needs to be matched
+        (tid3, tilid3) = self.src.insertTitleInLocation(aTitle = testTitle.lower(), locationId = 1)
+        (tid4, tilid4) = self.src.insertTitleInLocation(aTitle = testTitle, locationId = 2)
+        self.assertEqual((tid3, tilid3), (tid1, tilid1), "Similar title should be matched to the same one.")
+        self.assertEqual(tid4, tid1, "Title in another location should be matched to the same one.")
+        self.assertEqual(self.src.getAliasStats(), {'hits': 1, 'misses': 3})
+
+        # all these are now known
+        self.src.insertTitleInLocation(aTitle = testTitle.lower(), locationId = 1)
+        self.src.insertTitleInLocation(aTitle = testTitle, locationId = 2)
+        self.assertEqual(self.src.getAliasStats(), {'hits': 3, 'misses': 3})
+
+    def testInsertBatches(self):
+        """Tests that the batch inserts give the same results as inserting one title and one show at a time."""
+        title1 = self.util.getNewTestName()
+        title2 = self.util.getNewTestName()
+        title3 = self.util.getNewTestName()
+
+        # title3 is already known in another location
+        (tid3, tilid3) = self.src.insertTitleInLocation(aTitle = title3, locationId = 2)
+
+        titles = [title1, title1.lower(), title2, title1, title3]
+        batch = self.src.insertTitlesInLocationBatch(titles = titles, locationId = 1)
+
+        self.assertEqual(batch[0], batch[1], "Similar titles in the same batch should resolve to the same title.")
+        self.assertEqual(batch[0], batch[3], "Repeated titles should resolve to the same title.")
+        self.assertNotEqual(batch[0], batch[2])
+        self.assertEqual(batch[4][0], tid3, "Title known in another location should be reused.")
+        self.assertNotEqual(batch[4][1], tilid3, "Title known in another location should get a new titles_in_locations.")
+
+        # the same as one at a time, and idempotent
+        self.src.invalidateTitleIndex()
+        self.assertEqual([self.src.insertTitleInLocation(aTitle = x, locationId = 1) for x in titles], batch)
+        self.assertEqual(self.src.insertTitlesInLocationBatch(titles = titles, locationId = 1), batch)
+
+        titleIds = [x[0] for x in batch]
+        shows = self.src.insertShowsBatch(titlesRefs = titleIds, locationsRef = 1, date = '2017-05-05')
+        self.assertEqual(len(set(shows)), 3, "One show per title expected.")
+        self.assertEqual([self.src.insertShow(titlesRef = x, locationsRef = 1, date = '2017-05-05') for x in titleIds], shows)
+        self.assertEqual(self.src.insertShowsBatch(titlesRefs = titleIds, locationsRef = 1, date = '2017-05-05'), shows)
+
+        # a show in a location where the title was not yet
+        otherShows = self.src.insertShowsBatch(titlesRefs = [titleIds[0]], locationsRef = 3, date = '2017-05-05')
+        self.assertEqual(otherShows, [self.src.insertShow(titlesRef = titleIds[0], locationsRef = 3, date = '2017-05-05')])
+
+    def testInsertBatchesConcurrently(self):
+        """Tests that the titles resolved by another instance after the aliases were looked up are taken from its aliases."""
+        title1 = self.util.getNewTestName()
+        title2 = self.util.getNewTestName()
+        other = sources.Sources(dbfile = self._dbName)
+        otherBatch = []
+
+        # the other instance stores title1 once the aliases of this batch were looked up
+        getTitleIndex = self.src._getTitleIndex
+        def racingGetTitleIndex():
+            if len(otherBatch) == 0:
+                otherBatch.extend(other.insertTitlesInLocationBatch(titles = [title1], locationId = 1))
+            return getTitleIndex()
+        self.src._getTitleIndex = racingGetTitleIndex
+
+        batch = self.src.insertTitlesInLocationBatch(titles = [title1, title1.lower(), title2], locationId = 1)
+
+        self.assertEqual(batch[0], otherBatch[0], "The title should be resolved as the other instance did.")
+        self.assertEqual(batch[1], otherBatch[0], "Similar titles should follow it.")
+        self.assertNotEqual(batch[2], otherBatch[0])
+        with closing(db.connect(dbfile = self._dbName)) as conn:
+            self.assertEqual(conn.execute("SELECT count(*) FROM titles WHERE title = ?;", (title1,)).fetchone()[0], 1)
+            self.assertEqual([tuple(x) for x in conn.execute("SELECT titles_ref, titles_in_locations_ref FROM title_aliases " +
+                                                             "WHERE locations_ref = 1 AND raw_title IN (?, ?);",
+                                                             (title1, title1.lower())).fetchall()],
+                             [otherBatch[0], otherBatch[0]])
+
+        # and as they are from now on
+        self.assertEqual(self.src.insertTitlesInLocationBatch(titles = [title1, title1.lower(), title2], locationId = 1), batch)
+
+    def testInsertShowUnique(self):
+        """Tests that shows are inserted once per title, location and day, whoever inserts them."""
+        testTitle = self.util.getNewTestName()
+        testTitleId = self.src.insertTitleInLocation(aTitle = testTitle, locationId = 1)[0]
+
+        # another writer on the same db
+        otherSrc = sources.Sources(dbfile = self._dbName)
+        id1 = self.src.insertShow(titlesRef = testTitleId, locationsRef = 2, date = '2017-05-05')
+        id2 = otherSrc.insertShow(titlesRef = testTitleId, locationsRef = 2, date = '2017-05-05')
+        self.assertEqual(id1, id2, "The same show should be returned to both writers.")
+
+        tilIds = [x['tilid'] for x in self.src.getAllTitlesAndLocations() if x['id'] == testTitleId]
+        self.assertEqual(len(tilIds), 2, "One titles_in_locations per location expected.")
+
+        # the db itself refuses duplicates
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.util._conn.execute("INSERT INTO show_runs (titles_in_locations_ref, first_date, last_date) " +
+                                    "VALUES (?, '2017-05-05', '2017-05-05');",
+                                    (max(tilIds),))
+
+    def testShowRuns(self):
+        """Tests that the shows on consecutive days are stored as runs, merged when a gap is filled."""
+        testTitleId, testTilId = self.src.insertTitleInLocation(aTitle = self.util.getNewTestName(), locationId = 1)
+
+        id1 = self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = '2017-05-05')
+        self.assertEqual(self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = '2017-05-06'), id1)
+        id2 = self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = '2017-05-08')
+        self.assertNotEqual(id1, id2, "A show after a gap should start a new run.")
+
+        runs = "SELECT first_date, last_date FROM show_runs WHERE titles_in_locations_ref = ? ORDER BY first_date;"
+        self.assertEqual([tuple(x) for x in self.util._conn.execute(runs, (testTilId,)).fetchall()],
+                         [('2017-05-05', '2017-05-06'), ('2017-05-08', '2017-05-08')])
+
+        # filling the gap merges the two runs
+        self.assertEqual(self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = '2017-05-07'), id1)
+        self.assertEqual([tuple(x) for x in self.util._conn.execute(runs, (testTilId,)).fetchall()],
+                         [('2017-05-05', '2017-05-08')])
+
+        # the days of the runs are still there for the queries
+        days = ['2017-05-05', '2017-05-06', '2017-05-07', '2017-05-08']
+        self.assertEqual([x[0] for x in self.util._conn.execute("SELECT date FROM daily_shows " +
+                                                                "WHERE titles_in_locations_ref = ? ORDER BY date;",
+                                                                (testTilId,)).fetchall()], days)
+        self.assertEqual([x.date for x in self.src.iterShows(locationId = 1, dateFrom = '2017-05-06', dateTo = '2017-05-07')
+                          if x.titles_ref == testTitleId], days[1:3])
+        self.assertEqual([x.date for x in self.src.iterShows() if x.titles_ref == testTitleId], days)
+
+    def testShowBounds(self):
+        """Tests the first and last show and the days shown kept on the titles in the locations."""
+        testTitleId, testTilId = self.src.insertTitleInLocation(aTitle = self.util.getNewTestName(), locationId = 1)
+        self.assertNotIn(testTitleId, [x['tid'] for x in self.src.getAllTitlesInLocation(1)])
+
+        for date in ['2017-05-07', '2017-05-05', '2017-05-07']:
+            self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = date)
+        self.src.insertShowsBatch(titlesRefs = [testTitleId], locationsRef = 1, date = '2017-05-10')
+
+        rec = [x for x in self.src.getAllTitlesInLocation(1) if x['tid'] == testTitleId][0]
+        self.assertEqual((rec['first_show'], rec['last_show'], rec['show_count']), ('2017-05-05', '2017-05-10', 3))
+
+        # what opened and closed in a week
+        self.assertIn(testTilId, [x.tilid for x in self.src.iterTitlesOpened(1, '2017-05-01', '2017-05-07')])
+        self.assertNotIn(testTilId, [x.tilid for x in self.src.iterTitlesOpened(1, '2017-05-08', '2017-05-14')])
+        self.assertNotIn(testTilId, [x.tilid for x in self.src.iterTitlesClosed(1, '2017-05-01', '2017-05-07')])
+        closed = list(self.src.iterTitlesClosed(1, '2017-05-08', '2017-05-14'))
+        self.assertIn(testTilId, [x.tilid for x in closed])
+        self.assertEqual([x.last_show for x in closed], sorted([x.last_show for x in closed]))
+        self.assertEqual(list(self.src.iterTitlesOpened(2, '2017-05-01', '2017-05-07')),
+                         [x for x in self.src.iterTitlesOpened(2, '2017-05-01', '2017-05-07') if x.tilid != testTilId])
+
+    def testCompactShows(self):
+        """Tests the conversion of the daily shows into runs of shows."""
+        # on a db of its own: all the daily shows of a db are compacted
+        with tempfile.TemporaryDirectory() as tmpDir:
+            dbfile = os.path.join(tmpDir, "movies.db")
+            tmpSrc, (testTitleId,) = tests.utils.Utils.createDb(dbfile, [self.util.getNewTestName()], 1)
+            tmpSrc.insertShow(titlesRef = testTitleId, locationsRef = 1, date = '2017-05-05')
+
+            # daily shows written by an older version, touching and overlapping the run, and after a gap
+            with closing(db.connect(dbfile = dbfile)) as conn:
+                testTilId = conn.execute("SELECT id FROM titles_in_locations WHERE titles_ref = ?;", (testTitleId,)).fetchone()[0]
+                conn.executemany("INSERT INTO shows (date, titles_in_locations_ref) VALUES (?, ?);",
+                                 [(x, testTilId) for x in ['2017-05-03', '2017-05-04', '2017-05-05', '2017-05-09']])
+                conn.commit()
+
+            # which are seen by the readers once aggregated
+            days = ['2017-05-03', '2017-05-04', '2017-05-05', '2017-05-09']
+            self.assertEqual([(x['first_show'], x['last_show']) for x in tmpSrc.getAllTitlesInLocation(1)],
+                             [('2017-05-05', '2017-05-05')])
+            tmpSrc.catchUpAggregates()
+            self.assertEqual([(x['first_show'], x['last_show'], x['show_count']) for x in tmpSrc.getAllTitlesInLocation(1)],
+                             [('2017-05-03', '2017-05-09', 4)])
+            self.assertEqual([x.date for x in tmpSrc.iterShows(locationId = 1)], days)
+
+            self.assertEqual(tmpSrc.compactShows(), {'shows': 4, 'runs': 2})
+
+            with closing(db.connect(dbfile = dbfile)) as conn:
+                self.assertEqual([tuple(x) for x in conn.execute("SELECT titles_in_locations_ref, first_date, last_date " +
+                                                                 "FROM show_runs ORDER BY first_date;").fetchall()],
+                                 [(testTilId, '2017-05-03', '2017-05-05'), (testTilId, '2017-05-09', '2017-05-09')])
+                self.assertEqual(conn.execute("SELECT count(*) FROM shows_daily;").fetchone()[0], 0)
+                # the queries and inserts written against the daily shows still see all of them
+                self.assertEqual([x[0] for x in conn.execute("SELECT date FROM shows ORDER BY date;").fetchall()], days)
+
+            self.assertEqual(sorted([x.date for x in tmpSrc.session.query(tmpSrc.showsClass).all()]), days)
+
+            # nothing changes for the readers
+            self.assertEqual([(x['first_show'], x['last_show'], x['show_count']) for x in tmpSrc.getAllTitlesInLocation(1)],
+                             [('2017-05-03', '2017-05-09', 4)])
+            self.assertEqual([x.date for x in tmpSrc.iterShows(locationId = 1)], days)
+            self.assertEqual(tmpSrc.compactShows(), {'shows': 0, 'runs': 0})
+
+    def testNonTranslatedTitles(self):
+        """Tests the titles still to be translated, in one location and streamed for all of them."""
+        testTitleId = self.src.insertTitleInLocation(aTitle = self.util.getNewTestName(), locationId = 1)[0]
+        self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = '2017-05-05')
+
+        self.assertIn(testTitleId, [x['tid'] for x in self.src.getNonTranslatedTitlesInLocation(1)])
+        self.assertNotIn(testTitleId, [x['tid'] for x in self.src.getNonTranslatedTitlesInLocation(2)])
+
+        # the translations can be written while the titles are streamed
+        found = False
+        for rec in self.src.getNonTranslatedTitles():
+            if rec['tid'] == testTitleId:
+                self.assertEqual(rec['location_name'], self.src.getLocationById(1).name)
+                self.assertEqual((rec['first_show'], rec['last_show']), ('2017-05-05', '2017-05-05'))
+                self.src.insertTranslation(titlesRef = testTitleId, lang_from = 'en', tmdb_id = 1)
+                found = True
+        self.assertTrue(found, "The test title should be streamed.")
+
+        self.assertNotIn(testTitleId, [x['tid'] for x in self.src.getNonTranslatedTitlesInLocation(1)])
+        self.assertNotIn(testTitleId, [x['tid'] for x in self.src.getNonTranslatedTitles()])
+
+        # translations are not cleaned up by the test utilities
+        self.util._conn.execute("DELETE FROM translations WHERE title_from_ref = ?;", (testTitleId,))
+
+    def testNonTranslatedTitlesPlan(self):
+        """Verifies that the query of the titles still to be translated goes through the indexes."""
+        with tempfile.TemporaryDirectory() as tmpDir:
+            dbfile = os.path.join(tmpDir, "movies.db")
+            tmpSrc = tests.utils.Utils.createDb(dbfile, [])[0]
+            # all the locations: a single pass over titles_in_locations, then lookups; no shows read
+            for locationsId, expected, scans in [(2, ['translations_title_from', 'titles_in_locations_first_show'], 0),
+                                                 (None, ['translations_title_from'], 1)]:
+                qry = tmpSrc._getNonTranslatedTitlesQuery(locationsId).statement \
+                            .compile(dialect = sqlalchemy.dialects.sqlite.dialect(), compile_kwargs = {"literal_binds": True})
+                with closing(db.connect(dbfile = dbfile)) as conn:
+                    plan = " ".join([x['detail'] for x in conn.execute("EXPLAIN QUERY PLAN " + str(qry)).fetchall()])
+
+                self.src.logger.debug("Plan for location %s: %s", locationsId, plan)
+                for index in expected:
+                    self.assertIn("INDEX " + index, plan, "Index %s not used in %s" % (index, plan))
+                self.assertEqual(plan.count("SCAN "), scans, "Unexpected table scans in %s" % plan)
+
+    def testIterators(self):
+        """Tests the streaming read API against the ORM one."""
+        # small chunks, to go through several fetches
+        self.src._fetchSize = 2
+
+        testTitle = self.util.getNewTestName()
+        testTitleId, testTilId = self.src.insertTitleInLocation(aTitle = testTitle, locationId = 1)
+        self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = '2017-05-05')
+        self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = '2017-05-07')
+
+        self.assertEqual([(x.id, x.title) for x in self.src.getAllTitles()],
+                         list(self.src.iterTitles()))
+        self.assertEqual(sorted([tuple(x.values()) for x in self.src.getAllTitlesAndLocations()]),
+                         sorted([tuple(x) for x in self.src.iterTitlesAndLocations()]))
+
+        expected = [(x['tid'], x['tilid'], x['title'], x['first_show'], x['last_show'], x['locations_ref'], x['language'], x['show_count']) \
+                    for x in self.src.getAllTitlesInLocation(1)]
+        rows = list(self.src.iterTitlesInLocation(1))
+        self.assertEqual(sorted(expected), sorted([tuple(x) for x in rows]))
+        testRow = [x for x in rows if x.tid == testTitleId][0]
+        self.assertEqual((testRow.first_show, testRow.last_show), ('2017-05-05', '2017-05-07'))
+
+        shows = list(self.src.iterShows(locationId = 1, dateFrom = '2017-05-05', dateTo = '2017-05-06'))
+        self.assertIn(sources.ShowRow('2017-05-05', testTitleId, testTitle, 1, testTilId), shows)
+        self.assertNotIn('2017-05-07', [x.date for x in shows if x.titles_ref == testTitleId])
+        self.assertEqual([x.date for x in shows], sorted([x.date for x in shows]))
+        self.assertEqual([x for x in self.src.iterShows(locationId = 2) if x.titles_ref == testTitleId], [])
+
     def testInsertShow(self):
         """Tests inserting a show with a test title in a location."""
         testTitle = self.util.getNewTestName()
@@ -252,20 +676,20 @@ class testSource(unittest.TestCase):
         self.assertTrue(id1 == id2, \
                         "Second insertion with today's explicit date should return the original id (%s, got: %s)." % (id1, id2))
 
+        # consecutive days extend the same run of shows
         id3 = self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = yesterday)
-        self.assertTrue(id1 != id3, \
-                        "Third insertion with yesteday's explicit date should return a new id (%s, got: %s)." % (id1, id3))
+        self.assertTrue(id1 == id3, \
+                        "Third insertion with yesteday's explicit date should extend the original run (%s, got: %s)." % (id1, id3))
 
         id4 = self.src.insertShow(titlesRef = testTitleId, locationsRef = 1, date = tomorrow)
-        self.assertTrue(id1 != id4 and id3 != id4, \
-                        "Fourth insertion with tomorrow's explicit date should return a new id (%s, %s, got: %s)." \
-                        % (id1, id3, id4))
+        self.assertTrue(id1 == id4, \
+                        "Fourth insertion with tomorrow's explicit date should extend the original run (%s, got: %s)." % (id1, id4))
 
         # happy path today date new location
         id5 = self.src.insertShow(titlesRef = testTitleId, locationsRef = 2, date = today)
-        self.assertTrue(id1 != id5 and id3 != id5 and id4 != id5, \
-                        "Fifth insertion with today's explicit date but a new location should return a new id (%s, %s, %s, got: %s)." \
-                        % (id1, id3, id4, id5))
+        self.assertTrue(id1 != id5, \
+                        "Fifth insertion with today's explicit date but a new location should return a new id (%s, got: %s)." \
+                        % (id1, id5))
 
         # sad paths
         try:
@@ -0,0 +1,98 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import sys
+import random
+import unittest
+import xmlrunner
+
+from utils import stringUtils
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class testStringUtils(unittest.TestCase):
+    """
+    Tests for the string utils.
+    """
+
+    # few characters, so that many random titles are similar to each other
+    _alphabet = "ab 1"
+
+    def _randomTitles(self, count = 0, seed = 0):
+        rnd = random.Random(seed)
+        return ["".join([rnd.choice(self._alphabet) for _ in range(rnd.randint(0, 9))]) for _ in range(count)]
+
+    def _isSimilar(self, title1 = "", title2 = ""):
+        try:
+            return stringUtils.isSimilar(title1, title2) or stringUtils.isSimilar(title2, title1)
+        except ZeroDivisionError:
+            # two empty titles
+            return True
+
+    def testIsSimilar(self):
+        """Tests the similarity of a few titles."""
+        self.assertTrue(stringUtils.isSimilar("Star Wars: a new hope", "Star Wars - A New Hope"))
+        self.assertFalse(stringUtils.isSimilar("Madagascar", "Madagascar 2"))
+        self.assertFalse(stringUtils.isSimilar("Amarcord", "Roma"))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testSimilarityMatrix(self):
+        """Tests that the similarity matrix matches isSimilar, also when computed in chunks."""
+        titlesA = [x for x in self._randomTitles(300, seed = 1) if x.strip() != ""] + ["Ⅻ b", "a²b1"]
+        titlesB = self._randomTitles(250, seed = 2) + ["Ⅻ a", "a b 2"]
+
+        cells = stringUtils.similarityMatrixCells
+        try:
+            for chunkCells in [cells, 1000]:
+                stringUtils.similarityMatrixCells = chunkCells
+                matrix = stringUtils.similarityMatrix(titlesA, titlesB)
+                self.assertEqual(matrix.shape, (len(titlesA), len(titlesB)))
+                for i, title1 in enumerate(titlesA):
+                    for j, title2 in enumerate(titlesB):
+                        self.assertEqual(bool(matrix[i, j]), stringUtils.isSimilar(title1, title2),
+                                         "Different result for '%s', '%s'." % (title1, title2))
+        finally:
+            stringUtils.similarityMatrixCells = cells
+
+        self.assertRaises(ZeroDivisionError, stringUtils.similarityMatrix, ["a", " "], [""])
+
+    def testBlockIndexCandidates(self):
+        """Tests that the candidates of the block index include all the similar titles."""
+        titles = self._randomTitles(400)
+        index = stringUtils.TitleBlockIndex()
+        for key, title in enumerate(titles):
+            index.add(key, title)
+
+        # half of them go away
+        for key in range(0, len(titles), 2):
+            index.remove(key)
+        self.assertEqual(len(index), len(titles) // 2)
+
+        for title in titles:
+            candidates = index.candidates(title)
+            for key in range(1, len(titles), 2):
+                if self._isSimilar(title, titles[key]):
+                    self.assertIn(key, candidates, "'%s' similar to '%s' not found." % (titles[key], title))
+            self.assertFalse([x for x in candidates if x % 2 == 0], "Removed titles should not be returned.")
+
+    def testBlockIndexPruning(self):
+        """Tests that the block index does not return titles which cannot be similar."""
+        index = stringUtils.TitleBlockIndex()
+        index.add(1, "Amarcord")
+        index.add(2, "La dolce vita")
+        index.add(3, "amarcord ")
+        index.add(4, "Amarcord, il film")
+
+        self.assertEqual(index.candidates("Amarcord"), {1, 3})
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
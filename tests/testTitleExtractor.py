@@ -0,0 +1,81 @@
+'''
+Created on Oct 18, 2026
+
+@author: Guido
+'''
+import sys
+import unittest
+import xmlrunner
+import movieLogger
+from lxml import html
+
+from titleExtractor import TitleExtractor
+
+class testTitleExtractor(unittest.TestCase):
+    """
+    Tests for the streaming title extractor: its results must match
+    the ones of the whole page parsed by lxml.html.
+    """
+    extractor = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(testTitleExtractor, cls).setUpClass()
+        movieLogger.MovieLoggger().initLogger('INFO')
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.extractor = TitleExtractor()
+
+    def _getPage(self, items = 500):
+        body = "".join(["<div class='wrap'><!-- a comment --><div class='title'><a>Caffè %d</a>" % i +
+                         "<div class='title'><a>Nested %d</a></div></div>" % i +
+                         "<p class='x'>noise <b>bold %d</b></p><div id='tail'><span>%d</span></div></div>" % (i, i)
+                         for i in range(items)])
+        return ("<html><head><meta charset='utf-8'></head><body>" + body + "</body></html>").encode("utf-8")
+
+    def _chunks(self, page, size = 97):
+        return [page[i:i + size] for i in range(0, len(page), size)]
+
+    def testSameResultsAsWholePage(self):
+        """Tests that streaming and non streaming queries yield the same titles as lxml.html."""
+        page = self._getPage()
+        for xpath in ['//div[@class="title"]/a/text()',
+                      '//div[@class="wrap"]/p/b/text()',
+                      '//div[@id="tail"]/span/text()',
+                      '//p[@class="x"]/text()',
+                      '//div[a]/a/text()',
+                      '//div[@class="title"][1]/a/text()']:
+            expected = set(html.fromstring(page).xpath(xpath))
+            got = self.extractor.extract(chunks = self._chunks(page), xpath = xpath)
+            self.assertEqual(got, expected, "Mismatch for %s" % xpath)
+            self.assertTrue(len(got) > 0, "Expected some results for %s" % xpath)
+
+    def testStreamablePlans(self):
+        """Tests which queries are evaluated while parsing."""
+        self.assertTrue(self.extractor.getPlan('//div[@class="title"]/a/text()').streamable)
+        self.assertTrue(self.extractor.getPlan('//a[contains(@href, "film")]/@href').streamable)
+        self.assertFalse(self.extractor.getPlan('//div[a]/a/text()').streamable)
+        self.assertFalse(self.extractor.getPlan('//div[1]/a/text()').streamable)
+        self.assertFalse(self.extractor.getPlan('//div[@class="title"]/../a/text()').streamable)
+        self.assertFalse(self.extractor.getPlan('//div[@class="title"]/a').streamable)
+
+    def testExtractAll(self):
+        """Tests evaluating several queries in one pass."""
+        page = self._getPage(10)
+        titles, bolds = self.extractor.extractAll(chunks = self._chunks(page),
+                                                  xpaths = ['//div[@class="title"]/a/text()',
+                                                            '//p[@class="x"]/b/text()'])
+        self.assertEqual(len(titles), 20)
+        self.assertEqual(sorted(bolds), sorted(["bold %d" % i for i in range(10)]))
+
+    def testEmptyPage(self):
+        """Tests that an empty page yields no titles."""
+        self.assertEqual(self.extractor.extract(chunks = [b""], xpath = '//a/text()'), set())
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "exportXML":
+        unittest.main()
+    else:
+        del sys.argv[1]  # remove the exportXML flag, which is not to be passed to the runner
+        unittest.main(testRunner = xmlrunner.XMLTestRunner(output = 'test-reports'))
@@ -3,8 +3,14 @@ Created on May 21, 2017
 
 @author: Guido
 '''
+import os
 from contextlib import closing
 from utils import dbUtils as db
+import sources
+import migrations
+import aggregates
+import bitmaps
+import sketches
 
 class Utils(object):
     """
@@ -19,6 +25,25 @@ class Utils(object):
         self._logger = logger
         self._conn = db.connect(dbfile = dbfile)
 
+    @staticmethod
+    def createDb(dbfile = None, titles = None, locationId = 2):
+        """
+        Creates a db of its own in dbfile from movieDiversity.sql, with the given titles
+        ("Roma", "Amarcord" and "Otto e mezzo" if None) in the given location (Milano, by default).
+        Returns a Sources instance on it and the list of the ids of the titles.
+        """
+        if titles is None:
+            titles = ["Roma", "Amarcord", "Otto e mezzo"]
+
+        with closing(db.connect(dbfile = dbfile)) as conn, \
+             open(os.path.join(os.path.dirname(os.path.abspath(sources.__file__)), "movieDiversity.sql"), encoding = "utf-8") as fp:
+            conn.executescript(fp.read())
+
+        src = sources.Sources(dbfile = dbfile)
+        titleIds = [src.insertTitleInLocation(aTitle = x, locationId = locationId)[0] for x in titles]
+
+        return src, titleIds
+
     def getNewTestName(self):
         """
         Generates a string different every time (for this instance and this run, of course)
@@ -27,6 +52,15 @@ class Utils(object):
         self._baseTestInt += 1
         return self.baseTestName + str(self._baseTestInt)
 
+    def _dailyShowsTable(self):
+        """
+        Returns the name of the table of the daily shows: dbs created before the shows view
+        have them in shows until migrated.
+        """
+        if migrations.getVersion(self._conn) >= migrations.SHOWS_DAILY_VERSION:
+            return "shows_daily"
+        return "shows"
+
     def getDbTestRecords(self):
         """
         Returns a dictionary listing all the testing records found in the db.
@@ -35,6 +69,8 @@ class Utils(object):
         output = {'titles': 0,
                   'titles_in_locations': 0,
                   'shows': 0,
+                  'show_runs': 0,
+                  'title_aliases': 0,
                   'locations': 0,
                   'sites': 0,
                   }
@@ -52,11 +88,27 @@ class Utils(object):
             output['titles_in_locations'] = [x['id'] for x in recs]
             placeholdersTILId = ', '.join('?' * len(output['titles_in_locations']))
 
-            qry = "SELECT id FROM shows WHERE titles_in_locations_ref in (%s);" % placeholdersTILId
+            qry = "SELECT id FROM %s WHERE titles_in_locations_ref in (%s);" % (self._dailyShowsTable(), placeholdersTILId)
             cur.execute(qry, output['titles_in_locations'])
             recs = cur.fetchall()
             output['shows'] = [x['id'] for x in recs]
 
+            # dbs created before the runs of shows do not have them until migrated
+            output['show_runs'] = []
+            if migrations.getVersion(self._conn) >= migrations.SHOW_RUNS_VERSION:
+                qry = "SELECT id FROM show_runs WHERE titles_in_locations_ref in (%s);" % placeholdersTILId
+                cur.execute(qry, output['titles_in_locations'])
+                recs = cur.fetchall()
+                output['show_runs'] = [x['id'] for x in recs]
+
+            # dbs created before the aliases were introduced do not have them until migrated
+            output['title_aliases'] = []
+            if migrations.getVersion(self._conn) >= migrations.TITLE_ALIASES_VERSION:
+                qry = "SELECT id FROM title_aliases WHERE titles_ref in (%s) OR raw_title like ?;" % placeholdersTId
+                cur.execute(qry, output['titles'] + [self.baseTestName + "%"])
+                recs = cur.fetchall()
+                output['title_aliases'] = [x['id'] for x in recs]
+
             cur.execute("SELECT id FROM sites WHERE name like ?;", (self.baseTestName + "%",))
             recs = cur.fetchall()
             output['sites'] = [x['id'] for x in recs]
@@ -77,6 +129,8 @@ class Utils(object):
         totLen = len(testRecords['titles']) + \
                  len(testRecords['titles_in_locations']) + \
                  len(testRecords['shows']) + \
+                 len(testRecords['show_runs']) + \
+                 len(testRecords['title_aliases']) + \
                  len(testRecords['sites']) + \
                  len(testRecords['locations'])
 
@@ -93,12 +147,16 @@ class Utils(object):
             totLen = len(testRecords['titles']) + \
                      len(testRecords['titles_in_locations']) + \
                      len(testRecords['shows']) + \
+                     len(testRecords['show_runs']) + \
+                     len(testRecords['title_aliases']) + \
                      len(testRecords['sites']) + \
                      len(testRecords['locations'])
 
             self._logger.debug("Cleaning up: Found %d titles test record(s).", len(testRecords['titles']))
             self._logger.debug("Cleaning up: Found %d titles_in_locations test record(s).", len(testRecords['titles_in_locations']))
             self._logger.debug("Cleaning up: Found %d shows test record(s).", len(testRecords['shows']))
+            self._logger.debug("Cleaning up: Found %d show_runs test record(s).", len(testRecords['show_runs']))
+            self._logger.debug("Cleaning up: Found %d title_aliases test record(s).", len(testRecords['title_aliases']))
             self._logger.debug("Cleaning up: Found %d sites test record(s).", len(testRecords['sites']))
             self._logger.debug("Cleaning up: Found %d locations test record(s).", len(testRecords['locations']))
 
@@ -110,11 +168,28 @@ class Utils(object):
                     placeholdersTILId = ', '.join('?' * len(testRecords['titles_in_locations']))
                     placeholdersLocId = ', '.join('?' * len(testRecords['locations']))
                     placeholdersSiteId = ', '.join('?' * len(testRecords['sites']))
+                    placeholdersAliasId = ', '.join('?' * len(testRecords['title_aliases']))
+
+                    qry = "DELETE FROM title_aliases WHERE id in (%s);" % placeholdersAliasId
+                    cur.execute(qry, testRecords['title_aliases'])
+                    self._logger.info("Deleted %d title_aliases test record(s).", cur.rowcount)
 
-                    qry = "DELETE FROM shows WHERE titles_in_locations_ref in (%s);" % placeholdersTILId
+                    qry = "DELETE FROM %s WHERE titles_in_locations_ref in (%s);" % (self._dailyShowsTable(), placeholdersTILId)
                     cur.execute(qry, testRecords['titles_in_locations'])
                     self._logger.info("Deleted %d shows test record(s).", cur.rowcount)
 
+                    placeholdersRunId = ', '.join('?' * len(testRecords['show_runs']))
+                    qry = "DELETE FROM show_runs WHERE id in (%s);" % placeholdersRunId
+                    cur.execute(qry, testRecords['show_runs'])
+                    self._logger.info("Deleted %d show_runs test record(s).", cur.rowcount)
+
+                    # the aggregates of the days of the test shows are stale, and refer to the test locations
+                    # (the rebuild reads shows_daily: older dbs are rebuilt once migrated, see SchemaMigrator.rebuild())
+                    if migrations.getVersion(self._conn) >= migrations.SHOWS_DAILY_VERSION:
+                        self._logger.info("Rebuilt the aggregates of %d days.", aggregates.rebuild(cur))
+                        self._logger.info("Rebuilt the bitmaps of %d days.", bitmaps.rebuild(cur))
+                        self._logger.info("Rebuilt the sketches of %d days.", sketches.rebuild(cur))
+
                     qry = "DELETE FROM titles_in_locations WHERE id in (%s);" % placeholdersTILId
                     cur.execute(qry, testRecords['titles_in_locations'])
                     self._logger.info("Deleted %d titles_in_locations test record(s).", cur.rowcount)
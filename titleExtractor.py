@@ -0,0 +1,204 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+Streaming extraction of the titles from the listing pages.
+"""
+import re
+import logging
+import threading
+
+import movieLogger
+
+class _ExtractionPlan(object):
+    """
+    How one xpath query is evaluated on a page being parsed.
+
+    Queries in the form "//step/relative/path/text()" (or ending with an attribute),
+    where step only looks at the attributes of its element and the relative path only
+    walks down the tree, are evaluated on each "anchor" element (the ones matching step)
+    as soon as it is complete: everything outside the anchors can then be thrown away
+    while the page is still being parsed.
+    All the other queries are evaluated on the whole tree at the end.
+    """
+    xpath = None
+    streamable = False
+
+    # compiled queries: full query, anchor test (on an element being opened) and anchor query
+    query = None
+    anchorTest = None
+    anchorQuery = None
+    anchorTag = None
+
+    # when the anchor step only has [@name="value"] predicates, these are checked
+    # directly on the attributes, as a list of (name, value)
+    anchorAttributes = None
+
+    # axes and functions which look outside the subtree of an anchor, or depend on positions
+    _unsafe = re.compile(r"\.\.|ancestor|parent|preceding|following|position\(|last\(|\||id\(|\[\s*\d+\s*\]|\(\s*/|\[\s*/")
+    _path = re.compile(r"^//(?P<step>[\w:*-]+(\[[^\[\]]*\])*)(?P<rest>(/[^/].*)?)$", re.DOTALL)
+    _strings = re.compile(r"\"[^\"]*\"|'[^']*'")
+    _attributeOnly = re.compile(r"@[\w:.-]+|\b(contains|starts-with|normalize-space|concat|translate|not|and|or)\b|[=!<>(),\s]|\d+")
+    _attributeEquals = re.compile(r"^\s*@(?P<name>[\w:.-]+)\s*=\s*(\"(?P<dq>[^\"]*)\"|'(?P<sq>[^']*)')\s*$")
+
+    def __init__(self, xpath = ""):
+        from lxml import etree
+
+        self.xpath = xpath
+        self.query = etree.XPath(xpath)
+
+        match = self._path.match(xpath.strip())
+        if match is None or self._unsafe.search(self._strings.sub("", xpath)) is not None:
+            return
+
+        step = match.group('step')
+        rest = match.group('rest')
+
+        # the results must be strings, or they would be lost with the anchors
+        if not (rest.endswith("text()") or re.search(r"/@[\w:.-]+$", rest)):
+            return
+
+        # the predicates of the anchor step must depend only on the attributes of the element,
+        # which are already known when the element is opened
+        self.anchorAttributes = []
+        for predicate in re.findall(r"\[([^\[\]]*)\]", step):
+            if self._attributeOnly.sub("", self._strings.sub("", predicate)) != "":
+                return
+
+            equals = self._attributeEquals.match(predicate)
+            if equals is None:
+                self.anchorAttributes = None
+            elif self.anchorAttributes is not None:
+                value = equals.group('dq') if equals.group('dq') is not None else equals.group('sq')
+                self.anchorAttributes.append((equals.group('name'), value))
+
+        self.anchorTag = step.split("[")[0]
+        self.anchorTest = etree.XPath("self::" + step)
+        self.anchorQuery = etree.XPath("descendant-or-self::" + step + rest)
+        self.streamable = True
+
+class TitleExtractor(object):
+    """
+    Extracts the results of xpath queries from a page, parsing it
+    incrementally as its chunks come in.
+
+    The compiled queries are cached, so each site's xpath is compiled only once.
+    For the queries that allow it, the parts of the page which cannot match are
+    discarded while parsing, so that memory stays bounded whatever the size of the page.
+    """
+    logger = None
+
+    _plans = None
+    _plansLock = None
+
+    def __init__(self):
+        """
+        Inits the logger and the cache of the compiled queries.
+        """
+        self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
+
+        self._plans = {}
+        self._plansLock = threading.Lock()
+
+    def getPlan(self, xpath = ""):
+        """
+        Returns the (cached) extraction plan for the given xpath query.
+        """
+        with self._plansLock:
+            if xpath not in self._plans:
+                self._plans[xpath] = _ExtractionPlan(xpath)
+                self.logger.debug("Compiled xpath %s (streamable: %s).", xpath, self._plans[xpath].streamable)
+
+            return self._plans[xpath]
+
+    def extract(self, chunks = None, xpath = ""):
+        """
+        Given an iterable of chunks of bytes making up an html page,
+        returns the set of the results of the xpath query on it.
+        """
+        return set(self.extractAll(chunks = chunks, xpaths = [xpath])[0])
+
+    def extractAll(self, chunks = None, xpaths = None):
+        """
+        Given an iterable of chunks of bytes making up an html page and a list of xpath queries,
+        returns a list with the list of the results of each query, in the same order.
+        """
+        from lxml import etree
+
+        plans = [self.getPlan(x) for x in xpaths]
+        results = [[] for _ in plans]
+
+        # the page is pruned while parsing only if all the queries allow it
+        streaming = all([x.streamable for x in plans])
+        # number of anchors currently open, per query
+        openAnchors = [0 for _ in plans]
+
+        # which elements are anchors, for the elements currently open
+        anchorsStack = []
+
+        if streaming:
+            # only the elements which can be anchors need to be looked at: all the others
+            # are dropped together with them, or with their previous siblings
+            tags = set([x.anchorTag for x in plans])
+            parser = etree.HTMLPullParser(events = ('start', 'end'),
+                                          tag = None if "*" in tags else list(tags))
+        else:
+            parser = etree.HTMLParser()
+
+        def consumeEvents():
+            for event, element in parser.read_events():
+                if event == 'start':
+                    isAnchor = [self._isAnchor(plan, element) for plan in plans]
+                    anchorsStack.append(isAnchor)
+                    for i in range(len(plans)):
+                        if isAnchor[i]:
+                            openAnchors[i] += 1
+                    continue
+
+                isAnchor = anchorsStack.pop()
+                for i, plan in enumerate(plans):
+                    if isAnchor[i]:
+                        openAnchors[i] -= 1
+                        if openAnchors[i] == 0:
+                            # outermost anchor complete: collect its results
+                            results[i].extend([str(x) for x in plan.anchorQuery(element)])
+
+                # nothing from here can be needed anymore, unless some anchor is still open
+                if sum(openAnchors) == 0 and element.getparent() is not None:
+                    element.clear(keep_tail = True)
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+
+        for chunk in chunks:
+            parser.feed(chunk)
+            if streaming:
+                consumeEvents()
+
+        try:
+            root = parser.close()
+        except etree.XMLSyntaxError:
+            # empty document
+            root = None
+
+        if streaming:
+            consumeEvents()
+        elif root is not None:
+            results = [[str(x) if isinstance(x, str) else x for x in plan.query(root)] for plan in plans]
+
+        return results
+
+    def _isAnchor(self, plan = None, element = None):
+        """
+        True if the element is an anchor for the plan.
+        """
+        if plan.anchorTag != "*" and element.tag != plan.anchorTag:
+            return False
+
+        if plan.anchorAttributes is not None:
+            for name, value in plan.anchorAttributes:
+                if element.get(name) != value:
+                    return False
+            return True
+
+        return plan.anchorTest(element)
@@ -0,0 +1,59 @@
+"""
+Created on Oct 18, 2026
+
+@author: Guido
+
+The titles shown in each location on each day, from the runs of shows and the daily shows,
+as read by the aggregates kept per (location, day): the bitmaps (see bitmaps.py) and
+the sketches (see sketches.py).
+
+All the functions take a cursor on the db, and run in its current transaction.
+"""
+import itertools
+from contextlib import closing
+
+# rows inserted at once by insertDays()
+_INSERT_BATCH = 1000
+
+def titlesOfDay(cur = None, locationsRef = None, date = None):
+    """
+    Returns the list of the titles (ids) shown in the location on the day.
+    """
+    cur.execute("SELECT til.titles_ref FROM show_runs r " +
+                "JOIN titles_in_locations til ON til.id = r.titles_in_locations_ref " +
+                "WHERE til.locations_ref = :location AND r.first_date <= :date AND r.last_date >= :date " +
+                "UNION " +
+                "SELECT til.titles_ref FROM shows_daily s " +
+                "JOIN titles_in_locations til ON til.id = s.titles_in_locations_ref " +
+                "WHERE til.locations_ref = :location AND s.date = :date",
+                {'location': locationsRef, 'date': date})
+
+    return [x[0] for x in cur.fetchall()]
+
+def iterDays(cur = None):
+    """
+    Generator yielding (locations_ref, date, list of the titles shown), ordered by location and day,
+    for all the days with shows. The rows are read off the cursor one (location, day) at a time.
+    """
+    cur.execute("SELECT til.locations_ref, d.date, til.titles_ref " +
+                "FROM daily_shows d JOIN titles_in_locations til ON til.id = d.titles_in_locations_ref " +
+                "ORDER BY til.locations_ref, d.date")
+
+    for key, group in itertools.groupby(cur, lambda x: (x[0], x[1])):
+        yield key[0], key[1], [x[2] for x in group]
+
+def insertDays(cur = None, statement = None, rows = None):
+    """
+    Executes the insert statement on the rows, _INSERT_BATCH at a time, through a cursor of its own
+    on the connection of the given one (which may still be reading the rows). Returns the number of rows.
+    """
+    rows = iter(rows)
+    count = 0
+    with closing(cur.connection.cursor()) as insertCur:
+        batch = list(itertools.islice(rows, _INSERT_BATCH))
+        while batch:
+            insertCur.executemany(statement, batch)
+            count += len(batch)
+            batch = list(itertools.islice(rows, _INSERT_BATCH))
+
+    return count
@@ -10,8 +10,6 @@ import argparse
 from pprint import pformat
 
 import movieLogger
-import sources
-import tmdb
 from utils import stringUtils
 
 class TranslationMatcher(object):
@@ -28,6 +26,10 @@ class TranslationMatcher(object):
         Builds a local instance of the Sources class and
         one of the MovieLogger engine.
         """
+        # the ORM and the rest client are imported only when a matcher is actually built
+        import sources
+        import tmdb
+
         self.sources = sources.Sources(dbfile = dbfile)
         self.logger = logging.getLogger(movieLogger.MovieLoggger.LOGGER_NAME)
 
@@ -47,40 +49,37 @@ class TranslationMatcher(object):
                  'not found': 0
                 }
 
-        # build a list/map of all titles and their location
-        locations = self.sources.getAllLocations(False)
-        for loc in locations:
-            self.logger.info("Looking at %s." % (loc.name))
-
-            titlesInLoc = self.sources.getNonTranslatedTitlesInLocation(loc.id)
-
-            # for each title:
-            for aTitleInLoc in titlesInLoc:
-
-                # clean up the 3D, (OV), etc...
-                aTitleInLoc['title'] = stringUtils.cleanupTitle(aTitleInLoc['title'])
-
-                ####
-                # LOCAL CHECKS:
-                # verify if this title and language are already in, insert it if needed,
-                # updates the stats accordingly
-                check = self.cheeckLocallyAndInsertTitle(aTitleInLoc = aTitleInLoc, theLanguage = loc.language)
+        # all the titles still to be translated, location by location, in one query
+        currentLocation = None
+        for aTitleInLoc in self.sources.getNonTranslatedTitles():
+            if aTitleInLoc['locations_ref'] != currentLocation:
+                currentLocation = aTitleInLoc['locations_ref']
+                self.logger.info("Looking at %s." % (aTitleInLoc['location_name']))
+
+            # clean up the 3D, (OV), etc...
+            aTitleInLoc['title'] = stringUtils.cleanupTitle(aTitleInLoc['title'])
+
+            ####
+            # LOCAL CHECKS:
+            # verify if this title and language are already in, insert it if needed,
+            # updates the stats accordingly
+            check = self.cheeckLocallyAndInsertTitle(aTitleInLoc = aTitleInLoc, theLanguage = aTitleInLoc['language'])
+            if check == 0:
+                stats['existing'] += 1
+            elif check == 1:
+                stats['new'] += 1
+
+            ####
+            # TMDB REMOTE CHECKS:
+            # new title, look it up on imdb
+            else:
+                check = self.checkTMBDAndInsertTitle(aTitleInLoc = aTitleInLoc, theLanguage = aTitleInLoc['language'])
                 if check == 0:
-                    stats['existing'] += 1
+                    stats['ambiguous'] += 1
                 elif check == 1:
                     stats['new'] += 1
-
-                ####
-                # TMDB REMOTE CHECKS:
-                # new title, look it up on imdb
-                else:
-                    check = self.checkTMBDAndInsertTitle(aTitleInLoc = aTitleInLoc, theLanguage = loc.language)
-                    if check == 0:
-                        stats['ambiguous'] += 1
-                    elif check == 1:
-                        stats['new'] += 1
-                    elif check == -1:
-                        stats['not found'] += 1
+                elif check == -1:
+                    stats['not found'] += 1
 
         self.logger.info("End run:\n\t{new:5} new translations\n\t{existing:5} existing\n\t{ambiguous:5} ambiguous\n\t{not found:5} not found"
                         .format_map(stats))
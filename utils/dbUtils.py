@@ -8,17 +8,80 @@ Utilities to uniform the SQLite db handling.
 
 import sqlite3
 
-def connect(dbfile = None):
+# named storage profiles: the pragmas set on every connection, in this order.
+# All of them use the WAL journal, so that readers do not block the writer (and vice versa).
+STORAGE_PROFILES = {
+    # every commit is synced to disk
+    'durable': [('journal_mode', 'WAL'),
+                ('synchronous', 'FULL'),
+                ('cache_size', -2000),
+                ('mmap_size', 0),
+                ('temp_store', 'DEFAULT')],
+    # commits are synced at the checkpoints only: a power loss may lose the last ones, but cannot corrupt the db
+    'fast-ingest': [('journal_mode', 'WAL'),
+                    ('synchronous', 'NORMAL'),
+                    ('cache_size', -64000),
+                    ('mmap_size', 0),
+                    ('temp_store', 'MEMORY')],
+    # for the analytics: a large cache and the db file mapped in memory
+    'read-mostly': [('journal_mode', 'WAL'),
+                    ('synchronous', 'NORMAL'),
+                    ('cache_size', -64000),
+                    ('mmap_size', 256 * 1024 * 1024),
+                    ('temp_store', 'MEMORY')],
+}
+
+# profile used by the connections which do not ask for a specific one
+_storageProfile = 'durable'
+
+def setStorageProfile(profile = None):
+    """
+    Sets the storage profile used from now on by the connections which do not specify one.
+    """
+    assert profile in STORAGE_PROFILES, \
+        "Unknown storage profile %s, expected one of %s" % (profile, sorted(STORAGE_PROFILES.keys()))
+
+    global _storageProfile
+    _storageProfile = profile
+
+def getStorageProfile():
+    """
+    Returns the name of the storage profile currently used by default.
+    """
+    return _storageProfile
+
+def applyStorageProfile(dbapiConnection = None, profile = None):
+    """
+    Sets the pragmas of the storage profile (the default one if None) on a sqlite3 connection,
+    which must not be in a transaction. Returns the name of the profile applied.
+    """
+    if profile is None:
+        profile = _storageProfile
+    assert profile in STORAGE_PROFILES, \
+        "Unknown storage profile %s, expected one of %s" % (profile, sorted(STORAGE_PROFILES.keys()))
+
+    for pragma, value in STORAGE_PROFILES[profile]:
+        dbapiConnection.execute("PRAGMA %s=%s;" % (pragma, value))
+
+    return profile
+
+def connect(dbfile = None, checkSameThread = True, profile = None):
     """
-    Returns a connection to the specified sqlite db.
+    Returns a connection to the specified sqlite db, set up with the given
+    storage profile (the default one if None).
+
+    If checkSameThread is False the connection can be used by several threads,
+    in which case it is up to the caller to serialize its use.
     """
 
     assert dbfile != None, "Cannot build a connection to a NULL file, please specify a valid name."
 
-    conn = sqlite3.connect(dbfile, isolation_level = None)
+    conn = sqlite3.connect(dbfile, isolation_level = None, check_same_thread = checkSameThread)
     # we use the Row class as factory so we have the columns' names as well
     conn.row_factory = sqlite3.Row
 
+    applyStorageProfile(conn, profile)
+
     return conn
 
 def cursor(connection = None):
@@ -5,9 +5,16 @@ Created on May 22, 2017
 
 Generic utils functions.
 '''
+import functools
 
 similarityThreshold = 0.7
 
+def normalizeTitle(title = ""):
+    """
+    Returns the title as compared by isSimilar: lowercase and without whitespaces.
+    """
+    return "".join(title.lower().split())
+
 def isSimilar(title1 = "", title2 = ""):
     """Given two strings, it returns True if their
     similarity ratio is closer than similarityThreshold.
@@ -17,8 +24,8 @@ def isSimilar(title1 = "", title2 = ""):
     """
 
     # first, lowercase and eliminate all whitespaces
-    title1 = "".join(title1.lower().split())
-    title2 = "".join(title2.lower().split())
+    title1 = normalizeTitle(title1)
+    title2 = normalizeTitle(title2)
 
     # then count the letters which are the same
     len1 = len(title1)
@@ -50,6 +57,222 @@ def isSimilar(title1 = "", title2 = ""):
 
     return ratio > similarityThreshold
 
+# the number of cells (pairs of titles times characters) compared at once by similarityMatrix
+similarityMatrixCells = 4 * 1024 * 1024
+
+def similarityMatrix(titlesA = None, titlesB = None):
+    """
+    Given two lists of strings, returns a numpy array of booleans with
+    isSimilar(titlesA[i], titlesB[j]) in position [i, j].
+
+    The titles are encoded as arrays of code points, padded to the same length, and all
+    the pairs compared at once, some rows of titlesA at a time so that no more than
+    similarityMatrixCells characters are compared together.
+    As isSimilar, raises a ZeroDivisionError when comparing two titles which are empty
+    once normalized.
+
+    Needs numpy.
+    """
+    import numpy
+
+    normalizedA = [normalizeTitle(x) for x in titlesA]
+    normalizedB = [normalizeTitle(x) for x in titlesB]
+    width = max([len(x) for x in normalizedA + normalizedB] + [1])
+
+    codesA, numericA, lengthsA = _encodeTitles(numpy, normalizedA, width)
+    codesB, numericB, lengthsB = _encodeTitles(numpy, normalizedB, width)
+
+    if (lengthsA == 0).any() and (lengthsB == 0).any():
+        raise ZeroDivisionError("Cannot compare two empty titles.")
+
+    result = numpy.zeros((len(normalizedA), len(normalizedB)), dtype = bool)
+    positions = numpy.arange(width)
+    rows = max(1, similarityMatrixCells // max(1, len(normalizedB) * width))
+
+    for start in range(0, len(normalizedA), rows):
+        end = min(start + rows, len(normalizedA))
+        lenA = lengthsA[start:end, None]
+        shortest = numpy.minimum(lenA, lengthsB[None, :])
+        longest = numpy.maximum(lenA, lengthsB[None, :])
+
+        # characters which are the same, in the same position
+        inShortest = positions[None, None, :] < shortest[:, :, None]
+        equal = (codesA[start:end, None, :] == codesB[None, :, :]) & inShortest
+        same = equal.sum(axis = 2)
+
+        # similarity ratio, divided as isSimilar does
+        similar = same / numpy.maximum(longest, 1) > similarityThreshold
+
+        # characters which are different: the ones of the first title up to its length,
+        # and the ones of the second past the length of the first
+        otherA = ~equal & (positions[None, None, :] < lenA[:, :, None]) & ~numericA[start:end, None, :]
+        otherB = (positions[None, None, :] >= lenA[:, :, None]) & \
+                 (positions[None, None, :] < lengthsB[None, :, None]) & ~numericB[None, :, :]
+        onlyNumbers = ~(otherA | otherB).any(axis = 2) & (same < longest)
+
+        result[start:end] = similar & ~onlyNumbers
+
+    return result
+
+def _encodeTitles(numpy = None, normalized = None, width = 0):
+    """
+    Returns the code points of the normalized titles, padded to width, whether they
+    are numeric characters, and the lengths of the titles.
+    """
+    codes = numpy.zeros((len(normalized), width), dtype = numpy.uint32)
+    numeric = numpy.zeros((len(normalized), width), dtype = bool)
+    lengths = numpy.zeros(len(normalized), dtype = numpy.int64)
+
+    for row, title in enumerate(normalized):
+        lengths[row] = len(title)
+        if len(title) > 0:
+            codes[row, :len(title)] = numpy.frombuffer(title.encode("utf-32-le"), dtype = numpy.uint32)
+            numeric[row, :len(title)] = [x.isnumeric() for x in title]
+
+    return codes, numeric, lengths
+
+@functools.lru_cache(maxsize = None)
+def minSameCharacters(length = 0):
+    """
+    Returns the least number of equal characters a title needs to share with
+    a title of the given length (the longest of the two) to pass similarityThreshold.
+    """
+    if length == 0:
+        return 0
+
+    same = int(similarityThreshold * length)
+    while same / length <= similarityThreshold:
+        same += 1
+
+    return same
+
+@functools.lru_cache(maxsize = None)
+def canBeSimilar(len1 = 0, len2 = 0):
+    """
+    Given the lengths of two normalized titles, returns False if isSimilar cannot be True for them.
+    Two empty titles are reported as possibly similar, since isSimilar cannot compare them.
+    """
+    return minSameCharacters(max(len1, len2)) <= min(len1, len2)
+
+@functools.lru_cache(maxsize = None)
+def titleSegments(length = 0):
+    """
+    Returns the segments, as (start, end) positions, in which TitleBlockIndex
+    splits the normalized titles of the given length.
+
+    A title of this length and a shorter one passing similarityThreshold differ in at most
+    (length - minSameCharacters(length)) positions, counting all those past the end of the
+    shorter one: the title is split in one more segment than that, so that one of the
+    segments is the same, in the same position, in both titles.
+    The same holds when the other title is longer, since it must share even more characters.
+    """
+    count = length - minSameCharacters(length) + 1
+    return tuple([((i * length) // count, ((i + 1) * length) // count) for i in range(count)])
+
+class TitleBlockIndex(object):
+    """
+    Index of titles, returning for any title the candidates which could be
+    similar to it according to isSimilar, without comparing it to all of them.
+
+    Each title is split in segments (see titleSegments()), indexed with their position.
+    A title similar to another one of length l must contain one of the segments of the
+    latter in the same position, so the candidates of a title are found by looking up, for each
+    compatible length l, its characters at the positions of the segments of the titles of length l.
+
+    Titles are identified by a key of the caller's choosing.
+    """
+
+    def __init__(self):
+        # key -> normalized title
+        self._titles = {}
+        # (length, segment number, segment) -> set of keys
+        self._segments = {}
+        # length of the normalized title -> set of keys
+        self._lengths = {}
+
+    def __len__(self):
+        return len(self._titles)
+
+    def __contains__(self, key):
+        return key in self._titles
+
+    def add(self, key = None, title = ""):
+        """
+        Adds (or replaces) the title with the given key.
+        """
+        if key in self._titles:
+            self.remove(key)
+
+        normalized = normalizeTitle(title)
+        self._titles[key] = normalized
+        self._lengths.setdefault(len(normalized), set()).add(key)
+
+        for segment in self._getSegments(normalized):
+            self._segments.setdefault(segment, set()).add(key)
+
+    def remove(self, key = None):
+        """
+        Removes the title with the given key, if present.
+        """
+        normalized = self._titles.pop(key, None)
+        if normalized is None:
+            return
+
+        keys = self._lengths[len(normalized)]
+        keys.discard(key)
+        if len(keys) == 0:
+            del self._lengths[len(normalized)]
+
+        for segment in self._getSegments(normalized):
+            keys = self._segments[segment]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self._segments[segment]
+
+    def clear(self):
+        """
+        Removes all the titles.
+        """
+        self.__init__()
+
+    def candidates(self, title = ""):
+        """
+        Returns the set of the keys of the titles which could be similar to the given one.
+        All the titles for which isSimilar(title, x) or isSimilar(x, title) is True are in it.
+        """
+        normalized = normalizeTitle(title)
+        length = len(normalized)
+
+        if length == 0:
+            # isSimilar cannot compare two empty titles: they are all reported
+            return set(self._lengths.get(0, ()))
+
+        sharing = set()
+        for otherLength in self._lengths:
+            if otherLength == 0 or not canBeSimilar(length, otherLength):
+                continue
+
+            for number, (start, end) in enumerate(titleSegments(otherLength)):
+                if end > length:
+                    break
+                sharing.update(self._segments.get((otherLength, number, normalized[start:end]), ()))
+
+        # a common segment is not enough: they also need to have enough characters in common
+        found = set()
+        for key in sharing:
+            other = self._titles[key]
+            if sum(map(str.__eq__, normalized, other)) >= minSameCharacters(max(length, len(other))):
+                found.add(key)
+
+        return found
+
+    def _getSegments(self, normalized = ""):
+        """
+        Returns the list of the keys of the segments of a normalized title.
+        """
+        return [(len(normalized), number, normalized[start:end])
+                for number, (start, end) in enumerate(titleSegments(len(normalized)))]
+
 def isAnInt(inputString = None):
     """
     Returns true if the string in input represents an integer.